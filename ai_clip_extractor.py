@@ -1,7 +1,22 @@
-import openai, json, whisper
-import tempfile
+import openai, json, os
 import math
-from moviepy.editor import VideoFileClip
+import asyncio
+import tiktoken
+from concurrent.futures import ThreadPoolExecutor
+from llm_client import chat_completion, async_chat_completion, async_client, parse_json_response, LLM_CONCURRENCY
+from media_info import get_media_info
+from model_registry import transcribe_with_model, WHISPER_MODEL_NAME
+from transcript_cache import transcript_cache_key, load_transcript, store_transcript
+from chunked_transcription import transcribe_chunked, words_from_result, TRANSCRIBE_CHUNK_SECONDS
+from transcript import Transcript, as_transcript
+from audio_artifact import extract_audio, open_audio, load_project_audio, to_float32, AUDIO_SAMPLE_RATE
+from moment_candidates import generate_candidates
+from instrumentation import span
+
+TRANSCRIPT_CACHE = os.environ.get('KLEEP_TRANSCRIPT_CACHE', 'yes') == 'yes'
+# How moments are picked: 'llm', 'prescore' (local ranking, LLM scores the shortlist) or 'local'
+MOMENT_FINDER = os.environ.get('KLEEP_MOMENT_FINDER', 'llm')
+PRESCORE_CANDIDATES_PER_MOMENT = 3
 
 openai.api_key = "your-open-ai-key"
 
@@ -9,24 +24,35 @@ from openai import OpenAI
 
 client = OpenAI()
 
-def transcribe_audio(audio_path):
-    model = whisper.load_model("base")
-    result = model.transcribe(audio_path, word_timestamps=True)
+def transcribe_audio(audio_path, progress=None, use_cache=TRANSCRIPT_CACHE):
+    options = {"word_timestamps": True}
+
+    cache_key = None
+    if use_cache:
+        try:
+            cache_key = transcript_cache_key(audio_path, WHISPER_MODEL_NAME, {**options, "chunk_seconds": TRANSCRIBE_CHUNK_SECONDS})
+            cached = load_transcript(audio_path, cache_key)
+            if cached is not None:
+                print("Transcript loaded from cache.")
+                return Transcript.from_words(cached)
+        except OSError as e:
+            print(f"Transcript cache unavailable: {e}")
+            cache_key = None
+
+    # Decode once to the project's shared PCM artifact; long audio is split at pauses
+    # and transcribed in parallel
+    artifact_path = extract_audio(audio_path)
+    samples = open_audio(artifact_path)
+    if len(samples) > TRANSCRIBE_CHUNK_SECONDS * AUDIO_SAMPLE_RATE:
+        words = transcribe_chunked(artifact_path, options, progress=progress)
+    else:
+        result = transcribe_with_model(to_float32(samples), progress=progress, **options)
+        words = words_from_result(result)
     print("Transcription done.")
 
-    words = []
-    if 'segments' in result:
-        for segment in result['segments']:
-            if 'words' in segment:
-                words.extend(segment['words'])  # detailed word-level
-            else:
-                # fallback (rare)
-                words.append({
-                    'start': segment.get('start', 0),
-                    'end': segment.get('end', 0),
-                    'text': segment.get('text', '').strip()
-                })
-    return words
+    if cache_key:
+        store_transcript(audio_path, cache_key, words)
+    return Transcript.from_words(words)
 
 
 def segment_transcript(full_text, segment_duration, video_duration):
@@ -48,121 +74,142 @@ def segment_transcript(full_text, segment_duration, video_duration):
 
 
 
-def score_segments(segments):
-    scored = []
+SCORING_MODEL = "gpt-4o"
+SCORING_BATCH_SIZE = int(os.environ.get('KLEEP_SCORING_BATCH_SIZE', '5'))  # excerpts per request; 1 = one request each
 
-    for seg in segments:
-        prompt = f"""
+
+def score_prompt(text):
+    return f"""
 You're an expert social media video editor.
 
-Please rate the following video transcript excerpt for its viral potential on a scale of 0 to 100.
+Please rate the following video excerpt for its VIRAL potential on a scale from 0 to 100.
+
+Also explain in 1 short sentence WHY it's likely (or unlikely) to go viral.
 
-Also give a 1-2 sentence explanation WHY it is or isn't likely to go viral (focus on emotions, surprises, curiosity, humor, value).
+Return ONLY strict JSON like this:
 
-Return your answer in this strict JSON format:
 {{
-    "viral_score": number,
-    "reason": "your explanation here"
+  "viral_score": 85,
+  "reason": "It is emotional and surprising."
 }}
 
-Excerpt:
+Here is the excerpt:
 \"\"\"
-{seg['text']}
+{text}
 \"\"\"
 """
 
-        res = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7
-        )
 
-        try:
-            result = json.loads(res.choices[0].message.content.strip())
-            viral_score = result.get('viral_score', 0)
-            reason = result.get('reason', "No reason provided.")
-        except Exception as e:
-            print(f"Error parsing AI response: {e}")
-            viral_score = 0
-            reason = "Parsing error."
-
-        scored.append({
-            **seg,
-            "viral_score": viral_score,
-            "reason": reason
-        })
+def batch_score_prompt(texts):
+    excerpts = "\n\n".join(
+        f"Excerpt {n}:\n\"\"\"\n{text}\n\"\"\"" for n, text in enumerate(texts, start=1)
+    )
+    return f"""
+You're an expert social media video editor.
 
-    # Sort clips by highest viral score
-    scored = sorted(scored, key=lambda x: x['viral_score'], reverse=True)
+Please rate each of the following video excerpts for its VIRAL potential on a scale from 0 to 100.
 
-    return scored
+For each one, also explain in 1 short sentence WHY it's likely (or unlikely) to go viral.
 
+Return ONLY a strict JSON array with one object per excerpt, like this:
 
-def score_segments_with_ai(segments):
-    scored = []
+[
+  {{"id": 1, "viral_score": 85, "reason": "It is emotional and surprising."}},
+  {{"id": 2, "viral_score": 40, "reason": "Informative but slow."}}
+]
 
-    for seg in segments:
-        if not seg['text'].strip():
-            scored.append({
-                **seg,
-                "viral_score": 0,
-                "reason": "Empty transcript, skipped."
-            })
-            continue
+{excerpts}
+"""
 
-        prompt = f"""
-You're an expert social media video editor.
 
-Please rate the following video excerpt for its VIRAL potential on a scale from 0 to 100.
+def parse_score(result):
+    return int(result.get("viral_score", 0)), result.get("reason", "No reason provided.")
 
-Also explain in 1 short sentence WHY it's likely (or unlikely) to go viral.
 
-Return ONLY strict JSON like this:
+async def _score_one(client, semaphore, text):
+    try:
+        raw = await async_chat_completion(client, semaphore, score_prompt(text), model=SCORING_MODEL, temperature=0.7)
+        return parse_score(parse_json_response(raw))
+    except Exception as e:
+        print(f"Error scoring segment: {e}")
+        return None
 
-{{
-  "viral_score": 85,
-  "reason": "It is emotional and surprising."
-}}
 
-Here is the excerpt:
-\"\"\"
-{seg['text']}
-\"\"\"
-"""
-        try:
-            res = openai.chat.completions.create(
-                model="gpt-4o",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
-            )
+async def _score_batch(client, semaphore, texts):
+    if len(texts) == 1:
+        return [await _score_one(client, semaphore, texts[0])]
 
-            raw = res.choices[0].message.content.strip()
+    scores = [None] * len(texts)
+    try:
+        raw = await async_chat_completion(client, semaphore, batch_score_prompt(texts), model=SCORING_MODEL, temperature=0.7)
+        for item in parse_json_response(raw):
+            n = int(item.get("id", 0))
+            if 1 <= n <= len(texts):
+                scores[n - 1] = parse_score(item)
+    except Exception as e:
+        print(f"Error scoring batch of {len(texts)}: {e}")
 
-            print("\nRAW AI RESPONSE:")
-            print(raw)
-            print("END RAW\n")
+    # Anything the batch answer left out is scored on its own
+    missing = [i for i, score in enumerate(scores) if score is None]
+    retried = await asyncio.gather(*[_score_one(client, semaphore, texts[i]) for i in missing])
+    for i, score in zip(missing, retried):
+        scores[i] = score
+    return scores
 
-            if not raw:
-                raise ValueError("Empty response from OpenAI")
 
-            # 🛠 CLEAN UP ANY TRIPLE BACKTICKS
-            raw = raw.replace('```json', '').replace('```', '').strip()
+async def _score_texts(texts, batch_size, concurrency):
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    async with async_client() as client:
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        results = await asyncio.gather(*[_score_batch(client, semaphore, batch) for batch in batches])
+    return [score for batch in results for score in batch]
 
-            result = json.loads(raw)
 
-            viral_score = int(result.get("viral_score", 0))
-            reason = result.get("reason", "No reason provided.")
+def score_texts(texts, batch_size=SCORING_BATCH_SIZE, concurrency=LLM_CONCURRENCY):
+    """
+    Score excerpts concurrently (at most `concurrency` requests in flight), `batch_size`
+    excerpts per request. Returns (viral_score, reason) per text, or None where scoring failed.
+    """
+    if not texts:
+        return []
+    with span("scoring", excerpts=len(texts)):
+        return asyncio.run(_score_texts(list(texts), max(1, batch_size), concurrency))
 
-        except Exception as e:
-            print(f"Error parsing AI response: {e}")
-            viral_score = 0
-            reason = "AI error or empty."
-
-        scored.append({
-            **seg,
-            "viral_score": viral_score,
-            "reason": reason
-        })
+
+def score_segments(segments, batch_size=SCORING_BATCH_SIZE, concurrency=LLM_CONCURRENCY):
+    return score_segments_with_ai(segments, batch_size=batch_size, concurrency=concurrency)
+
+
+def score_segments_with_ai(segments, batch_size=SCORING_BATCH_SIZE, concurrency=LLM_CONCURRENCY):
+    to_score = [i for i, seg in enumerate(segments) if seg['text'].strip()]
+    scores = dict(zip(to_score, score_texts([segments[i]['text'] for i in to_score], batch_size, concurrency)))
+
+    scored = []
+    for i, seg in enumerate(segments):
+        if not seg['text'].strip():
+            scored.append({
+                **seg,
+                "viral_score": 0,
+                "reason": "Empty transcript, skipped."
+            })
+            continue
+
+        score = scores.get(i)
+        if score is None:
+            # Surface the failure instead of passing it off as a real score of 0
+            scored.append({
+                **seg,
+                "viral_score": 0,
+                "reason": "AI error or empty.",
+                "score_failed": True
+            })
+        else:
+            viral_score, reason = score
+            scored.append({
+                **seg,
+                "viral_score": viral_score,
+                "reason": reason
+            })
 
     # Sort by viral_score descending
     scored = sorted(scored, key=lambda s: s["viral_score"], reverse=True)
@@ -172,24 +219,17 @@ Here is the excerpt:
 
 def extract_top_segments(video_path, full_transcript=None, max_moments=10):
     try:
-        video = VideoFileClip(video_path)
-        duration = int(video.duration)
+        duration = int(get_media_info(video_path).duration)
     except Exception as e:
         print(f"Error opening video for duration: {e}")
         return [], full_transcript
 
-    # Step 1: Use provided transcript, or extract from video
+    # Step 1: Use provided transcript, or transcribe from the project's shared audio
     if not full_transcript:
-        with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as tmp_audio:
-            video.audio.write_audiofile(
-                tmp_audio.name,
-                fps=16000,
-                bitrate="32k"
-            )
-            full_transcript = transcribe_audio(tmp_audio.name)
+        full_transcript = transcribe_audio(video_path)
 
-    # Step 2: Analyze transcript for viral moments
-    moments = analyze_transcript_for_moments(full_transcript, max_moments=max_moments)
+    # Step 2: Find viral moments
+    moments = find_moments(video_path, full_transcript, max_moments=max_moments)
 
     # Step 3: Attach transcript text to each moment
     segments = []
@@ -200,11 +240,57 @@ def extract_top_segments(video_path, full_transcript=None, max_moments=10):
             "text": segment_text if segment_text else "Transcript not available."
         })
 
-    video.close()
     return segments, full_transcript
 
 
 
+def local_candidates(video_path, transcript, top_k):
+    try:
+        samples = load_project_audio(video_path)
+    except Exception as e:
+        print(f"Audio features unavailable, ranking on transcript only: {e}")
+        samples = None
+    return generate_candidates(as_transcript(transcript), samples, AUDIO_SAMPLE_RATE, top_k=top_k)
+
+
+def find_moments(video_path, transcript, max_moments=10, finder=None):
+    """
+    'llm': the LLM reads the whole transcript (falls back to local ranking if it returns nothing).
+    'prescore': local ranking picks the top windows, the LLM only scores those.
+    'local': local ranking only, no API calls.
+    """
+    finder = finder or MOMENT_FINDER
+    with span("moments", finder=finder):
+        if isinstance(transcript, str):
+            return analyze_transcript_for_moments(transcript, max_moments=max_moments)
+
+        if finder == 'local':
+            return local_candidates(video_path, transcript, max_moments)
+
+        if finder == 'prescore':
+            candidates = [
+                {
+                    "start": c['start'],
+                    "end": c['end'],
+                    "local": (c['viral_score'], c['reason']),
+                    "text": extract_text_for_segment(transcript, c['start'], c['end']),
+                }
+                for c in local_candidates(video_path, transcript, max_moments * PRESCORE_CANDIDATES_PER_MOMENT)
+            ]
+
+            moments = []
+            for seg in score_segments_with_ai(candidates):
+                viral_score, reason = seg['local'] if seg.get('score_failed') else (seg['viral_score'], seg['reason'])
+                moments.append({"start": seg['start'], "end": seg['end'], "reason": reason, "viral_score": viral_score})
+            return merge_moments(moments, max_moments)
+
+        moments = analyze_transcript_for_moments(transcript, max_moments=max_moments)
+        if not moments:
+            print("No moments from the AI, falling back to local ranking.")
+            moments = local_candidates(video_path, transcript, max_moments)
+        return moments
+
+
 def extract_text_for_segment(full_transcript, clip_start, clip_end):
     if not full_transcript:
         return ""
@@ -212,17 +298,7 @@ def extract_text_for_segment(full_transcript, clip_start, clip_end):
     if isinstance(full_transcript, str):
         return full_transcript  # fallback if somehow old
 
-    selected_words = []
-
-    for word in full_transcript:
-        word_start = word.get('start', 0)
-        word_end = word.get('end', 0)
-        text = word.get('text', '').strip()
-
-        if word_start < clip_end and word_end > clip_start and text:
-            selected_words.append(text)
-
-    return ' '.join(selected_words)
+    return as_transcript(full_transcript).text_between(clip_start, clip_end)
 
 
 def parse_timestamp(timestamp):
@@ -234,11 +310,67 @@ def parse_timestamp(timestamp):
 
 
 
-def analyze_transcript_for_moments(transcript_text, max_moments=10):
+MOMENT_MODEL = "gpt-4o"
+# Transcript tokens sent per analysis window; long transcripts are split into several windows
+MOMENT_TOKEN_BUDGET = int(os.environ.get('KLEEP_MOMENT_TOKEN_BUDGET', '12000'))
+MOMENT_WINDOW_OVERLAP_SECONDS = 90  # so a moment straddling two windows is seen whole once
+
+_token_encoder = None
+
+
+def count_tokens(text):
+    global _token_encoder
+    if _token_encoder is None:
+        try:
+            _token_encoder = tiktoken.encoding_for_model(MOMENT_MODEL)
+        except Exception as e:
+            print(f"Tokenizer unavailable, estimating token counts: {e}")
+            _token_encoder = False
+
+    if _token_encoder is False:
+        # ~4 characters per token
+        return len(text) // 4 + 1
+    return len(_token_encoder.encode(text))
+
+
+def serialize_transcript(lines):
+    # One short phrase per line, prefixed with its start time in seconds
+    return "\n".join(f"[{start:.1f}] {text}" for start, end, text in lines)
+
+
+def build_transcript_windows(transcript, token_budget=MOMENT_TOKEN_BUDGET, overlap_seconds=MOMENT_WINDOW_OVERLAP_SECONDS):
+    """
+    Split the transcript into overlapping windows whose serialized text fits `token_budget`.
+    Returns a list of (start, end, text).
+    """
+    lines = transcript.lines()
+    line_tokens = [count_tokens(f"[{start:.1f}] {text}") + 1 for start, end, text in lines]
+
+    windows = []
+    i = 0
+    while i < len(lines):
+        j = i
+        used = 0
+        while j < len(lines) and (j == i or used + line_tokens[j] <= token_budget):
+            used += line_tokens[j]
+            j += 1
+        windows.append((lines[i][0], lines[j - 1][1], serialize_transcript(lines[i:j])))
+        if j >= len(lines):
+            break
+
+        # Step back so the next window re-covers the tail of this one
+        next_i = j
+        while next_i - 1 > i and lines[next_i - 1][0] >= lines[j - 1][1] - overlap_seconds:
+            next_i -= 1
+        i = max(next_i, i + 1)
+    return windows
+
+
+def analyze_window(transcript_text, max_moments=10):
     prompt = f"""
 You are a world-class social media video editor.
 
-Given the following transcript from a long video:
+Given the following transcript from a long video (each line starts with its time in seconds):
 
 ---
 {transcript_text}
@@ -267,26 +399,21 @@ Example format:
 """
 
     try:
-        res = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.4,
-        )
-
-        raw = res.choices[0].message.content.strip()
-
-        print("\nRAW AI RESPONSE:")
-        print(raw)
-        print("END RAW\n")
+        raw = chat_completion(prompt, model=MOMENT_MODEL, temperature=0.4)
 
-        # Clean any backticks if GPT sends Markdown
-        raw = raw.replace('```json', '').replace('```', '').strip()
+        print(f"Moment analysis response: {len(raw or '')} chars")
 
-        moments = json.loads(raw)
+        moments = parse_json_response(raw)
 
         # Validate moments to enforce 30–90 seconds
         valid_moments = []
         for moment in moments:
+            # Numbers sometimes come back as strings; moments that are not numbers at all are dropped
+            try:
+                moment = {**moment, 'start': float(moment['start']), 'end': float(moment['end']), 'viral_score': int(round(float(moment.get('viral_score', 0))))}
+            except (TypeError, ValueError, KeyError):
+                print(f"Skipping malformed moment: {moment}")
+                continue
             duration = moment['end'] - moment['start']
             if 35 <= duration <= 90:
                 valid_moments.append(moment)
@@ -300,3 +427,43 @@ Example format:
         return []
 
 
+def merge_moments(candidates, max_moments=10, max_overlap=0.5):
+    """
+    Reduce step: rank candidates from every window by viral_score and drop any that
+    overlaps an already-kept moment by more than `max_overlap` of the shorter one.
+    """
+    kept = []
+    for moment in sorted(candidates, key=lambda m: m.get('viral_score', 0), reverse=True):
+        duplicate = False
+        for other in kept:
+            overlap = min(moment['end'], other['end']) - max(moment['start'], other['start'])
+            shorter = min(moment['end'] - moment['start'], other['end'] - other['start'])
+            if shorter > 0 and overlap / shorter > max_overlap:
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(moment)
+        if len(kept) >= max_moments:
+            break
+    return kept
+
+
+def analyze_transcript_for_moments(transcript_text, max_moments=10):
+    if isinstance(transcript_text, str):
+        return analyze_window(transcript_text, max_moments=max_moments)
+
+    transcript = as_transcript(transcript_text)
+    windows = build_transcript_windows(transcript)
+    if not windows:
+        return []
+    if len(windows) == 1:
+        return merge_moments(analyze_window(windows[0][2], max_moments=max_moments), max_moments)
+
+    # Map: analyse windows concurrently
+    print(f"Analysing transcript in {len(windows)} windows")
+    with ThreadPoolExecutor(max_workers=max(1, min(LLM_CONCURRENCY, len(windows)))) as pool:
+        results = list(pool.map(lambda w: analyze_window(w[2], max_moments=max_moments), windows))
+
+    # Reduce: merge, dedupe and rank across windows
+    candidates = [moment for window_moments in results for moment in window_moments]
+    return merge_moments(candidates, max_moments)
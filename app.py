@@ -1,10 +1,26 @@
 from flask import Flask
 from routes import register_routes
-import os
+from model_registry import warm_whisper_model
+from transcript_cache import clear_transcripts
+from llm_cache import clear_cache
+from ingest import IngestRequest, MAX_UPLOAD_BYTES
+from encoding_profiles import ENCODING_PROFILES, benchmark_profiles
+from delivery import SENDFILE_MODE
+from download_store import DOWNLOAD_STORE, DOWNLOAD_STORE_PATH
+from storage import start_sweeper, sweep
+import os, click
 
 app = Flask(__name__)
 app.secret_key = 'your_super_secret_key'
 
+# Uploads stream straight into the clips folder; oversized requests are refused from
+# Content-Length before any bytes are read (1 MB of slack for the other form fields)
+app.request_class = IngestRequest
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 1024 * 1024
+
+# Let the front server send clip files (see delivery.py)
+app.config['USE_X_SENDFILE'] = SENDFILE_MODE == 'x-sendfile'
+
 # Define the clips folder path
 CLIPS_FOLDER = 'static/clips'
 app.config['CLIPS_FOLDER'] = CLIPS_FOLDER
@@ -15,5 +31,45 @@ os.makedirs(CLIPS_FOLDER, exist_ok=True)
 # Register all routes
 register_routes(app)
 
+@app.cli.command('clear-transcripts')
+@click.argument('project', required=False)
+def clear_transcripts_command(project):
+    """Delete cached transcripts for one project folder, or for every project."""
+    folder = os.path.join(CLIPS_FOLDER, project) if project else CLIPS_FOLDER
+    removed = clear_transcripts(folder)
+    click.echo(f"Removed {removed} cached transcript(s) from {folder}")
+
+@app.cli.command('clear-llm-cache')
+def clear_llm_cache_command():
+    """Delete every cached OpenAI response."""
+    click.echo(f"Removed {clear_cache()} cached response(s)")
+
+@app.cli.command('benchmark-encoding')
+@click.option('--source', type=click.Path(exists=True, dir_okay=False), help="Video to encode (default: a generated 720p test clip)")
+@click.option('--seconds', default=20, show_default=True, help="Length of the clip rendered with each profile")
+@click.option('--threads', default=0, help="Encoder threads (0 = ffmpeg default)")
+@click.option('--profile', 'profiles', multiple=True, type=click.Choice(list(ENCODING_PROFILES)), help="Only these profiles")
+def benchmark_encoding_command(source, seconds, threads, profiles):
+    """Render the same clip with each encoding profile and report speed and output size."""
+    results = benchmark_profiles(source, seconds, threads or None, profiles or None)
+    click.echo(f"{'profile':<14}{'encode fps':>12}{'x realtime':>12}{'KB per s':>12}")
+    for r in results:
+        click.echo(f"{r['profile']:<14}{r['fps']:>12}{r['realtime']:>12}{r['bytes_per_second'] / 1024:>12.0f}")
+
+@app.cli.command('sweep-storage')
+def sweep_storage_command():
+    """Remove leftover intermediates now and evict projects if over the storage limits."""
+    result = sweep(CLIPS_FOLDER, DOWNLOAD_STORE_PATH if DOWNLOAD_STORE else None)
+    click.echo(f"Removed {result['removed_leftovers']} leftover file(s), evicted {len(result['evicted'])}; {result['usage_bytes'] / 1024 / 1024:.0f} MB in use")
+
+# Render and transcription worker processes are spawned, and re-import this file as
+# __mp_main__ when the app runs as `python app.py`; only the server process starts these
+if __name__ != '__mp_main__':
+    # Optionally load Whisper once at worker start instead of on the first request
+    warm_whisper_model()
+
+    # Keep static/clips (and the download store) within the disk budget
+    start_sweeper(CLIPS_FOLDER, DOWNLOAD_STORE_PATH if DOWNLOAD_STORE else None)
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5002, debug=True)
@@ -0,0 +1,76 @@
+import os, json, subprocess, threading
+import numpy as np
+from media_info import get_media_info
+from instrumentation import run_subprocess
+
+AUDIO_SAMPLE_RATE = 16000  # what Whisper expects
+AUDIO_ARTIFACT_NAME = 'audio_16k.s16le'
+
+
+def audio_artifact_path(media_path):
+    return os.path.join(os.path.dirname(media_path), AUDIO_ARTIFACT_NAME)
+
+
+def _decode_audio(media_path, output_path):
+    command = [
+        "ffmpeg", "-nostdin", "-y", "-v", "error", "-threads", "0",
+        "-i", media_path,
+        "-vn", "-ac", "1", "-ar", str(AUDIO_SAMPLE_RATE),
+        "-f", "s16le", "-acodec", "pcm_s16le",
+        output_path
+    ]
+    try:
+        run_subprocess(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except subprocess.CalledProcessError as e:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise RuntimeError(f"Failed to extract audio: {e.stderr.decode(errors='ignore')}") from e
+
+
+def extract_audio(media_path):
+    """
+    Decode the media's audio once to 16 kHz mono s16le next to it and return the path.
+    Reused while the source's size and mtime are unchanged.
+    """
+    path = audio_artifact_path(media_path)
+    meta_path = path + '.json'
+    stat = os.stat(media_path)
+    source_id = [os.path.basename(media_path), stat.st_size, stat.st_mtime]
+
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            if json.load(f).get('source') == source_id and os.path.exists(path):
+                return path
+    except (OSError, ValueError):
+        pass
+
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if get_media_info(media_path).has_audio:
+        _decode_audio(media_path, tmp_path)
+    else:
+        # Silent source: an empty artifact rather than an ffmpeg error
+        open(tmp_path, 'wb').close()
+    os.replace(tmp_path, path)
+
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump({"source": source_id, "sample_rate": AUDIO_SAMPLE_RATE, "format": "s16le"}, f)
+    print(f" Audio extracted once to {path}")
+    return path
+
+
+def open_audio(artifact_path):
+    """
+    Memory-map an extracted artifact as int16 samples (no copy, shared between processes).
+    """
+    if os.path.getsize(artifact_path) == 0:
+        return np.zeros(0, dtype=np.int16)
+    return np.memmap(artifact_path, dtype=np.int16, mode='r')
+
+
+def load_project_audio(media_path):
+    return open_audio(extract_audio(media_path))
+
+
+def to_float32(samples):
+    # Same scaling whisper.audio.load_audio applies
+    return np.asarray(samples, dtype=np.float32) / 32768.0
@@ -0,0 +1,57 @@
+"""
+Compare burn time of one-SRT-event-per-word captions vs. phrase-grouped ASS captions.
+
+Usage:
+    python benchmarks/caption_burn_bench.py --clip-length 90
+"""
+import os, sys, time, argparse, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')  # no AI calls are made here
+
+from clip_segments_bench import fake_transcript
+from encoding_profiles import make_sample_video
+from clip_renderer import generate_caption_srt, STYLE_MAP
+from captions import generate_caption_ass
+from render_engine import render_clip, output_size
+
+
+def timed_render(video_path, output_path, clip_length, size, caption_path, style_options):
+    started = time.perf_counter()
+    render_clip(video_path, output_path, 0, clip_length, source_size=size, crop_vertical=True,
+                srt_path=caption_path, subtitle_style=style_options)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clip-length', type=int, default=90)
+    parser.add_argument('--style', default='professional')
+    args = parser.parse_args()
+
+    size = (1280, 720)
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = os.path.join(tmp, 'full_video.mp4')
+        make_sample_video(video_path, args.clip_length, *size)
+        words = fake_transcript(args.clip_length)
+
+        srt_path = os.path.join(tmp, 'captions.srt')
+        generate_caption_srt(words, srt_path, 0, args.clip_length)
+        ass_path = os.path.join(tmp, 'captions.ass')
+        generate_caption_ass(words, ass_path, 0, args.clip_length, args.style, output_size(size, True))
+
+        none_time = timed_render(video_path, os.path.join(tmp, 'none.mp4'), args.clip_length, size, None, None)
+        srt_time = timed_render(video_path, os.path.join(tmp, 'srt.mp4'), args.clip_length, size, srt_path, STYLE_MAP[args.style])
+        ass_time = timed_render(video_path, os.path.join(tmp, 'ass.mp4'), args.clip_length, size, ass_path, None)
+
+        with open(ass_path, encoding='utf-8') as f:
+            ass_events = sum(1 for line in f if line.startswith('Dialogue:'))
+
+    print()
+    print(f"No captions:          {none_time:.2f}s")
+    print(f"SRT, one per word:    {srt_time:.2f}s ({len(words)} events, +{srt_time - none_time:.2f}s for captions)")
+    print(f"ASS, phrase-grouped:  {ass_time:.2f}s ({ass_events} events, +{ass_time - none_time:.2f}s for captions)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Compare wall-clock time of clip_segments rendered serially vs. with the worker pool.
+
+Usage:
+    python benchmarks/clip_segments_bench.py --duration 300 --clips 6 --workers 0
+"""
+import os, sys, time, argparse, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')  # no AI calls are made here
+
+from video_utils import clip_segments, render_plan
+from encoding_profiles import make_sample_video
+
+
+def fake_transcript(duration):
+    # One word every 0.4s, enough to exercise caption burning
+    words = []
+    t = 0.0
+    while t < duration:
+        words.append({'start': t, 'end': t + 0.35, 'text': f"word{len(words)}"})
+        t += 0.4
+    return words
+
+
+def run(video_path, segments, transcript, out_dir, max_workers):
+    started = time.perf_counter()
+    clips = clip_segments(video_path, segments, 'bench', out_dir, 'yes', 'professional', full_transcript=transcript, max_workers=max_workers)
+    return time.perf_counter() - started, len(clips)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--duration', type=int, default=300, help="source video length in seconds")
+    parser.add_argument('--clips', type=int, default=6, help="number of highlight segments")
+    parser.add_argument('--clip-length', type=int, default=30)
+    parser.add_argument('--workers', type=int, default=0, help="pool size for the parallel run (0 = auto)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = os.path.join(tmp, 'full_video.mp4')
+        make_sample_video(video_path, args.duration)
+        transcript = fake_transcript(args.duration)
+
+        step = max(args.clip_length, (args.duration - args.clip_length) // max(args.clips, 1))
+        segments = [
+            {'start': i * step + 1, 'end': i * step + 1 + args.clip_length, 'reason': 'benchmark', 'viral_score': 50}
+            for i in range(args.clips) if i * step + 1 + args.clip_length <= args.duration
+        ]
+
+        serial_dir = os.path.join(tmp, 'serial')
+        parallel_dir = os.path.join(tmp, 'parallel')
+        os.makedirs(serial_dir)
+        os.makedirs(parallel_dir)
+
+        serial_time, serial_count = run(video_path, segments, transcript, serial_dir, max_workers=1)
+        parallel_time, parallel_count = run(video_path, segments, transcript, parallel_dir, max_workers=args.workers)
+
+    workers, threads = render_plan(len(segments), args.workers)
+    print()
+    print(f"Clips:     {len(segments)} x {args.clip_length}s from a {args.duration}s source")
+    print(f"Serial:    {serial_time:.1f}s ({serial_count} clips)")
+    print(f"Parallel:  {parallel_time:.1f}s ({parallel_count} clips, {workers} workers x {threads} threads)")
+    print(f"Speed-up:  {serial_time / parallel_time:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
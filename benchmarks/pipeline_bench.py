@@ -0,0 +1,262 @@
+"""
+End-to-end pipeline benchmark on synthetic media, with Whisper and OpenAI replaced by
+deterministic local fakes (benchmarks/stubs), so runs are repeatable and need no GPU,
+network or API key. Times every stage separately and writes the results as JSON;
+pass --baseline to compare against an earlier run (exit status 1 on a regression).
+
+Usage:
+    python benchmarks/pipeline_bench.py --duration 120 --orientation both --output bench.json
+    python benchmarks/pipeline_bench.py --baseline bench.json --tolerance 15
+"""
+import os, sys, json, time, shutil, platform, argparse, tempfile, statistics, subprocess, threading
+from contextlib import redirect_stdout
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+# The fake whisper package has to shadow the real one before model_registry imports it
+sys.path.insert(0, os.path.join(BENCH_DIR, 'stubs'))
+sys.path.insert(1, REPO_DIR)
+
+from openai_stub import start_stub
+
+STAGES = ['download', 'ingest', 'probe', 'transcription', 'moments', 'clip_segments', 'restyle', 'restyle_from_cuts', 'caption_burn', 'vertical_crop']
+# Stages faster than this are compared in absolute terms only; a few ms of jitter is not a regression
+NOISE_FLOOR_SECONDS = 0.05
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class QuietServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        pass  # yt-dlp drops its probe connections early
+
+
+def serve_folder(folder):
+    server = QuietServer(('127.0.0.1', 0), partial(QuietHandler, directory=folder))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class Timer:
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, stage, fn, *args, **kwargs):
+        started = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.stages[stage] = round(time.perf_counter() - started, 3)
+        return result
+
+
+def run_pipeline(media_dir, base_url, orientation, duration, encoding_profile):
+    """
+    One pass over every stage for one synthetic source, in a fresh clips folder.
+    Returns {stage: seconds} plus what each stage produced.
+    """
+    import video_utils
+    from ingest import IngestFile, ingest_upload
+    from media_info import get_media_info
+    from ai_clip_extractor import transcribe_audio, analyze_transcript_for_moments, extract_text_for_segment
+    from render_engine import render_clip
+    from captions import generate_caption_ass
+    from encoding_profiles import get_encoding_profile
+    from transcript import as_transcript
+
+    source_name = f"{orientation}.mp4"
+    clips_folder = tempfile.mkdtemp(prefix='clips_', dir='.')
+    video_utils.CLIPS_FOLDER = clips_folder
+    timer = Timer()
+
+    # Download: yt-dlp pulling the file from a local HTTP server
+    timer.run('download', video_utils.download_video, f"{base_url}/{source_name}")
+
+    # Ingest: the upload path, streamed through IngestFile in upload-sized chunks
+    def ingest():
+        from ingest import UPLOAD_CHUNK_SIZE
+        upload = IngestFile(os.path.join(clips_folder, '.incoming'))
+        with open(os.path.join(media_dir, source_name), 'rb') as f:
+            for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+                upload.write(chunk)
+        return ingest_upload(upload, clips_folder, f"bench_{orientation}")
+    video_path, video_title, project_folder, _ = timer.run('ingest', ingest)
+
+    info = timer.run('probe', get_media_info, video_path, project_folder, with_keyframes=True)
+    transcript = timer.run('transcription', transcribe_audio, video_path, use_cache=False)
+    moments = timer.run('moments', analyze_transcript_for_moments, transcript)
+
+    segments = [{**m, "text": extract_text_for_segment(transcript, m['start'], m['end'])} for m in moments]
+    clips = timer.run('clip_segments', video_utils.clip_segments, video_path, segments, video_title, project_folder,
+                      'yes', 'professional', full_transcript=transcript, encoding_profile=encoding_profile)
+
+    # Caption style changes, as pipeline.run_restyle_job runs them: the first re-style
+    # renders from the source and keeps the cuts, later ones only burn captions on them
+    def restyle(style, clips):
+        stored_cuts = {clip['index']: clip['cut'] for clip in clips if clip.get('cut')}
+        return video_utils.clip_segments(video_path, segments, video_title, project_folder, 'yes', style, full_transcript=transcript,
+                                         encoding_profile=encoding_profile, keep_cuts=True, stored_cuts=stored_cuts)
+    clips = timer.run('restyle', restyle, 'fun', clips)
+    timer.run('restyle_from_cuts', restyle, 'red_alert', clips)
+
+    # The two expensive render features in isolation, on one clip-length span
+    profile = get_encoding_profile(encoding_profile)
+    start, end = 0.0, min(30.0, info.duration)
+    words = list(as_transcript(transcript).window(start, end))
+    ass_path = os.path.join(project_folder, 'bench_captions.ass')
+    generate_caption_ass(words, ass_path, start, end, 'professional', output_size=info.size)
+    timer.run('caption_burn', render_clip, video_path, os.path.join(project_folder, 'bench_captions.mp4'), start, end,
+              source_size=info.size, srt_path=ass_path, profile=profile, source_fps=info.fps)
+    if info.is_vertical:
+        timer.stages['vertical_crop'] = None  # nothing to crop
+    else:
+        timer.run('vertical_crop', render_clip, video_path, os.path.join(project_folder, 'bench_crop.mp4'), start, end,
+                  source_size=info.size, crop_vertical=True, profile=profile, source_fps=info.fps)
+
+    return timer.stages, {"words": len(as_transcript(transcript)), "moments": len(moments), "clips": len(clips)}
+
+
+def median_stages(runs):
+    stages = {}
+    for stage in STAGES:
+        values = [run[stage] for run in runs if run.get(stage) is not None]
+        stages[stage] = round(statistics.median(values), 3) if values else None
+    return stages
+
+
+def compare(results, baseline, tolerance):
+    """
+    Per-stage change against a baseline run. A stage regresses when it is more than
+    `tolerance` percent and NOISE_FLOOR_SECONDS slower. Returns (rows, regressed).
+    """
+    rows = []
+    regressed = False
+    for orientation, result in results['sources'].items():
+        base = (baseline.get('sources') or {}).get(orientation)
+        if not base:
+            continue
+        for stage in STAGES:
+            now, before = result['stages'].get(stage), base['stages'].get(stage)
+            if now is None or before is None:
+                continue
+            change = (now - before) / before * 100 if before else 0.0
+            slower = change > tolerance and now - before > NOISE_FLOOR_SECONDS
+            regressed = regressed or slower
+            rows.append((orientation, stage, before, now, change, slower))
+    return rows, regressed
+
+
+def host_info():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "ffmpeg": subprocess.run(["ffmpeg", "-version"], stdout=subprocess.PIPE, text=True).stdout.split('\n')[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=int, default=120, help="synthetic source length in seconds")
+    parser.add_argument('--orientation', choices=['horizontal', 'vertical', 'both'], default='both')
+    parser.add_argument('--repeat', type=int, default=1, help="runs per source; the median is reported")
+    parser.add_argument('--profile', default=None, help="encoding profile for the render stages")
+    parser.add_argument('--whisper-rtf', type=float, default=0.0, help="fake Whisper cost, seconds per second of audio")
+    parser.add_argument('--llm-latency', type=float, default=0.0, help="fake OpenAI latency per request, seconds")
+    parser.add_argument('--output', help="write results JSON here (default: stdout)")
+    parser.add_argument('--baseline', help="results JSON from an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=10.0, help="percent slowdown treated as a regression")
+    args = parser.parse_args()
+
+    stub, stub_url = start_stub(args.llm_latency)
+    os.environ.update({
+        'OPENAI_BASE_URL': stub_url,
+        'OPENAI_API_KEY': 'benchmark',
+        'KLEEP_FAKE_WHISPER_RTF': str(args.whisper_rtf),
+        # Measure the work, not the caches
+        'KLEEP_LLM_CACHE': 'no',
+        'KLEEP_DOWNLOAD_STORE': 'no',
+        'KLEEP_TRANSCRIBE_WORKERS': '1',
+        'KLEEP_MOMENT_FINDER': 'llm',
+    })
+
+    from encoding_profiles import make_sample_video, get_encoding_profile
+
+    # With the JSON on stdout, everything else (the app's logs, the table) goes to stderr
+    report = sys.stdout if args.output else sys.stderr
+    orientations = ['horizontal', 'vertical'] if args.orientation == 'both' else [args.orientation]
+    workspace = tempfile.mkdtemp(prefix='kleep_bench_')
+    cwd = os.getcwd()
+    server = None
+    try:
+        media_dir = os.path.join(workspace, 'media')
+        os.makedirs(media_dir)
+        for orientation in orientations:
+            size = (1280, 720) if orientation == 'horizontal' else (720, 1280)
+            make_sample_video(os.path.join(media_dir, f"{orientation}.mp4"), args.duration, *size, pauses=True)
+        server, base_url = serve_folder(media_dir)
+
+        # Relative paths (cache/, static/clips) land in the workspace
+        os.chdir(workspace)
+        sources = {}
+        with redirect_stdout(report):
+            for orientation in orientations:
+                runs = []
+                for _ in range(args.repeat):
+                    stages, produced = run_pipeline(media_dir, base_url, orientation, args.duration, args.profile)
+                    runs.append(stages)
+                sources[orientation] = {"stages": median_stages(runs), "runs": runs, **produced}
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+        os.chdir(cwd)
+        shutil.rmtree(workspace, ignore_errors=True)
+        stub.shutdown()
+
+    results = {
+        "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "duration": args.duration,
+        "repeat": args.repeat,
+        "profile": get_encoding_profile(args.profile)['name'],
+        "whisper_rtf": args.whisper_rtf,
+        "llm_latency": args.llm_latency,
+        "host": host_info(),
+        "sources": sources,
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    else:
+        print(json.dumps(results, indent=2))
+
+    print(file=report)
+    for orientation, result in sources.items():
+        print(f"{orientation} ({args.duration}s, {result['words']} words, {result['moments']} moments, {result['clips']} clips)", file=report)
+        for stage in STAGES:
+            seconds = result['stages'][stage]
+            print(f"  {stage:<18} {'-' if seconds is None else f'{seconds:.3f}s'}", file=report)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('host') != results['host']:
+            print("\nNote: baseline was recorded on a different host", file=report)
+        for setting in ('duration', 'profile', 'whisper_rtf', 'llm_latency'):
+            if baseline.get(setting) != results[setting]:
+                print(f"Note: baseline {setting} was {baseline.get(setting)}, this run used {results[setting]}", file=report)
+        rows, regressed = compare(results, baseline, args.tolerance)
+        print(f"\nAgainst {args.baseline} (tolerance {args.tolerance:.0f}%):", file=report)
+        for orientation, stage, before, now, change, slower in rows:
+            print(f"  {orientation:<10} {stage:<18} {before:8.3f}s -> {now:8.3f}s  {change:+6.1f}%{'  REGRESSION' if slower else ''}", file=report)
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+Time smart-crop analysis (proxy decode + tracking) against the clip encode it steers.
+
+Usage:
+    python benchmarks/smart_crop_bench.py --clip-length 60
+"""
+import os, sys, time, argparse, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from encoding_profiles import make_sample_video
+from smart_crop import compute_crop_path, crop_expression
+from render_engine import render_clip
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clip-length', type=int, default=60)
+    parser.add_argument('--threads', type=int, default=0, help="encoder threads (0 = ffmpeg default)")
+    args = parser.parse_args()
+
+    size = (1280, 720)
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = os.path.join(tmp, 'full_video.mp4')
+        make_sample_video(video_path, args.clip_length, *size)
+
+        started = time.perf_counter()
+        keyframes = compute_crop_path(video_path, 0, args.clip_length, size)
+        analysis = time.perf_counter() - started
+
+        started = time.perf_counter()
+        render_clip(video_path, os.path.join(tmp, 'clip.mp4'), 0, args.clip_length, source_size=size,
+                    crop_vertical=True, crop_x=crop_expression(keyframes), threads=args.threads or None)
+        encode = time.perf_counter() - started
+
+    print(f"Crop path analysis: {analysis:.2f}s ({len(keyframes)} keyframes)")
+    print(f"Clip encode:        {encode:.2f}s")
+    print(f"Analysis / encode:  {100 * analysis / encode:.0f}%")
+
+
+if __name__ == '__main__':
+    main()
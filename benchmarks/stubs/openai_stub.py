@@ -0,0 +1,89 @@
+"""
+Local, deterministic stand-in for the OpenAI chat completions endpoint, used by
+benchmarks/pipeline_bench.py and the tests. Point the client at it with OPENAI_BASE_URL.
+"""
+import re, json, time, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MOMENT_SECONDS = 45
+
+
+def moments_reply(prompt):
+    times = [float(t) for t in re.findall(r'^\[(\d+(?:\.\d+)?)\]', prompt, re.M)]
+    limit = re.search(r'no more than (\d+) moments', prompt)
+    limit = int(limit.group(1)) if limit else 10
+    if not times:
+        return []
+    last = times[-1]
+    moments = []
+    start = times[0]
+    while start + MOMENT_SECONDS <= last and len(moments) < limit:
+        moments.append({"start": start, "end": start + MOMENT_SECONDS, "reason": "Stub moment", "viral_score": 50 + int(start) % 50})
+        start += MOMENT_SECONDS + 5
+    return moments
+
+
+def reply_for(prompt):
+    excerpts = re.findall(r'Excerpt (\d+):', prompt)
+    if excerpts:
+        return [{"id": int(n), "viral_score": 40 + 7 * int(n) % 60, "reason": "Stub score"} for n in excerpts]
+    if 'VIRAL-WORTHY MOMENTS' in prompt:
+        return moments_reply(prompt)
+    return {"viral_score": 50, "reason": "Stub score"}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+    calls = 0
+    prompts = []        # every prompt received, in order
+    script = []         # (status, content) replies served before the computed ones
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        prompt = body['messages'][-1]['content']
+        with StubHandler.lock:
+            StubHandler.calls += 1
+            StubHandler.prompts.append(prompt)
+            status, content = StubHandler.script.pop(0) if StubHandler.script else (200, None)
+        if self.latency:
+            time.sleep(self.latency)
+
+        if status != 200:
+            data = json.dumps({"error": {"message": content or "Stub error", "type": "stub_error", "code": None}}).encode()
+        else:
+            content = json.dumps(reply_for(prompt)) if content is None else content
+            data = json.dumps({
+                "id": "stub", "object": "chat.completion", "created": 0, "model": body.get('model', 'stub'),
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            }).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def reset_stub(script=()):
+    """
+    Forget the calls seen so far and serve `script` ((status, content) pairs) next.
+    """
+    with StubHandler.lock:
+        StubHandler.calls = 0
+        StubHandler.prompts = []
+        StubHandler.script = list(script)
+
+
+def start_stub(latency=0.0):
+    """
+    Serve the stub on a free local port in a daemon thread. Returns (server, base_url).
+    """
+    StubHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
@@ -0,0 +1,50 @@
+"""
+Deterministic stand-in for openai-whisper, used by benchmarks/pipeline_bench.py.
+
+Words are emitted every WORD_SECONDS wherever the audio is not silent, so transcripts
+follow the pauses in the synthetic soundtrack. KLEEP_FAKE_WHISPER_RTF adds a sleep of
+that many seconds per second of audio to mimic inference cost.
+"""
+import os, time
+import numpy as np
+
+SAMPLE_RATE = 16000
+WORD_SECONDS = 0.4
+SILENCE_RMS = 0.01
+VOCABULARY = [
+    "so", "the", "secret", "is", "that", "nobody", "tells", "you", "how", "money",
+    "actually", "works", "and", "honestly", "it", "changed", "everything", "for", "me",
+]
+
+
+class FakeModel:
+    def __init__(self, name):
+        self.name = name
+
+    def transcribe(self, audio, **options):
+        audio = np.asarray(audio, dtype=np.float32)
+        duration = len(audio) / SAMPLE_RATE
+        rtf = float(os.environ.get('KLEEP_FAKE_WHISPER_RTF', '0'))
+        if rtf:
+            time.sleep(duration * rtf)
+
+        words = []
+        step = int(WORD_SECONDS * SAMPLE_RATE)
+        for n, offset in enumerate(range(0, len(audio) - step + 1, step)):
+            frame = audio[offset:offset + step]
+            if np.sqrt(np.mean(np.square(frame))) < SILENCE_RMS:
+                continue
+            text = VOCABULARY[n % len(VOCABULARY)]
+            if n % 29 == 28:
+                text += "?"
+            elif n % 11 == 10:
+                text += "."
+            start = offset / SAMPLE_RATE
+            words.append({"word": " " + text, "start": round(start, 2), "end": round(start + WORD_SECONDS * 0.85, 2), "probability": 0.9})
+
+        segments = [{"start": 0.0, "end": duration, "text": "".join(w["word"] for w in words), "words": words}]
+        return {"text": segments[0]["text"], "segments": segments, "language": "en"}
+
+
+def load_model(name, device=None, **kwargs):
+    return FakeModel(name)
@@ -0,0 +1,162 @@
+import os
+
+STYLE_MAP = {
+    'professional': "FontName=Arial,FontSize=11,PrimaryColour=&H00FFFFFF,OutlineColour=&H80000000,BorderStyle=1,Outline=3,Shadow=1",
+    'fun': "FontName=Comic Sans MS,FontSize=11,PrimaryColour=&H0000FFFF,OutlineColour=&H80000000,BorderStyle=1,Outline=3,Shadow=1",
+    'minimal': "FontName=Helvetica,FontSize=12,PrimaryColour=&H00FFFFFF,OutlineColour=&H00000000,BorderStyle=1,Outline=0,Shadow=0",
+    'red_alert': "FontName=Impact,FontSize=11,PrimaryColour=&H000000FF,OutlineColour=&H80000000,BorderStyle=1,Outline=4,Shadow=1",
+}
+
+# 'yes' highlights each word as it is spoken (inline \k tags) inside its phrase
+CAPTION_KARAOKE = os.environ.get('KLEEP_CAPTION_KARAOKE', 'yes') == 'yes'
+
+# Script resolution height libass uses for SRT input, so STYLE_MAP font sizes look the same
+PLAY_RES_Y = 288
+# Not-yet-spoken words in karaoke mode
+KARAOKE_UPCOMING_COLOUR = '&H60FFFFFF'
+
+PHRASE_PAUSE_SECONDS = 0.6
+PHRASE_MAX_SECONDS = 3.0
+LINE_MAX_CHARS = 20
+PHRASE_MAX_LINES = 2
+
+# Defaults of the style ffmpeg gives converted SRT subtitles, in ASS Style field order
+ASS_STYLE_FIELDS = [
+    ('Name', 'Default'), ('Fontname', 'Arial'), ('Fontsize', '16'),
+    ('PrimaryColour', '&H00FFFFFF'), ('SecondaryColour', '&H00FFFFFF'),
+    ('OutlineColour', '&H00000000'), ('BackColour', '&H00000000'),
+    ('Bold', '0'), ('Italic', '0'), ('Underline', '0'), ('StrikeOut', '0'),
+    ('ScaleX', '100'), ('ScaleY', '100'), ('Spacing', '0'), ('Angle', '0'),
+    ('BorderStyle', '1'), ('Outline', '1'), ('Shadow', '0'), ('Alignment', '2'),
+    ('MarginL', '10'), ('MarginR', '10'), ('MarginV', '10'), ('Encoding', '0'),
+]
+
+
+def parse_force_style(style_options):
+    values = {}
+    for pair in style_options.split(','):
+        if '=' in pair:
+            key, value = pair.split('=', 1)
+            values[key.strip().lower()] = value.strip()
+    return values
+
+
+def ass_style_line(name, style_options, karaoke=False):
+    overrides = parse_force_style(style_options)
+    overrides['name'] = name  # keys are matched case-insensitively (FontName -> Fontname)
+    if karaoke:
+        overrides['secondarycolour'] = KARAOKE_UPCOMING_COLOUR
+    values = [overrides.get(field.lower(), default) for field, default in ASS_STYLE_FIELDS]
+    return "Style: " + ",".join(values)
+
+
+def ass_time(seconds):
+    seconds = max(seconds, 0)
+    cs = int(round(seconds * 100))
+    h, cs = divmod(cs, 360000)
+    m, cs = divmod(cs, 6000)
+    s, cs = divmod(cs, 100)
+    return f"{h}:{m:02}:{s:02}.{cs:02}"
+
+
+def ass_escape(text):
+    return text.replace('\\', '').replace('{', '(').replace('}', ')').replace('\n', ' ')
+
+
+def group_phrases(words, pause=PHRASE_PAUSE_SECONDS, max_seconds=PHRASE_MAX_SECONDS, line_chars=LINE_MAX_CHARS, max_lines=PHRASE_MAX_LINES):
+    """
+    Group timed words into phrases, breaking on pauses, sentence ends, a duration cap and
+    the space available on screen. Returns lists of word dicts.
+    """
+    phrases = []
+    current = []
+    lines = 1
+    line_len = 0
+    for word in words:
+        text = word.get('text', '').strip()
+        if not text:
+            continue
+
+        if current:
+            gap = word.get('start', 0) - current[-1].get('end', 0)
+            too_long = word.get('end', 0) - current[0].get('start', 0) > max_seconds
+            wraps = line_len + 1 + len(text) > line_chars
+            if gap > pause or too_long or (wraps and lines >= max_lines):
+                phrases.append(current)
+                current, lines, line_len = [], 1, 0
+            elif wraps:
+                lines += 1
+                line_len = 0
+
+        current.append({**word, 'text': text, 'line_break': bool(current) and line_len == 0})
+        line_len += len(text) + (1 if line_len else 0)
+
+        if text[-1] in '.?!':
+            phrases.append(current)
+            current, lines, line_len = [], 1, 0
+
+    if current:
+        phrases.append(current)
+    return phrases
+
+
+def phrase_text(phrase, karaoke=False):
+    parts = []
+    for i, word in enumerate(phrase):
+        separator = '' if i == 0 else ('\\N' if word['line_break'] else ' ')
+        text = ass_escape(word['text'])
+        if karaoke:
+            # Highlight lasts until the next word starts, so gaps stay on the current word
+            until = phrase[i + 1]['start'] if i + 1 < len(phrase) else word['end']
+            duration_cs = max(int(round((until - word['start']) * 100)), 1)
+            parts.append(f"{separator}{{\\k{duration_cs}}}{text}")
+        else:
+            parts.append(separator + text)
+    return ''.join(parts)
+
+
+def generate_caption_ass(selected_words, ass_path, clip_start, clip_end, style='professional', output_size=None, karaoke=CAPTION_KARAOKE):
+    """
+    Write phrase-grouped captions as a native ASS script: one Dialogue event per phrase,
+    STYLE_MAP entries as real styles, optional per-word karaoke highlighting.
+    """
+    if style not in STYLE_MAP:
+        style = 'professional'
+
+    if output_size:
+        width, height = output_size
+        play_res_x = int(round(PLAY_RES_Y * width / height))
+    else:
+        play_res_x = 384
+
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {play_res_x}",
+        f"PlayResY: {PLAY_RES_Y}",
+        "ScaledBorderAndShadow: yes",
+        "WrapStyle: 2",
+        "",
+        "[V4+ Styles]",
+        "Format: " + ", ".join(field for field, _ in ASS_STYLE_FIELDS),
+    ]
+    lines += [ass_style_line(name, options, karaoke) for name, options in STYLE_MAP.items()]
+    lines += [
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ]
+
+    clip_length = clip_end - clip_start
+    for phrase in group_phrases(selected_words):
+        start = min(max(phrase[0]['start'] - clip_start, 0), clip_length)
+        end = min(max(phrase[-1]['end'] - clip_start, start), clip_length)
+        if end <= start:
+            continue
+        lines.append(
+            f"Dialogue: 0,{ass_time(start)},{ass_time(end)},{style},,0,0,0,,{phrase_text(phrase, karaoke)}"
+        )
+
+    with open(ass_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+    print(f" ASS caption file saved: {ass_path}")
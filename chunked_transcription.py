@@ -0,0 +1,195 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from model_registry import transcribe_with_model, get_whisper_model
+from audio_artifact import open_audio, to_float32, AUDIO_SAMPLE_RATE as SAMPLE_RATE
+
+# Audio longer than this is split at silences and transcribed chunk by chunk
+TRANSCRIBE_CHUNK_SECONDS = float(os.environ.get('KLEEP_TRANSCRIBE_CHUNK_SECONDS', '300'))
+# Parallel transcription processes; 0 = roughly one per 4 cores (capped by the number of chunks)
+TRANSCRIBE_WORKERS = int(os.environ.get('KLEEP_TRANSCRIBE_WORKERS', '0'))
+
+SILENCE_SEARCH_SECONDS = 20   # how far back from the chunk limit to look for a pause
+ENERGY_FRAME_SECONDS = 0.03
+ENERGY_SMOOTH_SECONDS = 0.3
+ENERGY_BLOCK_FRAMES = 4096    # frames converted to float at a time (about 2 minutes of audio)
+
+_pool = None
+_pool_plan = None
+_pool_lock = threading.Lock()
+
+
+def words_from_result(result):
+    words = []
+    if 'segments' in result:
+        for segment in result['segments']:
+            if 'words' in segment:
+                words.extend(segment['words'])  # detailed word-level
+            else:
+                # fallback (rare)
+                words.append({
+                    'start': segment.get('start', 0),
+                    'end': segment.get('end', 0),
+                    'text': segment.get('text', '').strip()
+                })
+    return words
+
+
+def frame_energy(samples, sr=SAMPLE_RATE):
+    frame_len = max(1, int(ENERGY_FRAME_SECONDS * sr))
+    frame_count = len(samples) // frame_len
+    energy = np.empty(frame_count, dtype=np.float32)
+    # Block by block, so the memmapped artifact is never copied whole
+    for first in range(0, frame_count, ENERGY_BLOCK_FRAMES):
+        last = min(first + ENERGY_BLOCK_FRAMES, frame_count)
+        frames = np.asarray(samples[first * frame_len:last * frame_len], dtype=np.float32).reshape(-1, frame_len)
+        energy[first:last] = np.sqrt(np.mean(np.square(frames), axis=1))
+
+    # Smooth so we land in a pause, not on one quiet frame between syllables
+    smooth = max(1, int(ENERGY_SMOOTH_SECONDS / ENERGY_FRAME_SECONDS))
+    if smooth > 1 and len(energy) >= smooth:
+        energy = np.convolve(energy, np.ones(smooth, dtype=np.float32) / smooth, mode='same')
+    return energy, frame_len
+
+
+def find_split_points(samples, sr=SAMPLE_RATE, chunk_seconds=TRANSCRIBE_CHUNK_SECONDS, search_seconds=SILENCE_SEARCH_SECONDS):
+    """
+    Split points (in samples) so that no chunk is longer than `chunk_seconds`, each placed at
+    the quietest moment in the last `search_seconds` before the limit.
+    Returns a list of (start_sample, end_sample).
+    """
+    total = len(samples)
+    chunk_len = int(chunk_seconds * sr)
+    if total <= chunk_len:
+        return [(0, total)]
+
+    energy, frame_len = frame_energy(samples, sr)
+    search_frames = max(1, int(search_seconds * sr / frame_len))
+
+    bounds = []
+    start = 0
+    while total - start > chunk_len:
+        limit_frame = (start + chunk_len) // frame_len
+        first_frame = max(start // frame_len + 1, limit_frame - search_frames)
+        window = energy[first_frame:limit_frame]
+        if len(window):
+            # Middle of the quietest stretch, so the cut sits inside the pause
+            quietest = np.flatnonzero(window <= window.min() + 1e-6)
+            cut_frame = first_frame + int(quietest[len(quietest) // 2])
+            cut = cut_frame * frame_len + frame_len // 2
+        else:
+            cut = start + chunk_len
+        bounds.append((start, cut))
+        start = cut
+    bounds.append((start, total))
+    return bounds
+
+
+def _init_worker(threads):
+    import torch
+    torch.set_num_threads(threads)
+    # Load once per worker; the pool outlives the job, so later chunks reuse it
+    get_whisper_model()
+
+
+def _transcribe_chunk(artifact_path, start, end, options):
+    # Workers map the shared audio file themselves instead of receiving pickled samples
+    samples = open_audio(artifact_path)
+    result = transcribe_with_model(to_float32(samples[start:end]), **options)
+    return words_from_result(result)
+
+
+def stitch_words(chunk_results, bounds, sr=SAMPLE_RATE):
+    """
+    Shift each chunk's words to absolute time and join them. Chunks are cut in pauses, so
+    every word belongs to exactly one chunk; timestamps are clamped to the chunk and kept
+    monotonic across seams.
+    """
+    words = []
+    last_end = 0.0
+    for chunk_words, (start_sample, end_sample) in zip(chunk_results, bounds):
+        offset = start_sample / sr
+        chunk_end = end_sample / sr
+        for word in chunk_words:
+            start = min(max(word.get('start', 0) + offset, offset, last_end), chunk_end)
+            end = min(max(word.get('end', 0) + offset, start), chunk_end)
+            words.append({**word, 'start': round(start, 3), 'end': round(end, 3)})
+        if words:
+            last_end = words[-1]['end']
+    return words
+
+
+def transcription_plan(chunk_count, max_workers=None):
+    """
+    (workers this audio can use, pool size, torch threads per worker). The pool is sized
+    for the configured workers rather than one file's chunks, so every job can share it.
+    """
+    cores = os.cpu_count() or 1
+    pool_size = max_workers if max_workers is not None else TRANSCRIBE_WORKERS
+    if pool_size <= 0:
+        pool_size = max(1, cores // 4)
+    return max(1, min(pool_size, chunk_count)), pool_size, max(1, cores // pool_size)
+
+
+def transcription_pool(pool_size, threads):
+    """
+    Long-lived pool of transcription processes, started on first use, each holding its
+    own Whisper model.
+    """
+    global _pool, _pool_plan
+    with _pool_lock:
+        if _pool is not None and _pool_plan != (pool_size, threads):
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is None:
+            # spawn, not fork: the parent may already hold torch thread pools
+            context = multiprocessing.get_context('spawn')
+            _pool = ProcessPoolExecutor(max_workers=pool_size, mp_context=context, initializer=_init_worker, initargs=(threads,))
+            _pool_plan = (pool_size, threads)
+        return _pool
+
+
+def _discard_pool(pool):
+    # A worker died (out of memory, most likely); the next transcription starts a new pool
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def transcribe_chunked(artifact_path, options, progress=None, max_workers=None):
+    samples = open_audio(artifact_path)
+    bounds = find_split_points(samples)
+    workers, pool_size, threads = transcription_plan(len(bounds), max_workers)
+    print(f"Transcribing {len(samples) / SAMPLE_RATE:.0f}s of audio as {len(bounds)} chunks on {workers} workers")
+
+    chunk_results = [None] * len(bounds)
+    done = 0
+
+    if workers == 1:
+        for i, (start, end) in enumerate(bounds):
+            chunk_results[i] = words_from_result(transcribe_with_model(to_float32(samples[start:end]), **options))
+            done += 1
+            if progress:
+                progress(done * 100 / len(bounds))
+    else:
+        pool = transcription_pool(pool_size, threads)
+        try:
+            futures = {
+                pool.submit(_transcribe_chunk, artifact_path, start, end, options): i
+                for i, (start, end) in enumerate(bounds)
+            }
+            for future in as_completed(futures):
+                chunk_results[futures[future]] = future.result()
+                done += 1
+                if progress:
+                    progress(done * 100 / len(bounds))
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            raise
+
+    return stitch_words(chunk_results, bounds)
@@ -0,0 +1,311 @@
+import os, shlex, shutil, subprocess, threading, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from moviepy.editor import VideoFileClip
+from helpers import crop_to_vertical
+from render_engine import render_clip, restyle_clip, fast_cut, output_size
+from captions import STYLE_MAP, generate_caption_ass
+from smart_crop import SMART_CROP, load_crop_path, crop_expression
+from encoding_profiles import get_encoding_profile, video_args, moviepy_args
+from instrumentation import span, run_subprocess
+from previews import PREVIEWS, preview_paths, make_previews, preview_files
+from cut_cache import cut_path, cut_fingerprint, describe_cut, find_cut, discard_cut, link_file
+from pysrt import SubRipFile, SubRipItem, SubRipTime
+
+# Everything a render worker runs. Kept apart from video_utils so spawned workers don't
+# import the transcription and LLM modules (torch, Whisper, the OpenAI client).
+
+# 'ass' writes phrase-grouped ASS captions (ffmpeg engine); 'srt' keeps one SRT event per word
+CAPTION_FORMAT = os.environ.get('KLEEP_CAPTION_FORMAT', 'ass')
+
+
+def seconds_to_subrip_time(seconds):
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    secs = int(seconds % 60)
+    milliseconds = int((seconds - int(seconds)) * 1000)
+    return SubRipTime(hours=hours, minutes=minutes, seconds=secs, milliseconds=milliseconds)
+
+
+def generate_caption_srt(selected_words, srt_path, clip_start, clip_end):
+    subs = SubRipFile()
+
+    for i, word in enumerate(selected_words):
+        start_sec = word.get('start', clip_start)
+        end_sec = word.get('end', clip_end)
+
+        subs.append(
+            SubRipItem(
+                index=i+1,
+                start=seconds_to_subrip_time(start_sec - clip_start),
+                end=seconds_to_subrip_time(end_sec - clip_start),
+                text=word.get('text', '')
+            )
+        )
+
+    subs.save(srt_path, encoding='utf-8')
+    print(f" SRT file saved: {srt_path}")
+
+
+def burn_subtitles(video_path, srt_path, output_path, style='professional', threads=None, profile=None):
+    style_options = STYLE_MAP.get(style, STYLE_MAP['professional'])  # ← Get style safely
+    
+    subtitles_filter = f"subtitles={shlex.quote(srt_path)}:force_style='{style_options}'"
+
+    command = [
+        "ffmpeg",
+        "-y",
+        "-i", video_path,
+        "-vf", subtitles_filter,
+        *video_args(profile or get_encoding_profile(), threads),
+        "-c:a", "copy",
+        "-movflags", "+faststart", 
+        output_path
+    ]
+    if threads:
+        command[2:2] = ["-threads", str(threads)]
+
+    try:
+        print(f"🛠️ Running command: {' '.join(command)}")  # Helpful log
+        run_subprocess(command, check=True)
+        print(f" Subtitles burned successfully to {output_path}")
+    except subprocess.CalledProcessError as e:
+        print(f" Failed to burn subtitles: {e}")
+
+
+def burn_captions(input_video, srt_path, output_video, style='professional', threads=None, profile=None):
+    burn_subtitles(input_video, srt_path, output_video, style=style, threads=threads, profile=profile)
+
+
+def extract_subclip(video_path, start, end, output_path, threads=None, profile=None):
+    clip = VideoFileClip(video_path).subclip(start, end)
+    clip.write_videofile(
+        output_path,
+        temp_audiofile=os.path.splitext(output_path)[0] + '-temp-audio.m4a',  # per clip, so parallel renders don't collide
+        remove_temp=True,
+        logger=None,
+        **moviepy_args(profile or get_encoding_profile(), threads)
+    )
+    clip.close()
+
+
+def create_vertical_version(input_video, output_video, threads=4, profile=None):
+    crop_to_vertical(input_video, output_video, threads=threads, profile=profile)
+
+def build_clip_metadata(project_folder, clip_filename, segment, caption_text, previews=None, index=None, cut=None):
+    return {
+        "index": index,
+        "project_folder": os.path.basename(project_folder),
+        "clip_file": os.path.basename(clip_filename),
+        "start": segment['start'],
+        "end": segment['end'],
+        "reason": segment.get('reason', 'No reason provided'),
+        "viral_score": segment.get('viral_score', 0),
+        "caption_text": caption_text,
+        # poster / sprite / sprite_vtt / hls, relative to the project folder
+        "previews": preview_files(project_folder, previews),
+        # uncaptioned cut kept for re-styles (cut_cache.describe_cut), or None
+        "cut": cut
+    }
+
+
+MIN_CLIP_LENGTH = 15  # minimum duration in seconds for any clip
+
+# 'ffmpeg' renders each clip in one pass; 'moviepy' keeps the old cut -> caption -> crop steps
+RENDER_ENGINE = os.environ.get('KLEEP_RENDER_ENGINE', 'ffmpeg')
+
+# Number of clips rendered at once; 0 = one per core (capped by the number of clips)
+RENDER_WORKERS = int(os.environ.get('KLEEP_RENDER_WORKERS', '0'))
+
+_pool = None
+_pool_size = None
+_pool_lock = threading.Lock()
+
+
+def render_pool_size(max_workers=None):
+    workers = max_workers if max_workers is not None else RENDER_WORKERS
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+
+def render_plan(segment_count, max_workers=None):
+    """
+    Return (workers, encoder_threads) so that workers * encoder_threads ~= available cores.
+    """
+    cores = os.cpu_count() or 1
+    workers = max(1, min(render_pool_size(max_workers), segment_count))
+    encoder_threads = max(1, cores // workers)
+    return workers, encoder_threads
+
+
+def render_pool(size):
+    """
+    Long-lived pool of render processes, started on first use and shared by every job.
+    """
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is not None and _pool_size != size:
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is None:
+            # spawn, not fork: jobs run on threads while others (jobs, SSE streams, the
+            # OpenAI client) may hold locks a forked child would inherit
+            context = multiprocessing.get_context('spawn')
+            _pool = ProcessPoolExecutor(max_workers=size, mp_context=context)
+            _pool_size = size
+        return _pool
+
+
+def discard_render_pool(pool):
+    # A worker died; the next job starts a new pool
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def render_segment(i, seg, video_path, duration, source_size, safe_prefix, project_folder, should_burn_captions, caption_style, selected_words, keyframe_index=None, threads=None, profile=None, source_fps=None, source_sha256=None, keep_cut=False, stored_cut=None, scratch_dir=None):
+    try:
+        profile = profile or get_encoding_profile()
+        scratch_dir = scratch_dir or project_folder
+        w, h = source_size
+        is_vertical = h > w
+        start = max(0, seg['start'] - 0.5)  # small pad before start
+        end = min(seg['end'], duration)
+        if start >= duration or (end - start) < 5:
+            print(f" Skipping clip {i+1}: invalid or too short.")
+            return None
+
+        print(f" Processing clip {i+1}: start={start:.2f}, end={end:.2f}, duration={end-start:.2f}s")
+
+        srt_path = None
+        if should_burn_captions == 'yes' and selected_words:
+            #  Step 1: Generate captions
+            with span("caption", clip=i+1):
+                if CAPTION_FORMAT == 'ass' and RENDER_ENGINE != 'moviepy':
+                    srt_path = os.path.join(scratch_dir, f"{safe_prefix}_clip_{i+1}.ass")
+                    generate_caption_ass(selected_words, srt_path, start, end, caption_style, output_size(source_size, not is_vertical))
+                else:
+                    srt_path = os.path.join(scratch_dir, f"{safe_prefix}_clip_{i+1}.srt")
+                    generate_caption_srt(selected_words, srt_path, start, end)
+            print(f" Caption file created at {srt_path}")
+        else:
+            print(f" No captions for clip {i+1}.")
+
+        #  Step 2: Cut, caption and crop
+        vertical_clip_path = os.path.join(project_folder, f"{safe_prefix}_clip_{i+1}_vertical.mp4")
+        previews = preview_paths(vertical_clip_path) if PREVIEWS else None
+        rendered_previews = False
+        subtitle_style = STYLE_MAP.get(caption_style, STYLE_MAP['professional']) if srt_path and srt_path.endswith('.srt') else None
+        clip_cut_path = cut_path(vertical_clip_path)
+        fingerprint = cut_fingerprint(source_sha256, start, end) if source_sha256 else None
+        cut = None
+
+        # Re-style: the stored uncaptioned cut only needs the new captions
+        stored_cut_path = find_cut(project_folder, stored_cut, fingerprint) if fingerprint else None
+        if stored_cut_path:
+            try:
+                with span("encode", clip=i+1, engine='restyle'):
+                    rendered_previews = restyle_clip(stored_cut_path, vertical_clip_path, srt_path, subtitle_style, threads, profile, stored_cut.get('profile'), previews)
+                cut = stored_cut
+            except subprocess.CalledProcessError as e:
+                print(f" Re-style from the stored cut failed for clip {i+1}, rendering from the source: {e}")
+
+        if not cut:
+            # A stale cut may be a hard link of the clip about to be rewritten
+            discard_cut(clip_cut_path)
+            # Uncaptioned clips are their own cut; captioned ones cost a second encode
+            keep_cut = bool(fingerprint) and RENDER_ENGINE != 'moviepy' and (keep_cut or not srt_path)
+            cut_crop = 'none' if is_vertical else 'centre'
+
+            # Already vertical and uncaptioned: cut by stream copy instead of re-encoding
+            copied = None
+            if not srt_path and is_vertical:
+                with span("cut", clip=i+1):
+                    copied = fast_cut(video_path, vertical_clip_path, start, end, keyframe_index, threads=threads, profile=profile)
+
+            if copied:
+                # The cut may have snapped to keyframes: the clip's stored times (the start
+                # keeps its pad), previews and caption text follow what was actually cut. Not
+                # kept as a cut: its fingerprint is for the requested range, and captions made
+                # for that range would not line up with it.
+                keep_cut = False
+                seg = {**seg, 'start': round(seg['start'] + copied[0] - start, 3), 'end': round(copied[1], 3)}
+                start, end = copied
+                selected_words = [w for w in selected_words if w['end'] > start and w['start'] < end]
+                print(f" Clip {i+1} cut without re-encoding.")
+            elif RENDER_ENGINE == 'moviepy':
+                with span("encode", clip=i+1, engine='moviepy'):
+                    render_segment_in_steps(video_path, start, end, is_vertical, srt_path, caption_style, vertical_clip_path, threads, profile, scratch_dir)
+            else:
+                crop_x = None
+                # SRT captions are burned before the crop and laid out for the centre, so they keep it
+                if SMART_CROP and not is_vertical and not (srt_path and srt_path.endswith('.srt')):
+                    try:
+                        with span("crop", clip=i+1):
+                            crop_x = crop_expression(load_crop_path(video_path, project_folder, start, end, source_size))
+                        cut_crop = 'smart'
+                    except Exception as e:
+                        print(f" Smart crop failed for clip {i+1}, centre-cropping: {e}")
+                render_args = dict(
+                    source_size=source_size,
+                    crop_vertical=not is_vertical,
+                    srt_path=srt_path,
+                    subtitle_style=subtitle_style,
+                    threads=threads,
+                    crop_x=crop_x,
+                    profile=profile,
+                    source_fps=source_fps,
+                    # Captioned clips write their uncaptioned cut from the same decode
+                    cut_path=clip_cut_path if keep_cut else None
+                )
+                with span("encode", clip=i+1, engine='ffmpeg'):
+                    try:
+                        # Poster, sprite and HLS come off the same decode and encode
+                        render_clip(video_path, vertical_clip_path, start, end, previews=previews, **render_args)
+                        rendered_previews = bool(previews)
+                    except subprocess.CalledProcessError:
+                        if not previews:
+                            raise
+                        print(f" Render with previews failed for clip {i+1}, rendering the clip alone")
+                        render_clip(video_path, vertical_clip_path, start, end, **render_args)
+
+            if keep_cut:
+                # An uncaptioned clip is its own cut
+                if not srt_path:
+                    link_file(vertical_clip_path, clip_cut_path)
+                cut = describe_cut(clip_cut_path, fingerprint, profile['name'], cut_crop)
+        print(f" Rendered vertical clip: {vertical_clip_path}")
+
+        #  Step 3: Previews for clips that were not decoded above
+        if previews and not rendered_previews:
+            try:
+                with span("previews", clip=i+1):
+                    make_previews(vertical_clip_path, end - start, output_size(source_size, not is_vertical), previews)
+            except Exception as e:
+                print(f" Could not make previews for clip {i+1}: {e}")
+
+        #  Step 4: Clip metadata
+        return build_clip_metadata(project_folder, vertical_clip_path, seg, " ".join([w['text'] for w in selected_words]), previews, index=i, cut=cut)
+
+    except Exception as e:
+        print(f" Error processing clip {i+1}: {e}")
+        return None
+
+
+def render_segment_in_steps(video_path, start, end, is_vertical, srt_path, caption_style, vertical_clip_path, threads=None, profile=None, scratch_dir=None):
+    # Original three-encode path: moviepy cut -> ffmpeg caption burn -> moviepy crop
+    base_path = os.path.join(scratch_dir or os.path.dirname(vertical_clip_path), os.path.basename(vertical_clip_path)[:-len('_vertical.mp4')])
+
+    raw_clip_path = base_path + "_raw.mp4"
+    extract_subclip(video_path, start, end, raw_clip_path, threads=threads, profile=profile)
+    final_clip_path = raw_clip_path
+
+    if srt_path:
+        captioned_path = base_path + "_captioned.mp4"
+        burn_captions(raw_clip_path, srt_path, captioned_path, caption_style, threads=threads, profile=profile)
+        final_clip_path = captioned_path
+
+    if is_vertical:
+        shutil.copy2(final_clip_path, vertical_clip_path)
+    else:
+        create_vertical_version(final_clip_path, vertical_clip_path, threads=threads or 4, profile=profile)
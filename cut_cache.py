@@ -0,0 +1,74 @@
+import os, json, shutil, hashlib
+
+# Each clip's uncaptioned vertical cut is kept next to it, so changing the caption style
+# only burns captions on the cut (see pipeline.run_restyle_job). Uncaptioned clips are
+# their own cut (a hard link). For captioned clips the cut is a second encode from the
+# same decode, about as long as the clip's own; it is made with every captioned clip so
+# even the first re-style only burns captions. 'no' skips it, and then the first
+# re-style renders each clip from the source and keeps the cut for the ones after it.
+KEEP_CUTS = os.environ.get('KLEEP_KEEP_CUTS', 'yes') == 'yes'
+CUT_VERSION = 1
+CUT_SUFFIX = '_cut.mp4'
+
+
+def cut_path(clip_path):
+    return os.path.splitext(clip_path)[0] + CUT_SUFFIX
+
+
+def cut_fingerprint(source_sha256, start, end):
+    """
+    What a cut was made from: the source video's contents and the clip's time range.
+    """
+    payload = json.dumps({"version": CUT_VERSION, "source": source_sha256, "start": round(start, 3), "end": round(end, 3)}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def describe_cut(path, fingerprint, profile_name, crop):
+    # Entry for the clip's metadata; size and mtime tell later re-styles the file is untouched
+    stat = os.stat(path)
+    return {
+        "file": os.path.basename(path),
+        "fingerprint": fingerprint,
+        "profile": profile_name,
+        "crop": crop,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+    }
+
+
+def find_cut(project_folder, record, fingerprint):
+    """
+    Path of a stored cut that still matches its record and the clip it is asked for,
+    or None.
+    """
+    if not record or record.get("fingerprint") != fingerprint:
+        return None
+    path = os.path.join(project_folder, os.path.basename(record.get("file", "")))
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if stat.st_size != record.get("size") or stat.st_mtime != record.get("mtime"):
+        return None
+    return path
+
+
+def discard_cut(path):
+    # A cut may be a hard link of the clip, so it is unlinked before either is rewritten
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def link_file(source, destination):
+    """
+    Hard-link source at destination (replacing it), copying where links are not supported.
+    """
+    tmp_path = f"{destination}.{os.getpid()}.tmp"
+    discard_cut(tmp_path)
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copy2(source, tmp_path)
+    os.replace(tmp_path, destination)
@@ -0,0 +1,31 @@
+import os, mimetypes
+from flask import Response, abort, send_from_directory
+from werkzeug.security import safe_join
+
+# Who sends clip bytes: 'off' streams them from Flask, 'x-sendfile' (Apache mod_xsendfile,
+# lighttpd) and 'x-accel' (nginx) hand the file to the front server
+SENDFILE_MODE = os.environ.get('KLEEP_SENDFILE', 'off')
+# nginx `internal` location that maps onto the clips folder, for 'x-accel'
+ACCEL_REDIRECT_PREFIX = os.environ.get('KLEEP_ACCEL_REDIRECT_PREFIX', '/protected-clips/')
+
+mimetypes.add_type('application/vnd.apple.mpegurl', '.m3u8')
+mimetypes.add_type('video/mp2t', '.ts')
+mimetypes.add_type('text/vtt', '.vtt')
+
+
+def send_clip_file(clips_folder, filename):
+    """
+    Response for a file under the clips folder. In 'x-accel' mode only headers are sent
+    and nginx serves the body (ranges included); 'x-sendfile' is handled by Flask's
+    USE_X_SENDFILE, which app.py sets from the same setting.
+    """
+    clips_folder = os.path.abspath(clips_folder)
+    path = safe_join(clips_folder, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    if SENDFILE_MODE == 'x-accel':
+        response = Response(mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + filename
+        return response
+    return send_from_directory(clips_folder, filename)
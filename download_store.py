@@ -0,0 +1,163 @@
+import os, json, shutil, hashlib, tempfile, threading
+import yt_dlp
+from yt_dlp.extractor import gen_extractor_classes
+from render_engine import VERTICAL_HEIGHT
+
+DOWNLOAD_STORE = os.environ.get('KLEEP_DOWNLOAD_STORE', 'yes') == 'yes'
+DOWNLOAD_STORE_PATH = os.environ.get('KLEEP_DOWNLOAD_STORE_PATH', os.path.join('cache', 'downloads'))
+# Nothing above the output height is ever used, so don't download 4K to make 1080p clips
+DOWNLOAD_MAX_HEIGHT = int(os.environ.get('KLEEP_DOWNLOAD_MAX_HEIGHT', str(VERTICAL_HEIGHT)))
+
+_key_locks = {}
+_key_locks_lock = threading.Lock()
+
+
+def download_format(max_height=DOWNLOAD_MAX_HEIGHT):
+    if not max_height:
+        return 'bestvideo+bestaudio/best'
+    return f'bestvideo[height<={max_height}]+bestaudio/best[height<={max_height}]/best'
+
+
+def video_key(url):
+    """
+    "<extractor>_<video id>" worked out from the URL alone (no network), so youtu.be and
+    watch?v= links share an entry. URLs only the generic extractor handles are keyed by
+    a hash of the URL.
+    """
+    for ie in gen_extractor_classes():
+        if ie.ie_key() == 'Generic' or not ie.suitable(url):
+            continue
+        try:
+            video_id = ie.get_temp_id(url)
+        except Exception:
+            video_id = None
+        if video_id:
+            return f"{ie.ie_key()}_{video_id}"
+        break
+    return "url_" + hashlib.sha256(url.encode('utf-8')).hexdigest()[:16]
+
+
+def store_key(video_key, format_spec):
+    format_hash = hashlib.sha256(format_spec.encode('utf-8')).hexdigest()[:12]
+    return f"{video_key}_{format_hash}"
+
+
+def _lock_for(key):
+    with _key_locks_lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def _store_paths(key):
+    base = os.path.join(DOWNLOAD_STORE_PATH, key)
+    return base + '.mp4', base + '.json'
+
+
+def load_stored(key):
+    video_path, meta_path = _store_paths(key)
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(video_path):
+        return None
+    return video_path, meta
+
+
+def _save_stored(key, downloaded_path, info):
+    video_path, meta_path = _store_paths(key)
+    os.makedirs(DOWNLOAD_STORE_PATH, exist_ok=True)
+    os.replace(downloaded_path, video_path)
+    meta = {"id": info.get('id'), "title": info.get('title'), "height": info.get('height'), "webpage_url": info.get('webpage_url')}
+    with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(meta_path + '.tmp', meta_path)
+    return video_path, meta
+
+
+def downloaded_path(ydl, info):
+    # Where yt-dlp actually put the (merged) file
+    for download in info.get('requested_downloads') or []:
+        if download.get('filepath'):
+            return download['filepath']
+    return info.get('filepath') or ydl.prepare_filename(info)
+
+
+def fetch(url, progress=None, format_spec=None):
+    """
+    Download `url` into a private temp dir (so concurrent jobs never see each other's
+    files) and, when the store is on, keep it in the content store keyed by video ID and
+    format. Returns (path, metadata, stored): a stored file must be linked into place
+    (link_into), anything else is the caller's to move.
+    """
+    format_spec = format_spec or download_format()
+    if not DOWNLOAD_STORE:
+        path, info = _download(url, progress, format_spec)
+        return path, {"id": info.get('id'), "title": info.get('title'), "height": info.get('height')}, False
+
+    key = store_key(video_key(url), format_spec)
+    with _lock_for(key):
+        stored = load_stored(key)
+        if stored:
+            print(f" Reusing stored download {stored[0]}")
+            if progress:
+                progress(100)
+        else:
+            path, info = _download(url, progress, format_spec)
+            stored = _save_stored(key, path, info)
+    return stored + (True,)
+
+
+def _download(url, progress, format_spec):
+    os.makedirs(DOWNLOAD_STORE_PATH, exist_ok=True)
+    temp_dir = tempfile.mkdtemp(prefix='download_', dir=DOWNLOAD_STORE_PATH)
+    ydl_opts = {
+        'outtmpl': os.path.join(temp_dir, 'video.%(ext)s'),
+        'format': format_spec,
+        'merge_output_format': 'mp4',
+        'quiet': True,
+    }
+
+    if progress:
+        def report_download(d):
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            if d.get('status') == 'downloading' and total:
+                progress(d.get('downloaded_bytes', 0) * 100 / total)
+            elif d.get('status') == 'finished':
+                progress(100)
+
+        ydl_opts['progress_hooks'] = [report_download]
+
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=True)
+            path = downloaded_path(ydl, info)
+        if not os.path.exists(path):
+            raise Exception("Downloaded video not found!")
+        # Move it out of the temp dir before that is removed
+        final_path = os.path.join(DOWNLOAD_STORE_PATH, os.path.basename(temp_dir) + os.path.splitext(path)[1])
+        os.replace(path, final_path)
+        return final_path, info
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def link_into(source_path, target_path, keep_source=True):
+    """
+    Put a downloaded file at target_path: hard link (no copy) when it stays in the
+    store, otherwise rename; copy only across filesystems.
+    """
+    if os.path.exists(target_path):
+        if os.path.samefile(source_path, target_path):
+            return target_path
+        os.remove(target_path)
+    try:
+        if keep_source:
+            os.link(source_path, target_path)
+        else:
+            os.replace(source_path, target_path)
+    except OSError:
+        shutil.copyfile(source_path, target_path)
+        if not keep_source:
+            os.remove(source_path)
+    return target_path
@@ -0,0 +1,131 @@
+import os, time, tempfile
+from instrumentation import run_subprocess
+
+# Named x264/AAC settings. fps is a cap (None keeps the source rate); threads None lets
+# the render pool split cores between clips.
+ENCODING_PROFILES = {
+    'fast-preview': {
+        'preset': 'ultrafast',
+        'crf': 23,
+        'threads': None,
+        'fps': 24,
+        'audio_bitrate': '96k',
+    },
+    'balanced': {
+        'preset': 'veryfast',
+        'crf': 23,
+        'threads': None,
+        'fps': 30,
+        'audio_bitrate': '128k',
+    },
+    'archive': {
+        'preset': 'slow',
+        'crf': 18,
+        'threads': None,
+        'fps': None,
+        'audio_bitrate': '192k',
+    },
+}
+
+# fast-preview matches what the vertical render always used (ultrafast, 24 fps)
+DEFAULT_ENCODING_PROFILE = os.environ.get('KLEEP_ENCODING_PROFILE', 'fast-preview')
+
+
+def get_encoding_profile(name=None):
+    """
+    Profile settings by name (with 'name' filled in); unknown names get the default.
+    """
+    name = name if name in ENCODING_PROFILES else DEFAULT_ENCODING_PROFILE
+    if name not in ENCODING_PROFILES:
+        name = 'fast-preview'
+    return {'name': name, **ENCODING_PROFILES[name]}
+
+
+def output_fps(profile, source_fps=None):
+    """
+    Frame rate to encode at, or None to keep the source's.
+    """
+    cap = profile.get('fps')
+    if not cap:
+        return None
+    if source_fps and source_fps <= cap:
+        return None
+    return cap
+
+
+def video_args(profile, threads=None):
+    args = ["-c:v", "libx264", "-preset", profile['preset'], "-crf", str(profile['crf'])]
+    threads = profile.get('threads') or threads
+    if threads:
+        args += ["-threads", str(threads)]
+    return args
+
+
+def audio_args(profile):
+    return ["-c:a", "aac", "-b:a", profile['audio_bitrate']]
+
+
+def moviepy_args(profile, threads=None):
+    # write_videofile keyword arguments for the moviepy engine
+    return {
+        'codec': 'libx264',
+        'audio_codec': 'aac',
+        'preset': profile['preset'],
+        'audio_bitrate': profile['audio_bitrate'],
+        'ffmpeg_params': ['-crf', str(profile['crf'])],
+        'threads': profile.get('threads') or threads,
+    }
+
+
+def make_sample_video(path, duration, width=1280, height=720, pauses=False):
+    """
+    Generated test video (testsrc2 picture, sine tone, a keyframe every 2s) for the
+    encoding benchmark and benchmarks/. pauses gates the tone off for a second every
+    7 seconds, so fake transcripts have pauses to split phrases and chunks on.
+    """
+    audio_filter = ["-af", "volume='if(lt(mod(t,7),6),1,0)':eval=frame"] if pauses else []
+    run_subprocess([
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate=30:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=44100:duration={duration}",
+        *audio_filter,
+        "-c:v", "libx264", "-preset", "veryfast", "-g", "60", "-c:a", "aac", "-shortest",
+        path
+    ], check=True)
+
+
+def benchmark_profiles(source_path=None, seconds=20, threads=None, names=None):
+    """
+    Render the same vertical clip with each profile on this host. Returns one dict per
+    profile: encode frames/s, output bytes per second of video, and wall time.
+    """
+    from media_info import get_media_info
+    from render_engine import render_clip
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        if not source_path:
+            source_path = os.path.join(tmp, 'sample.mp4')
+            make_sample_video(source_path, seconds)
+
+        info = get_media_info(source_path, tmp)
+        seconds = min(seconds, info.duration)
+        for name in names or ENCODING_PROFILES:
+            profile = get_encoding_profile(name)
+            output_path = os.path.join(tmp, f"{name}.mp4")
+            started = time.perf_counter()
+            render_clip(source_path, output_path, 0, seconds, source_size=info.size,
+                        crop_vertical=not info.is_vertical, threads=threads,
+                        profile=profile, source_fps=info.fps)
+            elapsed = time.perf_counter() - started
+
+            frames = seconds * (output_fps(profile, info.fps) or info.fps)
+            size = os.path.getsize(output_path)
+            results.append({
+                "profile": name,
+                "seconds": round(elapsed, 2),
+                "fps": round(frames / elapsed, 1),
+                "bytes_per_second": int(size / seconds),
+                "realtime": round(seconds / elapsed, 2),
+            })
+    return results
@@ -1,5 +1,6 @@
 import os, uuid, re
 from moviepy.editor import VideoFileClip
+from encoding_profiles import get_encoding_profile, output_fps, moviepy_args
 
 ALLOWED_EXTENSIONS = {'mp4', 'mov', 'mkv'}
 
@@ -22,7 +23,7 @@ def beautify_title(title):
     clean_title = title.replace('_', ' ').title()
     return clean_title
 
-def crop_to_vertical(input_path, output_path):
+def crop_to_vertical(input_path, output_path, threads=4, profile=None):
     try:
         clip = VideoFileClip(input_path)
         w, h = clip.size
@@ -41,14 +42,14 @@ def crop_to_vertical(input_path, output_path):
             x2 = x_center + new_w / 2
             final_clip = clip.crop(x1=x1, x2=x2).resize(height=1080)
 
+        profile = profile or get_encoding_profile()
         final_clip.write_videofile(
             output_path,
-            codec='libx264',
-            audio_codec='aac',
-            preset='ultrafast',
-            threads=4,
-            fps=24,
-            logger=None
+            fps=output_fps(profile, clip.fps) or clip.fps,
+            # Next to the input (the job's scratch dir), not in the working directory
+            temp_audiofile=os.path.splitext(input_path)[0] + '-temp-audio.m4a',
+            logger=None,
+            **moviepy_args(profile, threads)
         )
         print(f"Cropped and saved vertical video: {output_path}")
     except Exception as e:
@@ -0,0 +1,202 @@
+import os, glob, json, time, uuid, hashlib, threading
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+from transcript_cache import write_hash_sidecar, HASH_SIDECAR_SUFFIX
+
+MAX_UPLOAD_MB = int(os.environ.get('KLEEP_MAX_UPLOAD_MB', '400'))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024   # disk write / request read size
+UPLOAD_TTL_SECONDS = 24 * 3600        # unfinished resumable uploads are dropped after this long
+INCOMING_FOLDER = '.incoming'         # inside the clips folder, so finished uploads are renamed, not copied
+VIDEO_FILENAME = 'full_video.mp4'
+
+_uploads = {}
+_uploads_lock = threading.Lock()
+
+
+class UploadOffsetMismatch(Exception):
+    def __init__(self, expected):
+        super().__init__(f"Expected a chunk starting at byte {expected}")
+        self.expected = expected
+
+
+class IngestFile:
+    """
+    Upload destination that hashes and size-checks bytes as they are written. Werkzeug
+    writes multipart file data straight into it; the file is renamed into its project
+    with move_to(), and removed on close() if nobody claimed it.
+    """
+
+    def __init__(self, folder, max_bytes=MAX_UPLOAD_BYTES):
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(folder, f"{uuid.uuid4().hex}.part")
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._file = open(self.path, 'wb+', buffering=UPLOAD_CHUNK_SIZE)
+        self._claimed = False
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_bytes and self.size > self.max_bytes:
+            self.discard()
+            raise RequestEntityTooLarge(f"File too large! Max {self.max_bytes // (1024 * 1024)} MB allowed.")
+        self._digest.update(data)
+        return self._file.write(data)
+
+    def sha256(self):
+        return self._digest.hexdigest()
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def flush(self):
+        self._file.flush()
+
+    def move_to(self, destination):
+        self._file.close()
+        os.replace(self.path, destination)
+        self._claimed = True
+
+    def discard(self):
+        self._file.close()
+        if not self._claimed:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+        self._claimed = True
+
+    def close(self):
+        # Called by Werkzeug when the request ends
+        self.discard()
+
+
+class IngestRequest(Request):
+    """
+    Request class that streams uploaded files into IngestFile instead of spooling them
+    to a temp file first.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return IngestFile(incoming_folder(), MAX_UPLOAD_BYTES)
+
+
+def incoming_folder():
+    return os.path.join(current_app.config['CLIPS_FOLDER'], INCOMING_FOLDER)
+
+
+def find_project_by_hash(clips_folder, sha256):
+    """
+    Project folder whose video has this SHA-256 (read from the hash sidecars), or None.
+    """
+    for sidecar in glob.glob(os.path.join(clips_folder, 'project_*', VIDEO_FILENAME + HASH_SIDECAR_SUFFIX)):
+        video_path = sidecar[:-len(HASH_SIDECAR_SUFFIX)]
+        try:
+            with open(sidecar, encoding='utf-8') as f:
+                cached = json.load(f)
+            stat = os.stat(video_path)
+        except (OSError, ValueError):
+            continue
+        if cached.get('sha256') == sha256 and cached.get('size') == stat.st_size and cached.get('mtime') == stat.st_mtime:
+            return os.path.dirname(video_path)
+    return None
+
+
+def ingest_upload(upload, clips_folder, video_title):
+    """
+    Put a finished IngestFile into its project folder. A byte-identical video that is
+    already stored is reused along with its project (cached transcript, audio, keyframes).
+    Returns (video_path, video_title, project_folder, reused).
+    """
+    sha256 = upload.sha256()
+    existing = find_project_by_hash(clips_folder, sha256)
+    if existing:
+        upload.discard()
+        print(f" Upload matches {existing}, reusing it")
+        return (
+            os.path.join(existing, VIDEO_FILENAME),
+            os.path.basename(existing)[len('project_'):],
+            existing,
+            True,
+        )
+
+    project_folder = os.path.join(clips_folder, f"project_{video_title}")
+    os.makedirs(project_folder, exist_ok=True)
+    video_path = os.path.join(project_folder, VIDEO_FILENAME)
+    upload.move_to(video_path)
+    write_hash_sidecar(video_path, sha256)
+    return video_path, video_title, project_folder, False
+
+
+def _forget_stale_uploads():
+    cutoff = time.time() - UPLOAD_TTL_SECONDS
+    for upload_id in [u for u, entry in _uploads.items() if entry["updated"] < cutoff]:
+        _uploads.pop(upload_id)["file"].discard()
+
+
+def start_upload(folder, filename, size):
+    """
+    Begin a resumable upload of `size` bytes. Chunks are appended with append_chunk().
+    """
+    if size > MAX_UPLOAD_BYTES:
+        raise RequestEntityTooLarge(f"File too large! Max {MAX_UPLOAD_MB} MB allowed.")
+
+    entry = {
+        "id": uuid.uuid4().hex,
+        "filename": filename,
+        "size": size,
+        "file": IngestFile(folder, max_bytes=size),
+        "lock": threading.Lock(),
+        "updated": time.time(),
+    }
+    with _uploads_lock:
+        _forget_stale_uploads()
+        _uploads[entry["id"]] = entry
+    return entry
+
+
+def get_upload(upload_id):
+    with _uploads_lock:
+        return _uploads.get(upload_id)
+
+
+def append_chunk(entry, offset, stream):
+    """
+    Append the bytes of `stream` at `offset`, which must be where the last chunk ended.
+    Returns the new offset.
+    """
+    with entry["lock"]:
+        upload = entry["file"]
+        if offset != upload.size:
+            raise UploadOffsetMismatch(upload.size)
+        try:
+            for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b''):
+                upload.write(chunk)
+        except RequestEntityTooLarge:
+            # More bytes than announced: the upload is already discarded
+            with _uploads_lock:
+                _uploads.pop(entry["id"], None)
+            raise
+        upload.flush()
+        entry["updated"] = time.time()
+        return upload.size
+
+
+def take_upload(upload_id):
+    """
+    Remove a completed upload from the registry and return its entry ("file" is the
+    IngestFile), or None if the upload is unknown or incomplete.
+    """
+    with _uploads_lock:
+        entry = _uploads.get(upload_id)
+        if not entry or entry["file"].size != entry["size"]:
+            return None
+        del _uploads[upload_id]
+    return entry
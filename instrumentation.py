@@ -0,0 +1,249 @@
+import os, sys, json, time, resource, threading, subprocess
+from contextlib import contextmanager
+
+TIMINGS_FILE = 'timings_{job_id}.json'
+# Upper bounds (seconds) for the wall and CPU time histograms
+HISTOGRAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_local = threading.local()
+_metrics_lock = threading.Lock()
+_histograms = {}     # (metric, stage) -> [bucket counts..., sum, count]
+_counters = {}       # (metric, labels) -> value
+_job_spans = {}      # job_id -> [span records]
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def _active_spans():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def run_subprocess(command, **kwargs):
+    """
+    subprocess.run, counted towards the calling thread's open spans.
+    """
+    for record in getattr(_local, 'stack', ()):
+        record['subprocesses'] += 1
+    return subprocess.run(command, **kwargs)
+
+
+def _io_bytes():
+    # Bytes through read()/write() for this process and its finished subprocesses (Linux only)
+    try:
+        with open('/proc/self/io') as f:
+            fields = dict(line.split(': ') for line in f.read().splitlines())
+        return int(fields['rchar']), int(fields['wchar'])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+
+def _rss_bytes():
+    # Current resident set size of this process (Linux only)
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _max_rss_bytes(who):
+    # Lifetime high-water mark; ru_maxrss is KB on Linux, bytes on macOS
+    rss = resource.getrusage(who).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def _child_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+@contextmanager
+def job_context(job_id):
+    """
+    Attribute spans finished on this thread to job_id until the block exits.
+    """
+    previous = getattr(_local, 'job_id', None)
+    _local.job_id = job_id
+    try:
+        yield
+    finally:
+        _local.job_id = previous
+
+
+def current_job():
+    return getattr(_local, 'job_id', None)
+
+
+@contextmanager
+def span(stage, **fields):
+    """
+    Measure one pipeline stage: wall time, CPU time (this thread, and subprocesses that
+    finished inside the span), the process's resident memory when it started and ended,
+    bytes read/written and subprocesses started with run_subprocess().
+    Subprocess CPU and I/O are process-wide counters, so they include any other job
+    running at the same time. Extra keyword fields are kept in the span record.
+    """
+    record = {"stage": stage, "job_id": current_job(), "started": time.time(), **fields, "subprocesses": 0, "rss_start_bytes": _rss_bytes()}
+    read_before, written_before = _io_bytes()
+    child_cpu_before = _child_cpu()
+    cpu_before = time.thread_time()
+    wall_before = time.perf_counter()
+
+    _active_spans().append(record)
+    status = 'ok'
+    try:
+        yield record
+    except BaseException:
+        status = 'error'
+        raise
+    finally:
+        _active_spans().remove(record)
+        read_after, written_after = _io_bytes()
+        record.update({
+            "status": status,
+            "wall_seconds": round(time.perf_counter() - wall_before, 4),
+            "cpu_seconds": round(time.thread_time() - cpu_before, 4),
+            "subprocess_cpu_seconds": round(_child_cpu() - child_cpu_before, 4),
+            # Whole-process samples, not the stage's own usage: other jobs share the process
+            "rss_end_bytes": _rss_bytes(),
+            "read_bytes": read_after - read_before,
+            "written_bytes": written_after - written_before,
+        })
+        collector = getattr(_local, 'collector', None)
+        if collector is not None:
+            collector.append(record)
+        else:
+            record_spans([record])
+
+
+def run_traced(fn, *args, **kwargs):
+    """
+    Call fn in a worker process and return (result, spans) so the parent can record the
+    worker's spans with record_spans().
+    """
+    _local.collector = []
+    try:
+        return fn(*args, **kwargs), _local.collector
+    finally:
+        _local.collector = None
+
+
+def _observe(metric, stage, value):
+    entry = _histograms.setdefault((metric, stage), [0] * (len(HISTOGRAM_BUCKETS) + 2))
+    for k, bound in enumerate(HISTOGRAM_BUCKETS):
+        if value <= bound:
+            entry[k] += 1
+    entry[-2] += value
+    entry[-1] += 1
+
+
+def _increment(metric, labels, value=1):
+    key = (metric, tuple(sorted(labels.items())))
+    _counters[key] = _counters.get(key, 0) + value
+
+
+def record_spans(records):
+    """
+    Add finished span records to the metrics and to their job's timings (spans from a
+    worker process are given the calling thread's job).
+    """
+    job_id = current_job()
+    with _metrics_lock:
+        for record in records:
+            record['job_id'] = record.get('job_id') or job_id
+            stage = record['stage']
+            _observe('kleep_stage_duration_seconds', stage, record['wall_seconds'])
+            _observe('kleep_stage_cpu_seconds', stage, record['cpu_seconds'] + record['subprocess_cpu_seconds'])
+            _increment('kleep_stage_runs_total', {"stage": stage, "status": record['status']})
+            _increment('kleep_stage_read_bytes_total', {"stage": stage}, record['read_bytes'])
+            _increment('kleep_stage_written_bytes_total', {"stage": stage}, record['written_bytes'])
+            _increment('kleep_stage_subprocesses_total', {"stage": stage}, record['subprocesses'])
+            if record['job_id']:
+                _job_spans.setdefault(record['job_id'], []).append(record)
+
+
+def job_spans(job_id):
+    with _metrics_lock:
+        return list(_job_spans.get(job_id, []))
+
+
+def forget_job_spans(job_id):
+    with _metrics_lock:
+        _job_spans.pop(job_id, None)
+
+
+def summarize_spans(spans):
+    # Totals per stage, in the order stages first ran
+    stages = {}
+    for record in spans:
+        total = stages.setdefault(record['stage'], {"count": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "subprocess_cpu_seconds": 0.0, "read_bytes": 0, "written_bytes": 0, "subprocesses": 0})
+        total["count"] += 1
+        for key in ("wall_seconds", "cpu_seconds", "subprocess_cpu_seconds"):
+            total[key] = round(total[key] + record[key], 4)
+        for key in ("read_bytes", "written_bytes", "subprocesses"):
+            total[key] += record[key]
+    return stages
+
+
+def write_job_timings(job_id, project_folder):
+    """
+    Save the job's spans and per-stage totals as timings_<job_id>.json in the project folder.
+    """
+    spans = job_spans(job_id)
+    path = os.path.join(project_folder, TIMINGS_FILE.format(job_id=job_id))
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"job_id": job_id, "stages": summarize_spans(spans), "spans": spans}, f, indent=2)
+    except OSError as e:
+        print(f" Could not save job timings: {e}")
+        return None
+    return path
+
+
+def _labels(pairs):
+    return ",".join(f'{k}="{v}"' for k, v in pairs)
+
+
+def render_metrics():
+    """
+    Metrics in the Prometheus text exposition format. Counts are per process.
+    """
+    with _metrics_lock:
+        histograms = {key: list(value) for key, value in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    for metric, help_text in (
+        ('kleep_stage_duration_seconds', "Wall time per pipeline stage."),
+        ('kleep_stage_cpu_seconds', "CPU time per pipeline stage, including subprocesses."),
+    ):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+        for (name, stage), entry in sorted(histograms.items()):
+            if name != metric:
+                continue
+            for bound, count in zip(HISTOGRAM_BUCKETS, entry):
+                lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'{metric}_bucket{{stage="{stage}",le="+Inf"}} {entry[-1]}')
+            lines.append(f'{metric}_sum{{stage="{stage}"}} {entry[-2]:.4f}')
+            lines.append(f'{metric}_count{{stage="{stage}"}} {entry[-1]}')
+
+    for metric, help_text in (
+        ('kleep_stage_runs_total', "Finished stage runs by status."),
+        ('kleep_stage_read_bytes_total', "Bytes read during each stage."),
+        ('kleep_stage_written_bytes_total', "Bytes written during each stage."),
+        ('kleep_stage_subprocesses_total', "Subprocesses started during each stage."),
+    ):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        for (name, labels), value in sorted(counters.items()):
+            if name == metric:
+                lines.append(f"{metric}{{{_labels(labels)}}} {value}")
+
+    for metric, help_text, value in (
+        ('kleep_process_resident_memory_bytes', "Resident set size of this process.", _rss_bytes()),
+        ('kleep_process_peak_resident_memory_bytes', "Highest resident set size of this process since it started.", _max_rss_bytes(resource.RUSAGE_SELF)),
+        ('kleep_subprocess_peak_resident_memory_bytes', "Highest resident set size of any finished subprocess.", _max_rss_bytes(resource.RUSAGE_CHILDREN)),
+    ):
+        if value is not None:
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge", f"{metric} {value}"]
+    return "\n".join(lines) + "\n"
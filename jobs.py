@@ -0,0 +1,118 @@
+import os, time, uuid, copy, threading
+from concurrent.futures import ThreadPoolExecutor
+from instrumentation import job_context, forget_job_spans
+from storage import release_scratch, wake_sweeper
+
+JOB_WORKERS = int(os.environ.get('KLEEP_JOB_WORKERS', '2'))
+JOB_TTL_SECONDS = 6 * 3600  # finished jobs are forgotten after this long
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='kleep-job')
+_jobs = {}
+_jobs_changed = threading.Condition()
+
+
+def _new_job(kind):
+    now = time.time()
+    return {
+        "id": uuid.uuid4().hex,
+        "kind": kind,
+        "status": "queued",   # queued -> running -> done | failed
+        "stage": None,
+        "progress": {
+            "download": 0,
+            "transcription": 0,
+            "analysis": 0,
+            "clips": {"done": 0, "total": 0},
+        },
+        "result": None,
+        "error": None,
+        "created": now,
+        "updated": now,
+        "version": 0,
+    }
+
+
+def _forget_old_jobs():
+    cutoff = time.time() - JOB_TTL_SECONDS
+    for job_id in [j for j, job in _jobs.items() if job["status"] in ("done", "failed") and job["updated"] < cutoff]:
+        del _jobs[job_id]
+
+
+def _touch(job):
+    job["updated"] = time.time()
+    job["version"] += 1
+    _jobs_changed.notify_all()
+
+
+def create_job(kind='process'):
+    job = _new_job(kind)
+    with _jobs_changed:
+        _forget_old_jobs()
+        _jobs[job["id"]] = job
+    return job["id"]
+
+
+def get_job(job_id):
+    with _jobs_changed:
+        job = _jobs.get(job_id)
+        return copy.deepcopy(job) if job else None
+
+
+def update_job(job_id, **changes):
+    with _jobs_changed:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        job.update(changes)
+        _touch(job)
+
+
+def set_progress(job_id, stage, value):
+    """
+    Record progress for a stage. `value` is a percentage (0-100), or a
+    (done, total) tuple for the clip rendering stage.
+    """
+    with _jobs_changed:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        job["stage"] = stage
+        if stage == "clips":
+            done, total = value
+            job["progress"]["clips"] = {"done": done, "total": total}
+        else:
+            job["progress"][stage] = round(min(max(value, 0), 100), 1)
+        _touch(job)
+
+
+def wait_for_change(job_id, seen_version, timeout=15):
+    """
+    Block until the job's version moves past `seen_version` (or timeout) and return a snapshot.
+    """
+    with _jobs_changed:
+        _jobs_changed.wait_for(
+            lambda: job_id not in _jobs or _jobs[job_id]["version"] != seen_version,
+            timeout=timeout
+        )
+        job = _jobs.get(job_id)
+        return copy.deepcopy(job) if job else None
+
+
+def submit_job(job_id, fn, *args, **kwargs):
+    def run():
+        update_job(job_id, status="running")
+        try:
+            with job_context(job_id):
+                result = fn(job_id, *args, **kwargs)
+            update_job(job_id, status="done", stage=None, result=result)
+        except Exception as e:
+            print(f" Job {job_id} failed: {e}")
+            update_job(job_id, status="failed", error=str(e))
+        finally:
+            forget_job_spans(job_id)
+            # Intermediates go with the job; the sweeper then checks the disk budget
+            release_scratch(job_id)
+            wake_sweeper()
+
+    _executor.submit(run)
+    return job_id
@@ -0,0 +1,157 @@
+import os, json, time, sqlite3, hashlib, threading
+
+LLM_CACHE_ENABLED = os.environ.get('KLEEP_LLM_CACHE', 'yes') == 'yes'
+LLM_CACHE_PATH = os.environ.get('KLEEP_LLM_CACHE_PATH', os.path.join('cache', 'llm_responses.sqlite3'))
+LLM_CACHE_MAX_MB = float(os.environ.get('KLEEP_LLM_CACHE_MB', '100'))
+# Bump when prompts or response parsing change in a way that makes old answers unusable
+LLM_CACHE_SCHEMA_VERSION = 1
+# Stores between full size checks; writes from other processes are only noticed then
+EVICT_EVERY_PUTS = 100
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "saved_seconds": 0.0}
+_size_lock = threading.Lock()
+_size = {"bytes": None, "puts": 0}   # running total of the cache's size, as of the last check
+
+
+def _connection():
+    # One connection per thread; WAL + busy timeout let several worker processes share the file
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        folder = os.path.dirname(LLM_CACHE_PATH)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        conn = sqlite3.connect(LLM_CACHE_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                latency REAL NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        _local.conn = conn
+    return conn
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def cache_key(model, temperature, prompt):
+    payload = json.dumps({
+        "schema": LLM_CACHE_SCHEMA_VERSION,
+        "model": model,
+        "temperature": temperature,
+        "prompt": prompt,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get_response(key):
+    try:
+        conn = _connection()
+        row = conn.execute("SELECT response, latency FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+    except sqlite3.Error as e:
+        print(f"LLM cache read failed: {e}")
+        row = None
+
+    if row is None:
+        _count("misses")
+        return None
+    _count("hits")
+    _count("saved_seconds", row[1])
+    return row[0]
+
+
+def _max_bytes():
+    return int(LLM_CACHE_MAX_MB * 1024 * 1024)
+
+
+def put_response(key, response, latency):
+    now = time.time()
+    size = len(response.encode('utf-8'))
+    try:
+        conn = _connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, response, size, latency, created, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, response, size, latency, now, now)
+        )
+        _count("stores")
+        # The size is only summed again once the running total passes the limit
+        # (or every EVICT_EVERY_PUTS stores), not on every put
+        with _size_lock:
+            if _size["bytes"] is not None:
+                _size["bytes"] += size
+            _size["puts"] += 1
+            due = _size["bytes"] is None or _size["bytes"] > _max_bytes() or _size["puts"] >= EVICT_EVERY_PUTS
+        if due:
+            evict(conn)
+    except sqlite3.Error as e:
+        print(f"LLM cache write failed: {e}")
+
+
+def evict(conn=None, max_bytes=None):
+    """
+    Drop least recently used entries until the cache is back under its size limit.
+    """
+    conn = conn or _connection()
+    max_bytes = max_bytes if max_bytes is not None else _max_bytes()
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    if total <= max_bytes:
+        _sync_size(total)
+        return 0
+
+    removed = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+            if total <= max_bytes:
+                break
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            removed += 1
+        conn.execute("COMMIT")
+    except sqlite3.Error:
+        conn.execute("ROLLBACK")
+        raise
+    _sync_size(total)
+    _count("evictions", removed)
+    return removed
+
+
+def _sync_size(total):
+    with _size_lock:
+        _size["bytes"] = total
+        _size["puts"] = 0
+
+
+def clear_cache():
+    conn = _connection()
+    removed = conn.execute("DELETE FROM responses").rowcount
+    _sync_size(0)
+    return removed
+
+
+def get_llm_cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+    stats["saved_seconds"] = round(stats["saved_seconds"], 2)
+    stats["enabled"] = LLM_CACHE_ENABLED
+    try:
+        entries, size = _connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        stats["entries"] = entries
+        stats["bytes"] = size
+    except sqlite3.Error:
+        pass
+    return stats
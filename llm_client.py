@@ -0,0 +1,129 @@
+import os, json, time, random, asyncio
+import openai
+from openai import OpenAI, AsyncOpenAI
+from llm_cache import cache_key, get_response, put_response, LLM_CACHE_ENABLED
+
+LLM_CONCURRENCY = int(os.environ.get('KLEEP_LLM_CONCURRENCY', '8'))
+LLM_MAX_RETRIES = int(os.environ.get('KLEEP_LLM_MAX_RETRIES', '5'))
+LLM_BACKOFF_BASE = 1.0    # seconds
+LLM_BACKOFF_MAX = 30.0
+
+RETRYABLE_STATUS = {408, 409, 429}
+
+_client = None
+
+
+def is_retryable(error):
+    if isinstance(error, openai.APIConnectionError):  # includes timeouts
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS or error.status_code >= 500
+    return False
+
+
+def backoff_delay(attempt, error=None):
+    # Honour Retry-After when the server sends it, otherwise exponential backoff with full jitter
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), LLM_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+def parse_json_response(raw):
+    if not raw:
+        raise ValueError("Empty response from OpenAI")
+    # Clean any backticks if GPT sends Markdown
+    raw = raw.replace('```json', '').replace('```', '').strip()
+    return json.loads(raw)
+
+
+def _store_if_valid(key, raw, latency, validate):
+    # Only answers the caller can use are cached, so a bad reply is never pinned
+    if validate:
+        try:
+            validate(raw)
+        except Exception:
+            return
+    put_response(key, raw, latency)
+
+
+def sync_client():
+    # One client for every blocking call; the SDK's own retries are off, since they would
+    # stack under the retry loop below
+    global _client
+    if _client is None:
+        _client = OpenAI(api_key=openai.api_key, base_url=openai.base_url, max_retries=0)
+    return _client
+
+
+def chat_completion(prompt, model="gpt-4o", temperature=0.7, use_cache=None, validate=parse_json_response):
+    """
+    Blocking chat completion with retries on rate limits, 5xx and connection errors.
+    Answers are served from / saved to the response cache unless use_cache is False.
+    Returns the message text.
+    """
+    use_cache = LLM_CACHE_ENABLED if use_cache is None else use_cache
+    key = cache_key(model, temperature, prompt) if use_cache else None
+    if key:
+        cached = get_response(key)
+        if cached is not None:
+            return cached
+
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            started = time.perf_counter()
+            res = sync_client().chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature,
+            )
+            raw = (res.choices[0].message.content or '').strip()
+            if key:
+                _store_if_valid(key, raw, time.perf_counter() - started, validate)
+            return raw
+        except Exception as e:
+            if attempt >= LLM_MAX_RETRIES or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, e)
+            print(f"OpenAI request failed ({e.__class__.__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def async_client():
+    # Same credentials/endpoint as the module-level client; retries are handled here
+    return AsyncOpenAI(api_key=openai.api_key, base_url=openai.base_url, max_retries=0)
+
+
+async def async_chat_completion(client, semaphore, prompt, model="gpt-4o", temperature=0.7, use_cache=None, validate=parse_json_response):
+    use_cache = LLM_CACHE_ENABLED if use_cache is None else use_cache
+    key = cache_key(model, temperature, prompt) if use_cache else None
+    # Cache reads and writes are blocking SQLite calls; keep them off the event loop
+    if key:
+        cached = await asyncio.to_thread(get_response, key)
+        if cached is not None:
+            return cached
+
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            async with semaphore:
+                started = time.perf_counter()
+                res = await client.chat.completions.create(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=temperature,
+                )
+                latency = time.perf_counter() - started
+            raw = (res.choices[0].message.content or '').strip()
+            if key:
+                await asyncio.to_thread(_store_if_valid, key, raw, latency, validate)
+            return raw
+        except Exception as e:
+            if attempt >= LLM_MAX_RETRIES or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, e)
+            print(f"OpenAI request failed ({e.__class__.__name__}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
@@ -0,0 +1,211 @@
+import os, json, subprocess, threading
+from instrumentation import span, run_subprocess
+
+MEDIA_INFO_FILE = 'media_info.json'
+MEDIA_INFO_VERSION = 2
+
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+class MediaInfo:
+    """
+    What the pipeline needs to know about a source video, from one ffprobe call:
+    duration, size, rotation, fps, codecs and audio layout, plus keyframe times once
+    they have been scanned. Saved as media_info.json in the project folder.
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+    def __repr__(self):
+        return f"MediaInfo({self.size[0]}x{self.size[1]}, {self.duration:.1f}s, {self.video_codec}/{self.audio_codec})"
+
+    @property
+    def duration(self):
+        return self.data.get('duration') or 0.0
+
+    @property
+    def coded_size(self):
+        return self.data.get('width') or 0, self.data.get('height') or 0
+
+    @property
+    def rotation(self):
+        return self.data.get('rotation', 0)
+
+    @property
+    def size(self):
+        # Size as displayed: ffmpeg (and moviepy) apply the rotation when decoding
+        w, h = self.coded_size
+        return (h, w) if self.rotation in (90, 270) else (w, h)
+
+    @property
+    def is_vertical(self):
+        w, h = self.size
+        return h > w
+
+    @property
+    def fps(self):
+        return self.data.get('fps') or 0.0
+
+    @property
+    def video_codec(self):
+        return self.data.get('video_codec')
+
+    @property
+    def audio_codec(self):
+        return self.data.get('audio_codec')
+
+    @property
+    def has_audio(self):
+        return self.audio_codec is not None
+
+    @property
+    def audio_channels(self):
+        return self.data.get('audio_channels')
+
+    @property
+    def audio_layout(self):
+        return self.data.get('audio_layout')
+
+    @property
+    def audio_sample_rate(self):
+        return self.data.get('audio_sample_rate')
+
+    @property
+    def stream_params(self):
+        # What re-encoded pieces must share with the source to be concatenated with it
+        keys = ('width', 'height', 'video_codec', 'video_profile', 'video_level', 'pix_fmt',
+                'audio_codec', 'audio_profile', 'audio_channels', 'audio_sample_rate')
+        return {key: self.data.get(key) for key in keys}
+
+    @property
+    def keyframes(self):
+        # None until scan_keyframes has run for this source
+        return self.data.get('keyframes')
+
+    @property
+    def codecs(self):
+        return {"video": self.video_codec, "audio": self.audio_codec}
+
+
+def _rate(value):
+    try:
+        num, _, den = (value or '').partition('/')
+        return float(num) / float(den or 1) if float(den or 1) else 0.0
+    except ValueError:
+        return 0.0
+
+
+def _rotation(stream):
+    rotate = (stream.get('tags') or {}).get('rotate')
+    if rotate is not None:
+        return int(float(rotate)) % 360
+    # Newer ffprobe reports the display matrix instead (counter-clockwise degrees)
+    for side_data in stream.get('side_data_list') or []:
+        if 'rotation' in side_data:
+            return int(-float(side_data['rotation'])) % 360
+    return 0
+
+
+def parse_probe(probe):
+    streams = probe.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video' and not (s.get('disposition') or {}).get('attached_pic')), {})
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), {})
+
+    duration = float((probe.get('format') or {}).get('duration') or video.get('duration') or 0)
+    return {
+        "duration": duration,
+        "width": video.get('width'),
+        "height": video.get('height'),
+        "rotation": _rotation(video),
+        "fps": _rate(video.get('avg_frame_rate')) or _rate(video.get('r_frame_rate')),
+        "video_codec": video.get('codec_name'),
+        "video_profile": video.get('profile'),
+        "video_level": video.get('level'),
+        "pix_fmt": video.get('pix_fmt'),
+        "audio_codec": audio.get('codec_name'),
+        "audio_profile": audio.get('profile'),
+        "audio_channels": audio.get('channels'),
+        "audio_layout": audio.get('channel_layout'),
+        "audio_sample_rate": int(audio['sample_rate']) if audio.get('sample_rate') else None,
+    }
+
+
+def probe_media(video_path):
+    command = [
+        "ffprobe", "-v", "error",
+        "-show_format", "-show_streams",
+        "-of", "json", video_path
+    ]
+    result = run_subprocess(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+    return parse_probe(json.loads(result.stdout))
+
+
+def scan_keyframes(video_path):
+    # Packet scan only: reads the container index/flags, no decoding
+    command = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=print_section=0",
+        video_path
+    ]
+    result = run_subprocess(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+
+    keyframes = []
+    for line in result.stdout.splitlines():
+        parts = line.strip().split(',')
+        if len(parts) >= 2 and 'K' in parts[1] and parts[0] not in ('', 'N/A'):
+            keyframes.append(float(parts[0]))
+    return sorted(keyframes)
+
+
+def _save(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f" Could not save media info: {e}")
+
+
+def get_media_info(video_path, project_folder=None, with_keyframes=False):
+    """
+    MediaInfo for a project's source video. Probed once, then read from the project
+    folder (and memoised in-process) while the file's size and mtime are unchanged.
+    with_keyframes also scans keyframe times the first time they are needed.
+    """
+    project_folder = project_folder or os.path.dirname(video_path)
+    info_path = os.path.join(project_folder, MEDIA_INFO_FILE)
+    stat = os.stat(video_path)
+    source_id = [stat.st_size, stat.st_mtime]
+    memo_key = os.path.abspath(video_path)
+
+    with _memo_lock:
+        data = _memo.get(memo_key)
+    if data is None or data.get('source') != source_id:
+        data = None
+        try:
+            with open(info_path, encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved.get('version') == MEDIA_INFO_VERSION and saved.get('source') == source_id:
+                data = saved
+        except (OSError, ValueError):
+            pass
+
+    if data is None:
+        with span("probe"):
+            data = {"version": MEDIA_INFO_VERSION, "source": source_id, **probe_media(video_path)}
+        _save(info_path, data)
+
+    if with_keyframes and data.get('keyframes') is None:
+        with span("probe", keyframes=True):
+            data = {**data, "keyframes": scan_keyframes(video_path)}
+        _save(info_path, data)
+        print(f" Keyframe index built: {len(data['keyframes'])} keyframes")
+
+    with _memo_lock:
+        _memo[memo_key] = data
+    return MediaInfo(data)
@@ -0,0 +1,138 @@
+import os, time, threading, importlib, types
+from contextlib import contextmanager
+import whisper
+from transcript_cache import get_transcript_cache_stats
+
+# Whisper settings, overridable per deployment
+WHISPER_MODEL_NAME = os.environ.get('KLEEP_WHISPER_MODEL', 'base')
+WHISPER_DEVICE = os.environ.get('KLEEP_WHISPER_DEVICE') or None  # None lets whisper pick cuda/cpu
+WHISPER_THREADS = int(os.environ.get('KLEEP_WHISPER_THREADS', '0'))  # 0 = torch default
+WHISPER_FP16 = os.environ.get('KLEEP_WHISPER_FP16', 'no') == 'yes'
+WHISPER_PREWARM = os.environ.get('KLEEP_WHISPER_PREWARM', 'no') == 'yes'
+
+_models = {}
+_registry_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {
+    "loads": 0,
+    "load_seconds": 0.0,
+    "transcriptions": 0,
+    "transcribe_seconds": 0.0,
+}
+
+
+_progress = threading.local()
+_progress_lock = threading.Lock()
+_progress_users = 0
+_original_tqdm = None
+
+
+def _reporting_bar(base):
+    class ReportingProgressBar(base):
+        # Forwards the bar to the calling thread's progress callback (works even
+        # when the bar is disabled)
+        def update(self, n=1):
+            self._frames_done = getattr(self, '_frames_done', 0) + n
+            callback = getattr(_progress, 'callback', None)
+            if callback and self.total:
+                callback(min(self._frames_done * 100 / self.total, 100))
+            return super().update(n)
+    return ReportingProgressBar
+
+
+@contextmanager
+def _reporting_progress(callback):
+    """
+    While a transcription runs, whisper.transcribe's tqdm bar over mel frames reports
+    to `callback`. The module's own tqdm is put back once no transcription needs it.
+    """
+    global _progress_users, _original_tqdm
+    try:
+        module = importlib.import_module('whisper.transcribe')
+    except ImportError:
+        module = None
+    if callback is None or getattr(module, 'tqdm', None) is None:
+        yield
+        return
+
+    with _progress_lock:
+        if _progress_users == 0:
+            _original_tqdm = module.tqdm
+            module.tqdm = types.SimpleNamespace(tqdm=_reporting_bar(_original_tqdm.tqdm))
+        _progress_users += 1
+    _progress.callback = callback
+    try:
+        yield
+    finally:
+        _progress.callback = None
+        with _progress_lock:
+            _progress_users -= 1
+            if _progress_users == 0:
+                module.tqdm, _original_tqdm = _original_tqdm, None
+
+
+def _apply_thread_setting():
+    if WHISPER_THREADS > 0:
+        import torch
+        torch.set_num_threads(WHISPER_THREADS)
+
+
+def get_whisper_model(name=None, device=None):
+    """
+    Return the process-wide Whisper model for (name, device), loading it on first use.
+    """
+    name = name or WHISPER_MODEL_NAME
+    device = device or WHISPER_DEVICE
+    key = (name, device)
+
+    entry = _models.get(key)
+    if entry is not None:
+        return entry
+
+    with _registry_lock:
+        entry = _models.get(key)
+        if entry is None:
+            _apply_thread_setting()
+            started = time.perf_counter()
+            model = whisper.load_model(name, device=device)
+            elapsed = time.perf_counter() - started
+            # Whisper installs kv-cache hooks on the shared model while decoding,
+            # so inference on one model instance has to be serialised.
+            entry = {"model": model, "lock": threading.Lock()}
+            _models[key] = entry
+            with _stats_lock:
+                _stats["loads"] += 1
+                _stats["load_seconds"] += elapsed
+            print(f"Whisper model '{name}' loaded in {elapsed:.2f}s")
+    return entry
+
+
+def transcribe_with_model(audio, name=None, device=None, progress=None, **options):
+    entry = get_whisper_model(name, device)
+    options.setdefault('fp16', WHISPER_FP16)
+
+    with entry["lock"], _reporting_progress(progress):
+        started = time.perf_counter()
+        result = entry["model"].transcribe(audio, **options)
+        elapsed = time.perf_counter() - started
+
+    with _stats_lock:
+        _stats["transcriptions"] += 1
+        _stats["transcribe_seconds"] += elapsed
+    print(f"Whisper inference took {elapsed:.2f}s")
+    return result
+
+
+def warm_whisper_model():
+    if WHISPER_PREWARM:
+        get_whisper_model()
+
+
+def get_whisper_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["model"] = WHISPER_MODEL_NAME
+    stats["resident_models"] = [name for name, _ in _models.keys()]
+    stats["transcript_cache"] = get_transcript_cache_stats()
+    return stats
@@ -0,0 +1,192 @@
+import numpy as np
+
+# Window lengths accepted downstream (analyze_window keeps 35-90 s moments)
+MIN_WINDOW_SECONDS = 35
+MAX_WINDOW_SECONDS = 90
+PAUSE_SECONDS = 0.5          # gap between words that counts as a pause / boundary
+ENDS_PER_START = 6           # window ends tried per start boundary
+MAX_OVERLAP = 0.5            # candidates overlapping a better one by more than this are dropped
+LOUDNESS_BLOCK_SECONDS = 60  # audio read per step when measuring loudness
+
+KEYWORDS = {
+    'secret', 'secrets', 'never', 'always', 'crazy', 'insane', 'amazing', 'incredible', 'shocking',
+    'mistake', 'mistakes', 'truth', 'money', 'million', 'billion', 'free', 'hack', 'why', 'how',
+    'best', 'worst', 'biggest', 'nobody', 'everyone', 'stop', 'love', 'hate', 'fail', 'failed',
+    'story', 'funny', 'wow', 'imagine', 'literally', 'actually', 'important', 'remember',
+}
+
+# Weights applied to z-scored features
+FEATURE_WEIGHTS = {
+    'speech_rate': 1.0,
+    'loudness': 0.5,
+    'loudness_peak': 0.8,
+    'questions': 0.7,
+    'exclamations': 0.7,
+    'keywords': 1.0,
+    'pauses': 0.2,          # a few rhetorical pauses help...
+    'dead_air': -1.0,       # ...long silences don't
+}
+
+FEATURE_REASONS = {
+    'speech_rate': "fast, energetic delivery",
+    'loudness': "high vocal energy",
+    'loudness_peak': "a loud, emotional peak",
+    'questions': "questions that hook curiosity",
+    'exclamations': "exclamations",
+    'keywords': "attention-grabbing words",
+    'pauses': "well-timed pauses",
+}
+
+
+def word_arrays(transcript):
+    texts = [transcript.raw_text(i).strip() for i in range(len(transcript))]
+    last_char = np.array([t[-1:] for t in texts], dtype='<U1')
+    cleaned = [t.lower().strip('.,!?;:"\'()') for t in texts]
+    return {
+        'has_text': np.array([bool(t) for t in texts]),
+        'question': last_char == '?',
+        'exclamation': last_char == '!',
+        'sentence_end': np.isin(last_char, ['.', '?', '!']),
+        'keyword': np.array([t in KEYWORDS for t in cleaned]),
+    }
+
+
+def loudness_per_second(samples, sr):
+    """
+    RMS loudness (dB) for each whole second of int16 audio.
+    """
+    seconds = len(samples) // sr
+    rms = np.empty(seconds, dtype=np.float32)
+    # A minute at a time, so the memmapped artifact is never copied whole
+    for first in range(0, seconds, LOUDNESS_BLOCK_SECONDS):
+        last = min(first + LOUDNESS_BLOCK_SECONDS, seconds)
+        frames = np.asarray(samples[first * sr:last * sr], dtype=np.float32).reshape(-1, sr) / 32768.0
+        rms[first:last] = np.sqrt(np.mean(np.square(frames), axis=1))
+    return 20 * np.log10(rms + 1e-6)
+
+
+def candidate_pairs(starts, ends, start_ok, end_ok, min_len, max_len):
+    start_idx = np.flatnonzero(start_ok)
+    end_idx = np.flatnonzero(end_ok)
+    end_times = ends[end_idx]
+
+    pair_s, pair_e = [], []
+    for s in start_idx:
+        lo = np.searchsorted(end_times, starts[s] + min_len, side='left')
+        hi = np.searchsorted(end_times, starts[s] + max_len, side='right')
+        if hi <= lo:
+            continue
+        picks = np.unique(np.linspace(lo, hi - 1, num=min(ENDS_PER_START, hi - lo)).astype(np.int64))
+        pair_s.extend([s] * len(picks))
+        pair_e.extend(end_idx[picks])
+    return np.array(pair_s, dtype=np.int64), np.array(pair_e, dtype=np.int64)
+
+
+def _zscore(values):
+    std = values.std()
+    return (values - values.mean()) / std if std > 0 else np.zeros_like(values)
+
+
+def window_features(transcript, s, e, words, loudness=None):
+    starts, ends = transcript.starts, transcript.ends
+    duration = np.maximum(ends[e] - starts[s], 1e-3)
+    minutes = duration / 60.0
+
+    def window_sum(flags):
+        cs = np.concatenate([[0], np.cumsum(flags, dtype=np.float64)])
+        return cs[e + 1] - cs[s]
+
+    gaps = np.concatenate([[0.0], np.maximum(starts[1:] - ends[:-1], 0)])
+    pause_gaps = np.where(gaps > PAUSE_SECONDS, gaps, 0.0)
+    # Gaps *inside* the window: those before words s+1..e
+    inner_gap_time = window_sum(pause_gaps) - pause_gaps[s]
+    inner_pauses = window_sum(pause_gaps > 0) - (pause_gaps[s] > 0)
+
+    features = {
+        'speech_rate': window_sum(words['has_text']) / duration,
+        'questions': window_sum(words['question']) / minutes,
+        'exclamations': window_sum(words['exclamation']) / minutes,
+        'keywords': window_sum(words['keyword']) / minutes,
+        'pauses': inner_pauses / minutes,
+        'dead_air': inner_gap_time / duration,
+    }
+
+    if loudness is not None and len(loudness):
+        first = np.clip(np.floor(starts[s]).astype(np.int64), 0, len(loudness) - 1)
+        last = np.clip(np.ceil(ends[e]).astype(np.int64), first + 1, len(loudness))
+        cs = np.concatenate([[0], np.cumsum(loudness, dtype=np.float64)])
+        features['loudness'] = (cs[last] - cs[first]) / (last - first)
+        features['loudness_peak'] = np.array([loudness[a:b].max() for a, b in zip(first, last)])
+
+    return features
+
+
+def select_top(starts, ends, scores, top_k, max_overlap=MAX_OVERLAP):
+    """
+    Greedy non-maximum suppression: best windows first, skipping ones that mostly overlap a kept one.
+    """
+    kept = []
+    for i in np.argsort(-scores, kind='stable'):
+        overlaps = False
+        for j in kept:
+            overlap = min(ends[i], ends[j]) - max(starts[i], starts[j])
+            shorter = min(ends[i] - starts[i], ends[j] - starts[j])
+            if shorter > 0 and overlap / shorter > max_overlap:
+                overlaps = True
+                break
+        if not overlaps:
+            kept.append(i)
+        if len(kept) >= top_k:
+            break
+    return kept
+
+
+def describe(contributions):
+    best = [name for name, value in sorted(contributions.items(), key=lambda kv: kv[1], reverse=True)
+            if value > 0 and name in FEATURE_REASONS][:2]
+    if not best:
+        return "Complete thought with steady delivery."
+    return "Local pick: " + " and ".join(FEATURE_REASONS[name] for name in best) + "."
+
+
+def generate_candidates(transcript, samples=None, sr=16000, top_k=10, min_len=MIN_WINDOW_SECONDS, max_len=MAX_WINDOW_SECONDS):
+    """
+    Rank 30-90 s windows that start and end on sentence/pause boundaries using cheap local
+    features. Returns moments shaped like analyze_transcript_for_moments output
+    ({start, end, reason, viral_score}), best first.
+    """
+    if transcript is None or len(transcript) == 0:
+        return []
+
+    starts, ends = transcript.starts, transcript.ends
+    words = word_arrays(transcript)
+
+    gaps_after = np.concatenate([starts[1:] - ends[:-1], [np.inf]])
+    end_ok = (words['sentence_end'] | (gaps_after > PAUSE_SECONDS)) & words['has_text']
+    start_ok = np.concatenate([[True], end_ok[:-1]]) & words['has_text']
+
+    s, e = candidate_pairs(starts, ends, start_ok, end_ok, min_len, max_len)
+    if len(s) == 0:
+        return []
+
+    loudness = loudness_per_second(samples, sr) if samples is not None else None
+    features = window_features(transcript, s, e, words, loudness)
+
+    contributions = {name: FEATURE_WEIGHTS[name] * _zscore(values) for name, values in features.items()}
+    scores = np.sum(list(contributions.values()), axis=0)
+
+    window_starts, window_ends = starts[s], ends[e]
+    kept = select_top(window_starts, window_ends, scores, top_k)
+
+    low, high = scores.min(), scores.max()
+    spread = high - low if high > low else 1.0
+
+    moments = []
+    for i in kept:
+        moments.append({
+            "start": round(float(window_starts[i]), 2),
+            "end": round(float(window_ends[i]), 2),
+            "reason": describe({name: values[i] for name, values in contributions.items()}),
+            "viral_score": int(round(100 * (scores[i] - low) / spread)),
+        })
+    return moments
@@ -0,0 +1,159 @@
+import os
+from video_utils import download_video, clip_segments
+from ai_clip_extractor import extract_top_segments, transcribe_audio
+from jobs import set_progress
+from instrumentation import span, write_job_timings, job_spans, summarize_spans
+from project_store import project_id, load_manifest, record_download, record_clips
+from transcript_cache import media_hash
+from ingest import VIDEO_FILENAME
+from storage import in_use
+
+
+def run_download_job(job_id, url):
+    with span("download"):
+        video_path, real_title, video_title, project_folder = download_video(
+            url, progress=lambda pct: set_progress(job_id, "download", pct)
+        )
+    with in_use(project_folder):
+        write_job_timings(job_id, project_folder)
+        record_download(project_folder, job_id, real_title, video_title, source_url=url)
+    return {
+        "project_id": project_id(project_folder),
+        "real_title": real_title,
+        "video_title": video_title,
+    }
+
+
+def run_process_job(job_id, should_burn_captions, caption_style, url=None, video_path=None, real_title=None, video_title=None, project_folder=None, encoding_profile=None):
+    #  Step 0: Fetch the video if we were given a URL
+    if url:
+        with span("download"):
+            video_path, real_title, video_title, project_folder = download_video(
+                url, progress=lambda pct: set_progress(job_id, "download", pct)
+            )
+    else:
+        set_progress(job_id, "download", 100)
+
+    # Not evicted while the job works on it
+    with in_use(project_folder):
+        try:
+            clips, segments = _process_video(job_id, video_path, video_title, project_folder, should_burn_captions, caption_style, encoding_profile)
+        finally:
+            # Saved for failed jobs too, which are the ones worth looking at
+            timings_path = write_job_timings(job_id, project_folder)
+
+        #  Step 4: Keep the results with the project, not in the job or the session
+        record_clips(
+            project_folder, job_id, real_title, video_title, clips,
+            settings={"burn_captions": should_burn_captions, "caption_style": caption_style, "encoding_profile": encoding_profile, "source_url": url},
+            timings=_stage_timings(job_id, timings_path),
+            # What a re-style needs to skip straight to the captions
+            segments=[_segment_record(seg) for seg in segments],
+            source_sha256=media_hash(video_path),
+        )
+
+    return {
+        "project_id": project_id(project_folder),
+        "real_title": real_title,
+        "video_title": video_title,
+        "clip_count": len(clips),
+    }
+
+
+def run_restyle_job(job_id, project_folder, should_burn_captions, caption_style, encoding_profile=None):
+    """
+    New caption style (or captions on/off) for a processed project: the stored segments
+    are rendered again without downloading, transcribing or asking the LLM, and clips
+    with a stored uncaptioned cut only have their captions burned.
+    """
+    with in_use(project_folder):
+        manifest, _ = load_manifest(project_folder)
+        if not manifest or not manifest.get('segments'):
+            raise ValueError("This project has no stored segments to re-style; process the video again.")
+
+        video_path = os.path.join(project_folder, VIDEO_FILENAME)
+        if media_hash(video_path) != manifest.get('source_sha256'):
+            raise ValueError("The project's video has changed since it was processed; process it again.")
+        set_progress(job_id, "download", 100)
+
+        try:
+            #  Step 1: Words for the captions, from the transcript cache
+            transcript_text = None
+            if should_burn_captions == 'yes':
+                with span("transcription"):
+                    transcript_text = transcribe_audio(video_path)
+            set_progress(job_id, "transcription", 100)
+            set_progress(job_id, "analysis", 100)
+
+            #  Step 2: Caption and encode each clip again
+            segments = manifest['segments']
+            stored_cuts = {clip['index']: clip['cut'] for clip in manifest['clips'] if clip.get('index') is not None and clip.get('cut')}
+            set_progress(job_id, "clips", (0, len(segments)))
+            clips = clip_segments(
+                video_path, segments, manifest['video_title'], project_folder, should_burn_captions, caption_style,
+                full_transcript=transcript_text,
+                progress=lambda done, total: set_progress(job_id, "clips", (done, total)),
+                encoding_profile=encoding_profile,
+                keep_cuts=True,
+                stored_cuts=stored_cuts
+            )
+        finally:
+            timings_path = write_job_timings(job_id, project_folder)
+
+        record_clips(
+            project_folder, job_id, manifest.get('real_title'), manifest['video_title'], clips,
+            settings={"burn_captions": should_burn_captions, "caption_style": caption_style, "encoding_profile": encoding_profile},
+            timings=_stage_timings(job_id, timings_path),
+            kind='restyle',
+        )
+
+    return {
+        "project_id": project_id(project_folder),
+        "real_title": manifest.get('real_title'),
+        "video_title": manifest['video_title'],
+        "clip_count": len(clips),
+    }
+
+
+def _stage_timings(job_id, timings_path):
+    stages = summarize_spans(job_spans(job_id))
+    return {
+        "file": os.path.basename(timings_path) if timings_path else None,
+        "stages": {stage: total["wall_seconds"] for stage, total in stages.items()},
+    }
+
+
+def _segment_record(segment):
+    # Only what rendering and the results page use, as plain JSON values
+    viral_score = segment.get('viral_score', 0)
+    return {
+        "start": float(segment['start']),
+        "end": float(segment['end']),
+        "reason": str(segment.get('reason', 'No reason provided')),
+        "viral_score": viral_score if isinstance(viral_score, (int, float)) else float(viral_score),
+    }
+
+
+def _process_video(job_id, video_path, video_title, project_folder, should_burn_captions, caption_style, encoding_profile):
+    #  Step 1: Transcribe audio to text
+    set_progress(job_id, "transcription", 0)
+    with span("transcription"):
+        transcript_text = transcribe_audio(
+            video_path, progress=lambda pct: set_progress(job_id, "transcription", pct)
+        )
+    set_progress(job_id, "transcription", 100)
+
+    #  Step 2: Find highlight segments from transcript
+    set_progress(job_id, "analysis", 0)
+    highlight_segments, _ = extract_top_segments(video_path, full_transcript=transcript_text, max_moments=10)
+    set_progress(job_id, "analysis", 100)
+
+    #  Step 3: Clip video based on those moments
+    set_progress(job_id, "clips", (0, len(highlight_segments)))
+    clips = clip_segments(
+        video_path, highlight_segments, video_title, project_folder, should_burn_captions, caption_style,
+        full_transcript=transcript_text,
+        progress=lambda done, total: set_progress(job_id, "clips", (done, total)),
+        encoding_profile=encoding_profile
+    )
+    return clips, highlight_segments
@@ -0,0 +1,135 @@
+import os, math, subprocess
+from instrumentation import run_subprocess
+
+# Poster frame and scrubbing sprite for every clip; HLS (short segments, so playback starts
+# after the first one) only when asked for, since it doubles the clip's disk use
+PREVIEWS = os.environ.get('KLEEP_PREVIEWS', 'yes') == 'yes'
+PREVIEW_HLS = os.environ.get('KLEEP_PREVIEW_HLS', 'no') == 'yes'
+
+POSTER_SECONDS = 1.0        # poster is the frame at this time (or mid-clip for shorter clips)
+POSTER_WIDTH = 540
+SPRITE_INTERVAL = 2.0       # seconds between scrubbing thumbnails
+SPRITE_WIDTH = 90
+SPRITE_COLUMNS = 10
+HLS_SEGMENT_SECONDS = 2
+
+
+def preview_paths(clip_path, hls=PREVIEW_HLS):
+    base = os.path.splitext(clip_path)[0]
+    return {
+        "poster": base + '_poster.jpg',
+        "sprite": base + '_sprite.jpg',
+        "sprite_vtt": base + '_sprite.vtt',
+        "hls": os.path.join(base + '_hls', 'index.m3u8') if hls else None,
+    }
+
+
+def sprite_layout(duration, frame_size):
+    """
+    (count, columns, rows, thumb_w, thumb_h) of the thumbnail sprite for a clip.
+    """
+    count = max(1, math.ceil(duration / SPRITE_INTERVAL))
+    columns = min(count, SPRITE_COLUMNS)
+    rows = math.ceil(count / columns)
+    w, h = frame_size
+    thumb_h = max(2, int(round(SPRITE_WIDTH * h / w / 2)) * 2)
+    return count, columns, rows, SPRITE_WIDTH, thumb_h
+
+
+def preview_filter_graph(main_chain, duration, frame_size, with_main=True, source='[0:v]'):
+    """
+    -filter_complex that splits the clip's decoded (and filtered) frames three ways:
+    [main] for the encoder, [poster] and [sprite] for the preview images.
+    """
+    _, columns, rows, thumb_w, thumb_h = sprite_layout(duration, frame_size)
+    poster_at = min(POSTER_SECONDS, duration / 2)
+    head = f"{source}{main_chain}," if main_chain else source
+    split = "split=3[main]" if with_main else "split=2"
+    return (
+        f"{head}{split}[poster_in][sprite_in];"
+        f"[poster_in]trim=start={poster_at:.3f}:end={poster_at + 0.2:.3f},scale={POSTER_WIDTH}:-2[poster];"
+        f"[sprite_in]fps=1/{SPRITE_INTERVAL},scale={thumb_w}:{thumb_h}:flags=fast_bilinear,tile={columns}x{rows}[sprite]"
+    )
+
+
+def preview_output_args(paths):
+    return [
+        "-map", "[poster]", "-frames:v", "1", "-update", "1", paths["poster"],
+        "-map", "[sprite]", "-frames:v", "1", "-update", "1", paths["sprite"],
+    ]
+
+
+def hls_output_args(paths, output_path):
+    """
+    Muxer arguments that write the encoded clip as a fast-start MP4 and, through the tee
+    muxer, as an HLS rendition from the same encode. Keyframes are forced at every
+    segment boundary so segments are HLS_SEGMENT_SECONDS long.
+    """
+    hls_dir = os.path.dirname(paths["hls"])
+    os.makedirs(hls_dir, exist_ok=True)
+    segment_pattern = os.path.join(hls_dir, 'segment_%03d.ts')
+    return [
+        "-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+        "-f", "tee",
+        f"[f=mp4:movflags=+faststart]{output_path}"
+        f"|[f=hls:hls_time={HLS_SEGMENT_SECONDS}:hls_playlist_type=vod:hls_segment_filename={segment_pattern}]{paths['hls']}",
+    ]
+
+
+def _timestamp(seconds):
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{secs:06.3f}"
+
+
+def write_sprite_vtt(paths, duration, frame_size):
+    """
+    WebVTT thumbnail track: which sprite tile (#xywh) to show for each stretch of the clip.
+    """
+    count, columns, _, thumb_w, thumb_h = sprite_layout(duration, frame_size)
+    sprite_name = os.path.basename(paths["sprite"])
+    lines = ["WEBVTT", ""]
+    for k in range(count):
+        start = k * SPRITE_INTERVAL
+        end = min(start + SPRITE_INTERVAL, duration)
+        x, y = (k % columns) * thumb_w, (k // columns) * thumb_h
+        lines += [f"{_timestamp(start)} --> {_timestamp(end)}", f"{sprite_name}#xywh={x},{y},{thumb_w},{thumb_h}", ""]
+    with open(paths["sprite_vtt"], 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines))
+
+
+def make_previews(clip_path, duration, frame_size, paths=None):
+    """
+    Previews for a clip that was not rendered by ffmpeg here (stream-copied or moviepy):
+    one decode of the clip for the poster and sprite, the HLS rendition stream-copied
+    in the same run.
+    """
+    paths = paths or preview_paths(clip_path)
+    command = [
+        "ffmpeg", "-y", "-v", "error", "-i", clip_path,
+        "-filter_complex", preview_filter_graph("", duration, frame_size, with_main=False),
+        *preview_output_args(paths),
+    ]
+    if paths["hls"]:
+        # Segments can only start on the clip's own keyframes here
+        hls_dir = os.path.dirname(paths["hls"])
+        os.makedirs(hls_dir, exist_ok=True)
+        command += [
+            "-map", "0:v", "-map", "0:a?", "-c", "copy",
+            "-f", "hls", "-hls_time", str(HLS_SEGMENT_SECONDS), "-hls_playlist_type", "vod",
+            "-hls_segment_filename", os.path.join(hls_dir, 'segment_%03d.ts'),
+            paths["hls"],
+        ]
+    run_subprocess(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    write_sprite_vtt(paths, duration, frame_size)
+    return paths
+
+
+def preview_files(project_folder, paths):
+    # Preview file names relative to the project folder, for clip metadata
+    if not paths:
+        return {}
+    return {
+        key: os.path.relpath(path, project_folder)
+        for key, path in paths.items() if path and os.path.exists(path)
+    }
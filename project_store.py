@@ -0,0 +1,121 @@
+import os, glob, json, time, hashlib, threading
+from media_info import MEDIA_INFO_FILE
+from audio_artifact import AUDIO_ARTIFACT_NAME
+from transcript_cache import TRANSCRIPT_PREFIX, TRANSCRIPT_SUFFIX
+from instrumentation import TIMINGS_FILE
+from cut_cache import CUT_SUFFIX
+
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 1
+PROJECT_PREFIX = 'project_'
+JOB_HISTORY = 20   # jobs remembered per project
+
+# What each stage leaves in a project folder, by kind
+ARTIFACT_PATTERNS = {
+    "video": ['full_video.mp4'],
+    "media_info": [MEDIA_INFO_FILE],
+    "audio": [AUDIO_ARTIFACT_NAME],
+    "transcripts": [f"{TRANSCRIPT_PREFIX}*{TRANSCRIPT_SUFFIX}"],
+    "crop_paths": ['crop_path_*.json'],
+    "timings": [TIMINGS_FILE.format(job_id='*')],
+    "previews": ['*_poster.jpg', '*_sprite.jpg', '*_sprite.vtt'],
+    "cuts": [f"*{CUT_SUFFIX}"],
+}
+
+_manifest_lock = threading.Lock()
+
+
+def project_id(project_folder):
+    return os.path.basename(os.path.normpath(project_folder))
+
+
+def find_project(clips_folder, project_id):
+    """
+    Folder of a project by ID, or None for unknown IDs (or anything that is not a plain
+    project folder name).
+    """
+    if not project_id or not project_id.startswith(PROJECT_PREFIX) or os.path.basename(project_id) != project_id or project_id in ('.', '..'):
+        return None
+    folder = os.path.join(clips_folder, project_id)
+    return folder if os.path.isdir(folder) else None
+
+
+def collect_artifacts(project_folder):
+    artifacts = {}
+    for kind, patterns in ARTIFACT_PATTERNS.items():
+        names = sorted({os.path.basename(p) for pattern in patterns for p in glob.glob(os.path.join(glob.escape(project_folder), pattern))})
+        if names:
+            artifacts[kind] = names
+    return artifacts
+
+
+def _manifest_path(project_folder):
+    return os.path.join(project_folder, MANIFEST_FILE)
+
+
+def _encode(manifest):
+    return json.dumps(manifest, sort_keys=True, indent=1).encode('utf-8')
+
+
+def load_manifest(project_folder):
+    """
+    (manifest, etag) for a project, or (None, None) if it has none yet. The ETag is a
+    hash of the stored bytes, so it changes whenever the manifest does.
+    """
+    try:
+        with open(_manifest_path(project_folder), 'rb') as f:
+            data = f.read()
+        manifest = json.loads(data)
+    except (OSError, ValueError):
+        return None, None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None, None
+    return manifest, hashlib.sha256(data).hexdigest()[:32]
+
+
+def _save(project_folder, manifest):
+    path = _manifest_path(project_folder)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_encode(manifest))
+    os.replace(tmp_path, path)
+
+
+def update_manifest(project_folder, job=None, **fields):
+    """
+    Merge fields into the project's manifest, refresh its artifact list and, if given,
+    add a job entry (newest first). Returns the saved manifest.
+    """
+    with _manifest_lock:
+        manifest, _ = load_manifest(project_folder)
+        manifest = manifest or {"version": MANIFEST_VERSION, "project_id": project_id(project_folder), "clips": [], "processed": False, "jobs": []}
+        manifest.update(fields)
+        if job:
+            manifest["jobs"] = ([job] + [j for j in manifest["jobs"] if j.get("job_id") != job.get("job_id")])[:JOB_HISTORY]
+        manifest["artifacts"] = collect_artifacts(project_folder)
+        manifest["updated"] = time.time()
+        _save(project_folder, manifest)
+    return manifest
+
+
+def record_download(project_folder, job_id, real_title, video_title, source_url=None):
+    return update_manifest(
+        project_folder,
+        job={"job_id": job_id, "kind": "download", "finished": time.time()},
+        real_title=real_title, video_title=video_title, source_url=source_url,
+    )
+
+
+def record_clips(project_folder, job_id, real_title, video_title, clips, settings=None, timings=None, segments=None, source_sha256=None, kind='process'):
+    """
+    Store a finished processing (or re-style) job's clips (replacing earlier ones), its
+    settings and the wall time of each stage from its timings file. The segment list
+    and the source's hash are kept so the clips can be re-styled later.
+    """
+    job = {"job_id": job_id, "kind": kind, "finished": time.time(), "settings": settings or {}, "clips": len(clips)}
+    if timings:
+        job["timings"] = timings
+    fields = {"real_title": real_title, "video_title": video_title, "clips": clips, "processed": True}
+    if segments is not None:
+        fields.update(segments=segments, source_sha256=source_sha256)
+    return update_manifest(project_folder, job=job, **fields)
@@ -0,0 +1,317 @@
+import os, bisect, shlex, shutil, subprocess, tempfile
+from media_info import MediaInfo, get_media_info, probe_media
+from encoding_profiles import get_encoding_profile, output_fps, video_args, audio_args
+from previews import preview_filter_graph, preview_output_args, hls_output_args, write_sprite_vtt
+from cut_cache import link_file
+from instrumentation import run_subprocess
+
+VERTICAL_HEIGHT = 1080
+
+# 'snap' moves cut points to keyframes within the tolerance, 'exact' re-encodes only the
+# partial GOP at each edge, 'off' always re-encodes the whole clip.
+FAST_CUT_MODE = os.environ.get('KLEEP_FAST_CUT', 'snap')
+KEYFRAME_TOLERANCE = float(os.environ.get('KLEEP_KEYFRAME_TOLERANCE', '1.0'))  # seconds
+
+# ffprobe's H.264 profile names -> libx264 profile and the tools that make x264 signal it
+# (fast presets turn CABAC off and would otherwise drop to Baseline); others aren't matched
+H264_PROFILES = {
+    'Constrained Baseline': ('baseline', None),
+    'Baseline': ('baseline', None),
+    'Main': ('main', 'cabac=1:8x8dct=0'),
+    'High': ('high', 'cabac=1:8x8dct=1'),
+}
+EDGE_PIX_FMTS = {'yuv420p', 'yuvj420p'}
+
+
+def vertical_crop_box(width, height):
+    """
+    Centre 9:16 crop for a horizontal frame, same maths as helpers.crop_to_vertical.
+    Returns (crop_w, crop_h, x, y).
+    """
+    new_w = int(height * 9 / 16)
+    if new_w > width:
+        new_w = width
+    x = int(width / 2 - new_w / 2)
+    return new_w, height, x, 0
+
+
+def output_size(source_size, crop_vertical=False):
+    if not crop_vertical:
+        return source_size
+    crop_w, crop_h, _, _ = vertical_crop_box(*source_size)
+    return crop_w, crop_h
+
+
+def subtitles_filter(srt_path, subtitle_style=None):
+    if not srt_path:
+        return None
+    subtitles = f"subtitles={shlex.quote(srt_path)}"
+    if subtitle_style:
+        subtitles += f":force_style='{subtitle_style}'"
+    return subtitles
+
+
+def build_filter_chain(source_size=None, crop_vertical=False, srt_path=None, subtitle_style=None, crop_x=None, fps=None):
+    """
+    Build the -vf chain for one clip. SRT captions run in the order of the old three-step
+    path (burned at source resolution, then cropped and scaled to 1080 high); ASS captions
+    are laid out for the vertical frame, so they are burned on the crop before the upscale,
+    which keeps libass blending on the smaller frame. fps runs first so dropped frames are
+    never cropped or captioned. crop_x replaces the centred crop offset (e.g. a smart_crop
+    expression in t).
+    """
+    filters = []
+    subtitles = subtitles_filter(srt_path, subtitle_style)
+
+    if fps:
+        filters.append(f"fps={fps}")
+
+    burn_after_crop = bool(srt_path) and srt_path.endswith('.ass')
+    if subtitles and not burn_after_crop:
+        filters.append(subtitles)
+
+    if crop_vertical:
+        crop_w, crop_h, x, y = vertical_crop_box(*source_size)
+        filters.append(f"crop={crop_w}:{crop_h}:{crop_x or x}:{y}")
+
+    if subtitles and burn_after_crop:
+        filters.append(subtitles)
+
+    if crop_vertical:
+        filters.append(f"scale=-2:{VERTICAL_HEIGHT}")
+
+    return ",".join(filters)
+
+
+def build_render_command(video_path, output_path, start, end, source_size=None, crop_vertical=False, srt_path=None, subtitle_style=None, threads=None, crop_x=None, profile=None, source_fps=None, previews=None, cut_path=None):
+    """
+    ffmpeg command for one clip. With `previews` (previews.preview_paths) the same
+    decoded frames also feed the poster and sprite outputs, and the encode is written
+    as HLS segments alongside the MP4 when an HLS path is set. With `cut_path` the
+    cropped frames are split off before the captions and also encoded, uncaptioned,
+    to cut_path (captions are then burned after the upscale).
+    """
+    profile = profile or get_encoding_profile()
+    command = ["ffmpeg", "-y", "-v", "error"]
+    if threads:
+        command += ["-threads", str(threads)]
+
+    # Input seek: decode starts at the keyframe before `start` and is trimmed frame-accurately
+    command += ["-ss", f"{start:.3f}", "-i", video_path, "-t", f"{end - start:.3f}"]
+
+    fps = output_fps(profile, source_fps)
+    frame_size = output_size(source_size, crop_vertical) if source_size else (9, 16)
+    if cut_path and srt_path:
+        cut_chain = build_filter_chain(source_size, crop_vertical, crop_x=crop_x, fps=fps)
+        head = f"[0:v]{cut_chain}," if cut_chain else "[0:v]"
+        graph = f"{head}split=2[cut][captioned];"
+        captions = subtitles_filter(srt_path, subtitle_style)
+        if previews:
+            graph += preview_filter_graph(captions, end - start, frame_size, source='[captioned]')
+        else:
+            graph += f"[captioned]{captions}[main]"
+        command += ["-filter_complex", graph, "-map", "[main]", "-map", "0:a?"]
+    elif previews:
+        filter_chain = build_filter_chain(source_size, crop_vertical, srt_path, subtitle_style, crop_x, fps)
+        command += ["-filter_complex", preview_filter_graph(filter_chain, end - start, frame_size), "-map", "[main]", "-map", "0:a?"]
+    else:
+        filter_chain = build_filter_chain(source_size, crop_vertical, srt_path, subtitle_style, crop_x, fps)
+        if filter_chain:
+            command += ["-vf", filter_chain]
+
+    command += video_args(profile, threads)
+    command += audio_args(profile)
+    if previews and previews.get("hls"):
+        command += hls_output_args(previews, output_path)
+    else:
+        command += [
+            "-movflags", "+faststart",
+            output_path
+        ]
+    if previews:
+        command += preview_output_args(previews)
+    if cut_path and srt_path:
+        # -t after the input only limits the first output
+        command += ["-map", "[cut]", "-map", "0:a?", "-t", f"{end - start:.3f}", *video_args(profile, threads), *audio_args(profile), "-movflags", "+faststart", cut_path]
+    return command
+
+
+def render_clip(video_path, output_path, start, end, source_size=None, crop_vertical=False, srt_path=None, subtitle_style=None, threads=None, crop_x=None, profile=None, source_fps=None, previews=None, cut_path=None):
+    """
+    Cut, caption and crop one clip with a single decode and a single encode (two
+    encodes when an uncaptioned cut is kept as well).
+    """
+    command = build_render_command(video_path, output_path, start, end, source_size, crop_vertical, srt_path, subtitle_style, threads, crop_x, profile, source_fps, previews, cut_path)
+    print(f"🛠️ Running command: {' '.join(command)}")
+    run_subprocess(command, check=True)
+    if previews:
+        write_sprite_vtt(previews, end - start, output_size(source_size, crop_vertical) if source_size else (9, 16))
+    return output_path
+
+
+def restyle_clip(cut_path, output_path, srt_path=None, subtitle_style=None, threads=None, profile=None, cut_profile=None, previews=None):
+    """
+    Make a clip from its stored uncaptioned cut: captions are burned on the cut, which is
+    already cut, cropped and scaled. An uncaptioned clip in the cut's own profile is the
+    cut itself. Returns True if the previews were rendered too.
+    """
+    profile = profile or get_encoding_profile()
+    if not srt_path and cut_profile == profile['name']:
+        link_file(cut_path, output_path)
+        return False
+
+    # The clip may be a hard link of the cut, so it is replaced rather than overwritten
+    info = MediaInfo(probe_media(cut_path))
+    tmp_path = os.path.splitext(output_path)[0] + '_restyle.mp4'
+    render_clip(cut_path, tmp_path, 0, info.duration, source_size=info.size, srt_path=srt_path, subtitle_style=subtitle_style, threads=threads, profile=profile, source_fps=info.fps, previews=previews)
+    os.replace(tmp_path, output_path)
+    return bool(previews)
+
+
+def load_keyframe_index(video_path, project_folder):
+    """
+    Keyframe timestamps, stream codecs and parameters for a project's source video, from its
+    MediaInfo (the keyframe scan runs once and is stored with it).
+    """
+    info = get_media_info(video_path, project_folder, with_keyframes=True)
+    return {"keyframes": info.keyframes, "codecs": info.codecs, "streams": info.stream_params}
+
+
+def snap_to_keyframe(t, keyframes, tolerance=KEYFRAME_TOLERANCE):
+    """
+    Nearest keyframe to `t` within `tolerance` seconds, or None.
+    """
+    if not keyframes:
+        return None
+    pos = bisect.bisect_left(keyframes, t)
+    candidates = keyframes[max(pos - 1, 0):pos + 1]
+    nearest = min(candidates, key=lambda k: abs(k - t))
+    return nearest if abs(nearest - t) <= tolerance else None
+
+
+def stream_copy(video_path, output_path, start, end, extra_args=()):
+    command = [
+        "ffmpeg", "-y", "-v", "error",
+        "-ss", f"{start:.3f}", "-i", video_path, "-t", f"{end - start:.3f}",
+        "-c", "copy", "-avoid_negative_ts", "make_zero",
+        *extra_args,
+        output_path
+    ]
+    run_subprocess(command, check=True)
+
+
+def fast_cut(video_path, output_path, start, end, keyframe_index, mode=FAST_CUT_MODE, tolerance=KEYFRAME_TOLERANCE, threads=None, profile=None):
+    """
+    Cut without re-encoding the whole clip. Returns the (start, end) actually cut, which
+    in 'snap' mode can be up to `tolerance` away from the requested one, or None when the
+    clip can't be fast-cut and the caller should fall back to render_clip.
+    """
+    if mode == 'off' or not keyframe_index:
+        return None
+    keyframes = keyframe_index.get('keyframes', [])
+
+    snapped_start = snap_to_keyframe(start, keyframes, tolerance)
+    snapped_end = snap_to_keyframe(end, keyframes, tolerance)
+
+    if mode == 'snap' and snapped_start is not None:
+        # The end only has to land on a packet boundary, so it is snapped when possible but not required
+        cut_end = snapped_end if snapped_end is not None and snapped_end > snapped_start else end
+        stream_copy(video_path, output_path, snapped_start, cut_end, ["-movflags", "+faststart"])
+        print(f" Fast-cut (stream copy) {snapped_start:.2f}-{cut_end:.2f}s -> {output_path}")
+        return snapped_start, cut_end
+
+    if mode in ('snap', 'exact'):
+        return smart_cut(video_path, output_path, start, end, keyframe_index, threads, profile)
+
+    return None
+
+
+def matching_encode_args(streams):
+    """
+    Encoder arguments that make re-encoded pieces match the source's H.264 profile, level
+    and pixel format and its audio layout, so the concat demuxer can join them with
+    stream-copied packets. None when the source can't be matched (High 10 and other
+    profiles x264 isn't built for here, HE-AAC, missing probe data).
+    """
+    profile, x264_params = H264_PROFILES.get(streams.get('video_profile'), (None, None))
+    level = streams.get('video_level')
+    if not profile or not level or level <= 0 or streams.get('pix_fmt') not in EDGE_PIX_FMTS:
+        return None
+    args = ["-profile:v", profile, "-level:v", f"{level / 10:.1f}", "-pix_fmt", streams['pix_fmt']]
+    if x264_params:
+        args += ["-x264-params", x264_params]
+
+    if streams.get('audio_codec'):
+        if streams.get('audio_profile') != 'LC' or not streams.get('audio_sample_rate') or not streams.get('audio_channels'):
+            return None
+        args += ["-ar", str(streams['audio_sample_rate']), "-ac", str(streams['audio_channels'])]
+    return args
+
+
+def smart_cut(video_path, output_path, start, end, keyframe_index, threads=None, profile=None):
+    # Exact boundaries: re-encode the partial GOP at each edge, stream-copy the middle.
+    # Returns (start, end) like fast_cut, or None.
+    codecs = keyframe_index.get('codecs', {})
+    if codecs.get('video') != 'h264' or codecs.get('audio') not in (None, 'aac'):
+        return None
+    # The edges must carry the middle's stream parameters, or players glitch at the seams
+    match_args = matching_encode_args(keyframe_index.get('streams') or {})
+    if match_args is None:
+        return None
+
+    keyframes = keyframe_index.get('keyframes', [])
+    first_pos = bisect.bisect_left(keyframes, start)      # first keyframe at/after start
+    last_pos = bisect.bisect_right(keyframes, end) - 1    # last keyframe at/before end
+    if first_pos >= len(keyframes) or last_pos < 0 or keyframes[last_pos] <= keyframes[first_pos]:
+        return None
+    first_key, last_key = keyframes[first_pos], keyframes[last_pos]
+
+    profile = profile or get_encoding_profile()
+    encode_args = video_args(profile, threads) + audio_args(profile) + match_args
+
+    work_dir = tempfile.mkdtemp(prefix='kleep-cut-', dir=os.path.dirname(output_path) or None)
+    try:
+        parts = []
+
+        if first_key - start > 0.001:
+            head = os.path.join(work_dir, 'head.ts')
+            run_subprocess([
+                "ffmpeg", "-y", "-v", "error",
+                "-ss", f"{start:.3f}", "-i", video_path, "-t", f"{first_key - start:.3f}",
+                *encode_args, head
+            ], check=True)
+            parts.append(head)
+
+        middle = os.path.join(work_dir, 'middle.ts')
+        stream_copy(video_path, middle, first_key, last_key, ["-bsf:v", "h264_mp4toannexb"])
+        parts.append(middle)
+
+        if end - last_key > 0.001:
+            tail = os.path.join(work_dir, 'tail.ts')
+            run_subprocess([
+                "ffmpeg", "-y", "-v", "error",
+                "-ss", f"{last_key:.3f}", "-i", video_path, "-t", f"{end - last_key:.3f}",
+                *encode_args, tail
+            ], check=True)
+            parts.append(tail)
+
+        list_path = os.path.join(work_dir, 'parts.txt')
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for part in parts:
+                # The concat demuxer resolves relative names against the list file
+                quoted = os.path.abspath(part).replace("'", "'\\''")
+                f.write(f"file '{quoted}'\n")
+
+        run_subprocess([
+            "ffmpeg", "-y", "-v", "error",
+            "-f", "concat", "-safe", "0", "-i", list_path,
+            "-c", "copy", "-movflags", "+faststart",
+            output_path
+        ], check=True)
+        print(f" Smart-cut {start:.2f}-{end:.2f}s (re-encoded edges only) -> {output_path}")
+        return start, end
+    except subprocess.CalledProcessError as e:
+        print(f" Smart-cut failed, re-encoding the clip: {e}")
+        return None
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
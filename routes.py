@@ -1,20 +1,73 @@
-from flask import Flask, request, render_template, send_from_directory, url_for, session, redirect
+from flask import Flask, request, render_template, send_from_directory, url_for, session, redirect, jsonify, Response, stream_with_context
 # from flask import render_template, request, redirect, url_for, session
-from video_utils import download_video, clip_segments
 from helpers import allowed_file, sanitize_filename, beautify_title
-import os, uuid, re
+import os, uuid, re, json
 from werkzeug.utils import secure_filename
-from ai_clip_extractor import extract_top_segments, score_segments_with_ai, transcribe_audio
+from model_registry import get_whisper_stats
+from llm_cache import get_llm_cache_stats
+from jobs import create_job, submit_job, get_job, wait_for_change, update_job
+from pipeline import run_download_job, run_process_job, run_restyle_job
+from ingest import MAX_UPLOAD_MB, UploadOffsetMismatch, ingest_upload, incoming_folder, start_upload, get_upload, append_chunk, take_upload
+from encoding_profiles import ENCODING_PROFILES, get_encoding_profile
+from instrumentation import span, job_context, forget_job_spans, render_metrics
+from project_store import find_project, load_manifest
+from delivery import send_clip_file
+from captions import STYLE_MAP
+from storage import touch_project, get_storage_stats
 from datetime import datetime
 
 CLIPS_FOLDER = 'static/clips'
-MAX_FILE_SIZE_MB = 400 #MB
+MAX_FILE_SIZE_MB = MAX_UPLOAD_MB #MB
+
+def wants_json():
+    best = request.accept_mimetypes.best_match(['application/json', 'text/html'])
+    return best == 'application/json'
+
+
+def job_summary(job):
+    summary = {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "progress": job["progress"],
+        "error": job["error"],
+    }
+    if job["status"] == "done":
+        summary["project_id"] = job["result"]["project_id"]
+        summary["results_url"] = url_for('results_page', project_id=job["result"]["project_id"])
+    return summary
+
+
+def queue_upload(upload, filename, should_burn_captions, caption_style, encoding_profile=None):
+    real_title = filename.rsplit('.', 1)[0]
+    sanitized_filename = sanitize_filename(real_title) + '.mp4'
+
+    # The job exists first so the ingest span lands in its timings
+    job_id = create_job('process')
+    try:
+        with job_context(job_id), span("ingest"):
+            saved_video_path, video_title, project_folder, _ = ingest_upload(upload, CLIPS_FOLDER, sanitized_filename)
+        touch_project(project_folder)
+    except Exception as e:
+        update_job(job_id, status="failed", error=str(e))
+        forget_job_spans(job_id)
+        raise
+
+    submit_job(
+        job_id, run_process_job, should_burn_captions, caption_style,
+        video_path=saved_video_path, real_title=real_title,
+        video_title=video_title, project_folder=project_folder,
+        encoding_profile=encoding_profile
+    )
+    return job_id
+
 
 def register_routes(app):
 
     @app.route('/')
     def index():
-        return render_template('index.html', year=datetime.now().year)
+        return render_template('index.html', year=datetime.now().year, encoding_profiles=list(ENCODING_PROFILES), default_encoding_profile=get_encoding_profile()['name'])
 
     @app.route('/process', methods=['POST'])
     def process():
@@ -23,78 +76,224 @@ def register_routes(app):
         should_burn_captions = request.form.get('burn_captions', 'yes')
         caption_style = request.form.get('caption_style', 'professional')
         just_download = request.form.get('just_download') 
+        upload_id = request.form.get('upload_id')
+        encoding_profile = request.form.get('encoding_profile') or get_encoding_profile()['name']
+
+        if encoding_profile not in ENCODING_PROFILES:
+            return f" Unknown encoding profile. Choose one of: {', '.join(ENCODING_PROFILES)}", 400
 
 
         if just_download:
             # Just download the video, no processing
-            video_path, real_title, video_title, project_folder = download_video(url)
-            session['real_title'] = real_title
+            job_id = create_job('download')
+            submit_job(job_id, run_download_job, url)
 
-            return render_template('results.html', video_path=video_path, real_title=real_title, clips=[])
-        
         elif uploaded_file and uploaded_file.filename != '':
             filename = secure_filename(uploaded_file.filename)
 
             if not allowed_file(filename):
                 return " Only MP4, MOV, MKV files are allowed.", 400
 
-            uploaded_file.seek(0, 2)
-            file_size = uploaded_file.tell() / (1024 * 1024)
-            uploaded_file.seek(0)
+            # Already streamed to disk (and hashed) by IngestRequest while the form was parsed
+            job_id = queue_upload(uploaded_file.stream, filename, should_burn_captions, caption_style, encoding_profile)
 
-            if file_size > MAX_FILE_SIZE_MB:
-                return f" File too large! Max {MAX_FILE_SIZE_MB} MB allowed.", 400
+        elif upload_id:
+            entry = take_upload(upload_id)
+            if not entry:
+                return " Upload not found or not finished.", 400
+            job_id = queue_upload(entry["file"], entry["filename"], should_burn_captions, caption_style, encoding_profile)
 
-            real_title = filename.rsplit('.', 1)[0]
-            sanitized_filename = sanitize_filename(real_title) + '.mp4'
+        elif url:
+            job_id = create_job('process')
+            submit_job(job_id, run_process_job, should_burn_captions, caption_style, url=url, encoding_profile=encoding_profile)
 
-            project_folder = os.path.join(CLIPS_FOLDER, f"project_{sanitized_filename}")
-            os.makedirs(project_folder, exist_ok=True)
+        else:
+            return " No video URL or file uploaded!", 400
 
-            saved_video_path = os.path.join(project_folder, 'full_video.mp4')
-            uploaded_file.save(saved_video_path)
+        session['job_id'] = job_id
+        session.pop('project_id', None)
 
-            video_path = saved_video_path
-            video_title = sanitized_filename
-            session['real_title'] = real_title
+        if wants_json():
+            return jsonify({"job_id": job_id, "status_url": url_for('job_status', job_id=job_id)}), 202
+        return redirect(url_for('job_page', job_id=job_id))
 
-        elif url:
-            video_path, real_title, video_title, project_folder = download_video(url)
-            session['real_title'] = real_title
 
-        else:
-            return " No video URL or file uploaded!", 400
+    @app.route('/uploads', methods=['POST'])
+    def create_upload():
+        # Resumable upload: POST {filename, size}, then PUT the bytes in chunks with an
+        # Upload-Offset header, then POST /process with upload_id
+        data = request.get_json(silent=True) or request.form
+        filename = secure_filename(data.get('filename', ''))
+        try:
+            size = int(data.get('size', ''))
+        except ValueError:
+            return jsonify({"error": "size is required"}), 400
 
-        #  Step 1: Transcribe audio to text
-        transcript_text = transcribe_audio(video_path)
+        if not allowed_file(filename):
+            return jsonify({"error": "Only MP4, MOV, MKV files are allowed."}), 400
+        if size > MAX_FILE_SIZE_MB * 1024 * 1024:
+            return jsonify({"error": f"File too large! Max {MAX_FILE_SIZE_MB} MB allowed."}), 413
 
-        #  Step 2: Find highlight segments from transcript
-        highlight_segments, _ = extract_top_segments(video_path, full_transcript=transcript_text, max_moments=10)
+        entry = start_upload(incoming_folder(), filename, size)
+        return jsonify({
+            "upload_id": entry["id"],
+            "offset": 0,
+            "size": size,
+            "upload_url": url_for('upload_chunk', upload_id=entry["id"]),
+        }), 201
 
-        #  Step 3: Clip video based on those moments
-        clips = clip_segments(video_path, highlight_segments, video_title, project_folder, should_burn_captions, caption_style, full_transcript=transcript_text)
+    @app.route('/uploads/<upload_id>', methods=['GET', 'PUT'])
+    def upload_chunk(upload_id):
+        entry = get_upload(upload_id)
+        if not entry:
+            return jsonify({"error": "Upload not found"}), 404
 
+        if request.method == 'PUT':
+            try:
+                offset = int(request.headers.get('Upload-Offset', ''))
+                append_chunk(entry, offset, request.stream)
+            except ValueError:
+                return jsonify({"error": "Upload-Offset header is required"}), 400
+            except UploadOffsetMismatch as e:
+                return jsonify({"error": str(e), "offset": e.expected}), 409
 
-        #  Step 4: Store results in session
-        session['clips'] = clips
-        session['video_title'] = video_title
+        received = entry["file"].size
+        return jsonify({"upload_id": upload_id, "offset": received, "size": entry["size"], "complete": received == entry["size"]})
 
-        return redirect(url_for('results_page'))
+    @app.route('/jobs/<job_id>')
+    def job_page(job_id):
+        if not get_job(job_id):
+            return " Job not found.", 404
+        return render_template('progress.html', job_id=job_id, year=datetime.now().year)
+
+    @app.route('/jobs/<job_id>/status')
+    def job_status(job_id):
+        job = get_job(job_id)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(job_summary(job))
+
+    @app.route('/jobs/<job_id>/events')
+    def job_events(job_id):
+        if not get_job(job_id):
+            return jsonify({"error": "Job not found"}), 404
+
+        def stream():
+            version = None
+            while True:
+                job = wait_for_change(job_id, version)
+                if job is None:
+                    return
+                if job["version"] != version:
+                    version = job["version"]
+                    yield f"data: {json.dumps(job_summary(job))}\n\n"
+                else:
+                    yield ": keep-alive\n\n"
+                if job["status"] in ("done", "failed"):
+                    return
+
+        return Response(stream_with_context(stream()), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
     @app.route('/results')
-    def results_page():
-        clips = session.get('clips', [])
-        # title = session.get('video_title', 'Unknown Video')
-        real_title = session.get('real_title', 'Untitled Video')
-        pretty_title = beautify_title(real_title)
+    def latest_results():
+        # The session only remembers IDs: the last job, and its project once known
+        job_id = session.get('job_id')
+        job = get_job(job_id) if job_id else None
+        if job:
+            if job["status"] == "failed":
+                return f" Processing failed: {job['error']}", 500
+            if job["status"] != "done":
+                return redirect(url_for('job_page', job_id=job_id))
+            session['project_id'] = job["result"]["project_id"]
+        if session.get('project_id'):
+            return redirect(url_for('results_page', project_id=session['project_id']))
+        return render_template('results.html', clips=[], real_title=beautify_title('Untitled Video'), year=datetime.now().year)
+
+    @app.route('/results/<project_id>')
+    def results_page(project_id):
+        project_folder = find_project(CLIPS_FOLDER, project_id)
+        manifest, etag = load_manifest(project_folder) if project_folder else (None, None)
+        if manifest is None:
+            # Links from before results were stored per project used the job ID
+            job = get_job(project_id)
+            if job and job["status"] == "done":
+                return redirect(url_for('results_page', project_id=job["result"]["project_id"]))
+            return " Project not found.", 404
+        touch_project(project_folder)
+
+        # Revalidated on every visit; an unchanged project gets a 304 without rendering
+        etag = etag + ('-json' if wants_json() else '-html')
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        elif wants_json():
+            response = jsonify(manifest)
+        elif not manifest.get('processed'):
+            # Download-only project: offer the source video
+            video_path = f"{project_id}/full_video.mp4"
+            response = Response(render_template('results.html', video_path=video_path, real_title=manifest.get('real_title') or 'Untitled Video', clips=[], year=datetime.now().year))
+        else:
+            pretty_title = beautify_title(manifest.get('real_title') or 'Untitled Video')
+            response = Response(render_template('results.html', clips=manifest['clips'], real_title=pretty_title, year=datetime.now().year, project_id=project_id, caption_styles=list(STYLE_MAP), can_restyle=bool(manifest.get('segments'))))
+
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.add('Accept')
+        return response
 
-        return render_template('results.html', clips=clips, real_title=pretty_title, year=datetime.now().year)
+    @app.route('/results/<project_id>/restyle', methods=['POST'])
+    def restyle(project_id):
+        # Same clips with another caption style: only captions are burned again
+        project_folder = find_project(CLIPS_FOLDER, project_id)
+        manifest, _ = load_manifest(project_folder) if project_folder else (None, None)
+        if manifest is None:
+            return " Project not found.", 404
+        if not manifest.get('segments'):
+            return " This project has no clips to re-style yet.", 409
 
-    @app.route('/clips/<filename>')
+        # Anything not given stays as the last processing job had it
+        last = next((job.get('settings', {}) for job in manifest.get('jobs', []) if job.get('kind') in ('process', 'restyle')), {})
+        should_burn_captions = request.form.get('burn_captions') or last.get('burn_captions', 'yes')
+        caption_style = request.form.get('caption_style') or last.get('caption_style', 'professional')
+        encoding_profile = request.form.get('encoding_profile') or last.get('encoding_profile') or get_encoding_profile()['name']
+        if caption_style not in STYLE_MAP:
+            return f" Unknown caption style. Choose one of: {', '.join(STYLE_MAP)}", 400
+        if encoding_profile not in ENCODING_PROFILES:
+            return f" Unknown encoding profile. Choose one of: {', '.join(ENCODING_PROFILES)}", 400
+
+        job_id = create_job('restyle')
+        submit_job(job_id, run_restyle_job, project_folder, should_burn_captions, caption_style, encoding_profile=encoding_profile)
+        session['job_id'] = job_id
+        session.pop('project_id', None)
+
+        if wants_json():
+            return jsonify({"job_id": job_id, "status_url": url_for('job_status', job_id=job_id)}), 202
+        return redirect(url_for('job_page', job_id=job_id))
+
+    @app.route('/clips/<path:filename>')
     def serve_clip(filename):
-        return send_from_directory(CLIPS_FOLDER, filename)
+        # Clips, posters, sprites and HLS segments, by path under the clips folder
+        project_folder = find_project(CLIPS_FOLDER, filename.split('/', 1)[0])
+        if project_folder:
+            touch_project(project_folder)
+        return send_clip_file(CLIPS_FOLDER, filename)
     
+    @app.route('/stats/whisper')
+    def whisper_stats():
+        return jsonify(get_whisper_stats())
+
+    @app.route('/stats/llm')
+    def llm_stats():
+        return jsonify(get_llm_cache_stats())
+
+    @app.route('/stats/storage')
+    def storage_stats():
+        return jsonify(get_storage_stats())
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
     @app.route('/about')
     def about():
         # return render_template('about.html')
@@ -0,0 +1,228 @@
+import os, json, subprocess
+import numpy as np
+from render_engine import vertical_crop_box
+from instrumentation import run_subprocess
+
+# 'yes' follows the speaker when cropping horizontal video to 9:16; 'no' always centre-crops
+SMART_CROP = os.environ.get('KLEEP_SMART_CROP', 'yes') == 'yes'
+
+CROP_PATH_VERSION = 1
+PROXY_WIDTH = 256           # analysis frames are decoded at this width...
+PROXY_FPS = 4               # ...and this rate, in grey
+SCENE_CUT_DIFF = 40.0       # mean abs frame difference (0-255) treated as a shot change
+SMOOTH_SECONDS = 1.5        # moving-average window for the subject position
+DEADZONE = 0.12             # fraction of the crop width the subject may drift before the crop follows
+PAN_SPEED = 0.6             # fastest pan, in crop widths per second
+MAX_KEYFRAMES = 40          # keeps the ffmpeg crop expression short
+FACE_WEIGHT = 4.0           # how much a detected face outweighs plain saliency
+
+try:
+    import cv2
+    _face_cascade = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml'))
+except Exception:
+    cv2 = None
+    _face_cascade = None
+
+
+def proxy_size(width, height):
+    proxy_h = max(2, int(round(PROXY_WIDTH * height / width / 2)) * 2)
+    return PROXY_WIDTH, proxy_h
+
+
+def read_proxy_frames(video_path, start, end, source_size):
+    """
+    Grey, PROXY_WIDTH-wide frames at PROXY_FPS for [start, end), as a (n, h, w) uint8
+    array. Decoding is most of the cost, so the decoder skips B-frames (plenty of I/P
+    frames remain for 4 fps) and the deblocking filter; nobody looks at these frames.
+    """
+    width, height = proxy_size(*source_size)
+    command = [
+        "ffmpeg", "-v", "error",
+        "-skip_frame", "bidir", "-skip_loop_filter", "all",
+        "-ss", f"{start:.3f}", "-i", video_path, "-t", f"{end - start:.3f}",
+        "-an", "-vf", f"fps={PROXY_FPS},scale={width}:{height}:flags=fast_bilinear,format=gray",
+        "-f", "rawvideo", "-pix_fmt", "gray", "-"
+    ]
+    result = run_subprocess(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    frames = np.frombuffer(result.stdout, dtype=np.uint8)
+    count = len(frames) // (width * height)
+    return frames[:count * width * height].reshape(count, height, width)
+
+
+def column_saliency(frame, previous):
+    """
+    Per-column interest: motion against the previous frame plus edge energy, with the
+    typical column level removed so static backgrounds don't count.
+    """
+    current = frame.astype(np.float32)
+    edges = np.abs(np.diff(current, axis=1, prepend=current[:, :1])) + np.abs(np.diff(current, axis=0, prepend=current[:1]))
+    score = edges.sum(axis=0)
+    if previous is not None:
+        score += 2.0 * np.abs(current - previous.astype(np.float32)).sum(axis=0)
+    return np.maximum(score - np.median(score), 0)
+
+
+def face_columns(frame):
+    if _face_cascade is None:
+        return None
+    faces = _face_cascade.detectMultiScale(frame, scaleFactor=1.15, minNeighbors=4, minSize=(12, 12))
+    if len(faces) == 0:
+        return None
+    score = np.zeros(frame.shape[1], dtype=np.float32)
+    for x, y, w, h in faces:
+        score[x:x + w] += w * h
+    return score
+
+
+def subject_centres(frames, crop_w):
+    """
+    For each proxy frame, the crop centre (proxy pixels) that puts the most saliency, and
+    any detected faces, inside a crop_w-wide window. Also returns the shot-change flags.
+    """
+    kernel = np.ones(crop_w, dtype=np.float32)
+    centres = np.zeros(len(frames), dtype=np.float32)
+    cuts = np.zeros(len(frames), dtype=bool)
+    previous = None
+    for k, frame in enumerate(frames):
+        if previous is not None and np.mean(np.abs(frame.astype(np.int16) - previous)) > SCENE_CUT_DIFF:
+            cuts[k] = True
+            previous = None  # motion across a cut is meaningless
+        score = column_saliency(frame, previous)
+        faces = face_columns(frame)
+        if faces is not None:
+            score = score / (score.max() or 1.0) + FACE_WEIGHT * faces / faces.max()
+        window = np.convolve(score, kernel, mode='valid')
+        lo = int(np.argmax(window))
+        inside = score[lo:lo + crop_w]
+        # Centre on the interest inside the best window rather than its edge
+        centres[k] = lo + (np.dot(inside, np.arange(len(inside))) / inside.sum() if inside.sum() > 0 else crop_w / 2)
+        previous = frame
+    return centres, cuts
+
+
+def smooth_path(centres, cuts, crop_w, frame_w):
+    """
+    Turn raw per-frame centres into a steady camera: median + moving average within each
+    shot, then hold still until the subject leaves a deadzone and pan to it at a capped
+    speed. Shot changes jump.
+    """
+    half = crop_w / 2
+    path = np.zeros_like(centres)
+    shots = np.split(np.arange(len(centres)), np.flatnonzero(cuts))
+    window = max(1, int(SMOOTH_SECONDS * PROXY_FPS))
+    max_step = PAN_SPEED * crop_w / PROXY_FPS
+
+    for shot in shots:
+        if len(shot) == 0:
+            continue
+        values = centres[shot]
+        if len(values) >= 3:
+            padded = np.pad(values, 1, mode='edge')
+            values = np.median(np.stack([padded[:-2], padded[1:-1], padded[2:]]), axis=0)
+        if len(values) > window:
+            padded = np.pad(values, (window // 2, window - 1 - window // 2), mode='edge')
+            values = np.convolve(padded, np.ones(window) / window, mode='valid')
+
+        held = target = float(values[0])
+        for j, value in enumerate(values):
+            if abs(value - held) > DEADZONE * crop_w:
+                target = float(value)
+            held += float(np.clip(target - held, -max_step, max_step))
+            path[shot[j]] = held
+
+    return np.clip(path, half, frame_w - half)
+
+
+def simplify(times, values, max_points=MAX_KEYFRAMES):
+    """
+    Keyframes where the path changes: drop points linear interpolation already gives,
+    loosening the tolerance until at most max_points remain.
+    """
+    tolerance = 1.0
+    while True:
+        keep = [0]
+        for k in range(1, len(times) - 1):
+            a = keep[-1]
+            expected = values[a] + (values[k + 1] - values[a]) * (times[k] - times[a]) / max(times[k + 1] - times[a], 1e-6)
+            if abs(values[k] - expected) > tolerance:
+                keep.append(k)
+        if len(times) > 1:
+            keep.append(len(times) - 1)
+        if len(keep) <= max_points:
+            return [(round(float(times[k]), 3), int(round(values[k]))) for k in keep]
+        tolerance *= 2
+
+
+def compute_crop_path(video_path, start, end, source_size):
+    """
+    Keyframes [(t, x)] for the left edge of a 9:16 crop over [start, end), t relative to
+    start, x in source pixels.
+    """
+    width, height = source_size
+    crop_w, _, centre_x, _ = vertical_crop_box(width, height)
+    frames = read_proxy_frames(video_path, start, end, source_size)
+    if len(frames) == 0:
+        return [(0.0, centre_x)]
+
+    scale = frames.shape[2] / width
+    proxy_crop_w = max(1, int(round(crop_w * scale)))
+    centres, cuts = subject_centres(frames, proxy_crop_w)
+    path = smooth_path(centres, cuts, proxy_crop_w, frames.shape[2])
+
+    # Left edge in source pixels; a shot change gets a keyframe just before it so the crop jumps
+    left = np.clip(path / scale - crop_w / 2, 0, width - crop_w)
+    times = np.arange(len(frames)) / PROXY_FPS
+    point_times, point_values = [], []
+    for k in range(len(frames)):
+        if cuts[k] and k > 0:
+            point_times.append(times[k] - 0.001)
+            point_values.append(left[k - 1])
+        point_times.append(times[k])
+        point_values.append(left[k])
+    return simplify(np.array(point_times), np.array(point_values))
+
+
+def crop_expression(keyframes):
+    """
+    ffmpeg expression for crop's x: piecewise linear between keyframes (t in seconds).
+    """
+    if len(keyframes) == 1:
+        return str(keyframes[0][1])
+    expression = str(keyframes[-1][1])
+    for (t0, x0), (t1, x1) in reversed(list(zip(keyframes, keyframes[1:]))):
+        if x0 == x1:
+            piece = str(x0)
+        else:
+            piece = f"{x0}+{x1 - x0}*(t-{t0})/{max(t1 - t0, 0.001):.3f}"
+        expression = f"if(lt(t,{t1}),{piece},{expression})"
+    return f"'{expression}'"
+
+
+def crop_path_cache_file(project_folder, start, end):
+    return os.path.join(project_folder, f"crop_path_{start:.2f}_{end:.2f}.json")
+
+
+def load_crop_path(video_path, project_folder, start, end, source_size):
+    """
+    Crop keyframes for one clip, reusing the copy saved in the project folder while the
+    video file is unchanged.
+    """
+    cache_file = crop_path_cache_file(project_folder, start, end)
+    stat = os.stat(video_path)
+    identity = {"version": CROP_PATH_VERSION, "size": stat.st_size, "mtime": stat.st_mtime, "detector": "face" if _face_cascade is not None else "saliency"}
+
+    try:
+        with open(cache_file, encoding='utf-8') as f:
+            cached = json.load(f)
+        if all(cached.get(k) == v for k, v in identity.items()):
+            return [tuple(point) for point in cached['keyframes']]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    keyframes = compute_crop_path(video_path, start, end, source_size)
+    try:
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump({**identity, "keyframes": keyframes}, f)
+    except OSError as e:
+        print(f" Could not save crop path: {e}")
+    return keyframes
@@ -0,0 +1,321 @@
+import os, glob, time, shutil, tempfile, threading
+from contextlib import contextmanager
+from instrumentation import current_job
+from ingest import INCOMING_FOLDER, UPLOAD_TTL_SECONDS
+
+# Disk budget for the clips folder and the download store. When usage is over the quota
+# or free space is under the floor, unused stored downloads and then whole projects are
+# evicted, least recently used first, until usage is back under LOW_WATER of the limits.
+STORAGE_QUOTA_MB = int(os.environ.get('KLEEP_STORAGE_QUOTA_MB', '0'))          # 0 = no quota
+STORAGE_MIN_FREE_MB = int(os.environ.get('KLEEP_STORAGE_MIN_FREE_MB', '0'))     # 0 = no floor
+SWEEP_SECONDS = int(os.environ.get('KLEEP_STORAGE_SWEEP_SECONDS', '300'))       # 0 = no background sweeper
+LOW_WATER = 0.9
+
+SCRATCH_FOLDER = '.scratch'                 # per-job scratch dirs, inside the clips folder
+LAST_ACCESS_FILE = '.last_access'           # its mtime is the project's last access
+ACCESS_RESOLUTION_SECONDS = 60              # last access is rewritten at most this often
+EVICTION_MIN_IDLE_SECONDS = 30 * 60         # projects used more recently are never evicted
+PIN_REFRESH_SECONDS = 5 * 60                # how often projects in use have their last access refreshed
+LEFTOVER_MAX_AGE_SECONDS = 3600             # scratch and stray intermediates older than this are removed
+
+# Files a finished render no longer needs (older renders left them in the project folder)
+INTERMEDIATE_PATTERNS = ['*_raw.mp4', '*_captioned.mp4', '*.srt', '*.ass', '*-temp-audio.m4a', '*TEMP_MPY_*', '*_restyle.mp4', '*.tmp', 'kleep-cut-*']
+
+_lock = threading.Lock()
+_scratch = {}       # job_id -> scratch dirs
+_pinned = {}        # project folder -> number of jobs using it
+_stats = {"sweeps": 0, "evicted_projects": 0, "evicted_downloads": 0, "removed_leftovers": 0, "freed_bytes": 0, "last_sweep": None, "last_usage_bytes": None}
+_sweeper = None
+_heartbeat = None
+_wake = threading.Event()
+
+
+@contextmanager
+def scratch_space(project_folder):
+    """
+    Directory for a render's intermediate files. Inside a job it is the job's scratch dir
+    (on the clips folder's filesystem), removed when the job ends; otherwise a temp dir
+    removed on exit.
+    """
+    job_id = current_job()
+    if job_id:
+        path = os.path.join(os.path.dirname(os.path.abspath(project_folder)), SCRATCH_FOLDER, job_id)
+        os.makedirs(path, exist_ok=True)
+        with _lock:
+            _scratch.setdefault(job_id, set()).add(path)
+        yield path
+        return
+
+    path = tempfile.mkdtemp(prefix='kleep-scratch-', dir=project_folder)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def release_scratch(job_id):
+    with _lock:
+        paths = _scratch.pop(job_id, ())
+    for path in paths:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def touch_project(project_folder):
+    # Record an access for LRU eviction; one stat per call, a write at most once a minute
+    marker = os.path.join(project_folder, LAST_ACCESS_FILE)
+    now = time.time()
+    try:
+        if now - os.stat(marker).st_mtime < ACCESS_RESOLUTION_SECONDS:
+            return
+        os.utime(marker, (now, now))
+    except FileNotFoundError:
+        try:
+            open(marker, 'a').close()
+        except OSError:
+            pass
+    except OSError:
+        pass
+
+
+@contextmanager
+def in_use(project_folder):
+    """
+    Keep a project from being evicted while a job works on it: pinned for this
+    process's sweeper, and its last access refreshed on disk for other app workers'.
+    """
+    global _heartbeat
+    key = os.path.abspath(project_folder)
+    with _lock:
+        _pinned[key] = _pinned.get(key, 0) + 1
+        if _heartbeat is None:
+            _heartbeat = threading.Thread(target=_refresh_pinned, name='kleep-storage-heartbeat', daemon=True)
+            _heartbeat.start()
+    touch_project(project_folder)
+    try:
+        yield
+    finally:
+        touch_project(project_folder)
+        with _lock:
+            _pinned[key] -= 1
+            if not _pinned[key]:
+                del _pinned[key]
+
+
+def _refresh_pinned():
+    # Pins only exist in this process. Other app workers' sweepers go by last access,
+    # so it is kept fresh on disk for projects (and scratch dirs) jobs here are using.
+    while True:
+        time.sleep(PIN_REFRESH_SECONDS)
+        with _lock:
+            folders = list(_pinned)
+            scratch = [path for paths in _scratch.values() for path in paths]
+        for folder in folders:
+            touch_project(folder)
+        for path in scratch:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+
+def _accessed_within(project_folder, seconds):
+    try:
+        return time.time() - os.stat(os.path.join(project_folder, LAST_ACCESS_FILE)).st_mtime < seconds
+    except OSError:
+        return False
+
+
+def _last_used(path):
+    # Newest mtime of a path and the files under it (a project's includes its access
+    # marker; a download's includes the .part file yt-dlp is appending to)
+    newest = os.lstat(path).st_mtime
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                newest = max(newest, os.lstat(os.path.join(root, name)).st_mtime)
+            except OSError:
+                continue
+    return newest
+
+
+def disk_usage(folders):
+    """
+    Bytes used by the files under folders, counting hard-linked files once.
+    """
+    seen, total = set(), 0
+    for folder in folders:
+        for root, _, files in os.walk(folder):
+            for name in files:
+                try:
+                    stat = os.lstat(os.path.join(root, name))
+                except OSError:
+                    continue
+                if (stat.st_dev, stat.st_ino) not in seen:
+                    seen.add((stat.st_dev, stat.st_ino))
+                    total += stat.st_size
+    return total
+
+
+def _over_limit(clips_folder, folders, low_water=1.0):
+    """
+    (over quota, under the free space floor, usage, free) for the clips folder's disk.
+    """
+    usage = disk_usage(folders)
+    free = shutil.disk_usage(clips_folder).free
+    over_quota = STORAGE_QUOTA_MB > 0 and usage > STORAGE_QUOTA_MB * 1024 * 1024 * low_water
+    under_floor = STORAGE_MIN_FREE_MB > 0 and free < STORAGE_MIN_FREE_MB * 1024 * 1024 / low_water
+    return over_quota, under_floor, usage, free
+
+
+def _eviction_candidates(clips_folder, download_store):
+    """
+    What may be evicted, in order: stored downloads no project links to (oldest first),
+    then projects by last access. Projects in use or used recently are left alone.
+    """
+    now = time.time()
+    downloads = []
+    if download_store and os.path.isdir(download_store):
+        for path in glob.glob(os.path.join(glob.escape(download_store), '*.mp4')):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stat.st_nlink == 1:
+                downloads.append((stat.st_mtime, 'download', path))
+
+    projects = []
+    with _lock:
+        pinned = set(_pinned)
+    for folder in glob.glob(os.path.join(glob.escape(clips_folder), 'project_*')):
+        if not os.path.isdir(folder) or os.path.abspath(folder) in pinned:
+            continue
+        last_used = _last_used(folder)
+        if now - last_used >= EVICTION_MIN_IDLE_SECONDS:
+            projects.append((last_used, 'project', folder))
+    return sorted(downloads) + sorted(projects)
+
+
+def _evict(kind, path):
+    if kind == 'project':
+        shutil.rmtree(path, ignore_errors=True)
+        return
+    # A stored download and its metadata
+    for p in (path, os.path.splitext(path)[0] + '.json'):
+        try:
+            os.remove(p)
+        except FileNotFoundError:
+            pass
+
+
+def remove_leftovers(clips_folder, download_store=None, max_age=LEFTOVER_MAX_AGE_SECONDS):
+    """
+    Delete scratch dirs of jobs that are gone, intermediates that crashed or older
+    renders left in project folders, abandoned uploads and interrupted downloads.
+    A directory's age is that of the newest file in it, so downloads still being
+    written are kept. Returns the number of paths removed.
+    """
+    now = time.time()
+    with _lock:
+        live = {path for paths in _scratch.values() for path in paths}
+        pinned = set(_pinned)
+
+    paths = [(p, max_age) for p in glob.glob(os.path.join(glob.escape(clips_folder), SCRATCH_FOLDER, '*'))]
+    # Resumable uploads may sit idle for a day before they are given up on
+    paths += [(p, UPLOAD_TTL_SECONDS) for p in glob.glob(os.path.join(glob.escape(clips_folder), INCOMING_FOLDER, '*'))]
+    if download_store:
+        paths += [(p, max_age) for p in glob.glob(os.path.join(glob.escape(download_store), 'download_*'))]
+    for folder in glob.glob(os.path.join(glob.escape(clips_folder), 'project_*')):
+        # Projects accessed lately may have a job in another app worker writing to them
+        if os.path.abspath(folder) not in pinned and not _accessed_within(folder, EVICTION_MIN_IDLE_SECONDS):
+            paths += [(p, max_age) for pattern in INTERMEDIATE_PATTERNS + ['kleep-scratch-*'] for p in glob.glob(os.path.join(glob.escape(folder), pattern))]
+
+    removed = 0
+    for path, path_max_age in paths:
+        try:
+            if os.path.abspath(path) in live or now - _last_used(path) < path_max_age:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except OSError:
+            continue
+        removed += 1
+    return removed
+
+
+def sweep(clips_folder, download_store=None):
+    """
+    One pass of the storage manager: remove leftovers, then evict until usage is under
+    the quota and free space above the floor (with some headroom). Returns a summary.
+    """
+    folders = [clips_folder] + ([download_store] if download_store and os.path.isdir(download_store) else [])
+    removed = remove_leftovers(clips_folder, download_store)
+    over_quota, under_floor, usage, free = _over_limit(clips_folder, folders)
+    started_usage = usage
+    evicted = []
+
+    stalled = False
+    while over_quota or under_floor:
+        # Re-ranked after every eviction: an evicted project can leave its download unlinked
+        candidates = _eviction_candidates(clips_folder, download_store)
+        if not candidates:
+            print(f" Storage: still over the limit ({usage / 1024 / 1024:.0f} MB used) with nothing left to evict")
+            break
+        _, kind, path = candidates[0]
+        # The disk may be shared: once evicting stops giving space back (other than the
+        # download a project was linked to), the floor is not ours to restore
+        if stalled and not over_quota and kind != 'download':
+            print(f" Storage: free space is under the floor, but evicting does not raise it; stopping")
+            break
+        _evict(kind, path)
+        evicted.append((kind, path))
+        print(f" Storage: evicted {kind} {path}")
+        free_before = free
+        over_quota, under_floor, usage, free = _over_limit(clips_folder, folders, LOW_WATER)
+        stalled = free <= free_before
+
+    with _lock:
+        _stats["sweeps"] += 1
+        _stats["removed_leftovers"] += removed
+        _stats["evicted_projects"] += sum(1 for kind, _ in evicted if kind == 'project')
+        _stats["evicted_downloads"] += sum(1 for kind, _ in evicted if kind == 'download')
+        _stats["freed_bytes"] += max(0, started_usage - usage)
+        _stats["last_sweep"] = time.time()
+        _stats["last_usage_bytes"] = usage
+    return {"usage_bytes": usage, "removed_leftovers": removed, "evicted": evicted}
+
+
+def wake_sweeper():
+    _wake.set()
+
+
+def start_sweeper(clips_folder, download_store=None, interval=SWEEP_SECONDS):
+    """
+    Run sweep() in a daemon thread every `interval` seconds, and soon after each job ends.
+    """
+    global _sweeper
+    if interval <= 0 or _sweeper is not None:
+        return None
+
+    def loop():
+        while True:
+            _wake.wait(interval)
+            _wake.clear()
+            try:
+                sweep(clips_folder, download_store)
+            except Exception as e:
+                print(f" Storage sweep failed: {e}")
+
+    _sweeper = threading.Thread(target=loop, name='kleep-storage-sweeper', daemon=True)
+    _sweeper.start()
+    return _sweeper
+
+
+def get_storage_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["jobs_with_scratch"] = len(_scratch)
+        stats["projects_in_use"] = len(_pinned)
+    stats.update(quota_mb=STORAGE_QUOTA_MB, min_free_mb=STORAGE_MIN_FREE_MB, sweep_seconds=SWEEP_SECONDS)
+    return stats
@@ -0,0 +1,24 @@
+import os, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Appended, so an installed openai-whisper still wins over the benchmark's stand-in
+sys.path.append(os.path.join(ROOT, 'benchmarks', 'stubs'))
+
+import pytest
+from openai_stub import start_stub, reset_stub
+
+# The OpenAI clients read these when the app modules are imported
+_server, _base_url = start_stub()
+os.environ.update(OPENAI_BASE_URL=_base_url, OPENAI_API_KEY='test', KLEEP_LLM_CACHE='no')
+
+
+@pytest.fixture
+def stub():
+    """
+    The local chat completions stub, with its call log cleared; call it with
+    (status, content) pairs to script the next replies.
+    """
+    reset_stub()
+    yield reset_stub
+    reset_stub()
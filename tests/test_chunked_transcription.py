@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+import chunked_transcription
+from chunked_transcription import find_split_points, stitch_words, frame_energy
+
+SR = 1000  # small rate keeps the synthetic arrays small; the frame maths is the same
+
+
+def speech_with_pauses(seconds, pauses, sr=SR, seed=0):
+    """
+    Loud noise with silent stretches at the given (start, end) seconds.
+    """
+    rng = np.random.default_rng(seed)
+    samples = (rng.standard_normal(int(seconds * sr)) * 8000).astype(np.int16)
+    for start, end in pauses:
+        samples[int(start * sr):int(end * sr)] = 0
+    return samples
+
+
+def test_short_audio_is_one_chunk():
+    samples = speech_with_pauses(50, [])
+    assert find_split_points(samples, SR, chunk_seconds=60) == [(0, len(samples))]
+
+
+def test_splits_land_in_the_pause_before_the_limit():
+    pauses = [(52, 54), (110, 112), (158, 160)]
+    samples = speech_with_pauses(200, pauses)
+    bounds = find_split_points(samples, SR, chunk_seconds=60, search_seconds=20)
+
+    # Contiguous, complete, and no chunk over the limit
+    assert bounds[0][0] == 0 and bounds[-1][1] == len(samples)
+    assert all(end == next_start for (_, end), (next_start, _) in zip(bounds, bounds[1:]))
+    assert all(0 < end - start <= 60 * SR for start, end in bounds)
+    # Every cut sits inside a pause
+    cuts = [end / SR for _, end in bounds[:-1]]
+    assert len(cuts) == 3
+    for cut in cuts:
+        assert any(start <= cut <= end for start, end in pauses), cut
+
+
+def test_without_pauses_chunks_still_respect_the_limit():
+    samples = speech_with_pauses(250, [])
+    bounds = find_split_points(samples, SR, chunk_seconds=60, search_seconds=20)
+    assert bounds[-1][1] == len(samples)
+    assert all(0 < end - start <= 60 * SR for start, end in bounds)
+
+
+def test_frame_energy_is_the_same_block_by_block(monkeypatch):
+    samples = speech_with_pauses(30, [(10, 12)])
+    energy, frame_len = frame_energy(samples, SR)
+    assert len(energy) == len(samples) // frame_len
+    # Quiet where the pause is, loud elsewhere
+    assert energy[int(11 * SR / frame_len)] < energy[int(5 * SR / frame_len)] / 10
+
+    monkeypatch.setattr(chunked_transcription, 'ENERGY_BLOCK_FRAMES', 7)
+    blocked, _ = frame_energy(samples, SR)
+    assert np.allclose(blocked, energy)
+
+
+def words(*spans):
+    return [{'text': f'w{i}', 'start': start, 'end': end} for i, (start, end) in enumerate(spans)]
+
+
+def test_stitch_shifts_chunks_to_absolute_time():
+    bounds = [(0, 10 * SR), (10 * SR, 20 * SR)]
+    stitched = stitch_words([words((1, 2), (3, 4)), words((0.5, 1), (2, 3))], bounds, SR)
+    assert [(w['start'], w['end']) for w in stitched] == [(1, 2), (3, 4), (10.5, 11), (12, 13)]
+
+
+def test_stitch_keeps_every_word_once_across_overlapping_seams():
+    bounds = [(0, 10 * SR), (10 * SR, 20 * SR), (20 * SR, 25 * SR)]
+    chunks = [
+        # Last word runs past the seam
+        words((1, 2), (8.5, 10.7)),
+        # First word reported before the chunk starts, and one starting before the previous word ended
+        words((-0.4, 0.3), (0.2, 0.6), (9.0, 12.0)),
+        words((0, 1), (1, 1), (4.5, 6)),
+    ]
+    stitched = stitch_words(chunks, bounds, SR)
+
+    # Nothing duplicated or dropped
+    assert len(stitched) == sum(len(c) for c in chunks)
+    assert [w['text'] for w in stitched] == [w['text'] for c in chunks for w in c]
+    # Starts never go backwards, and every word fits in its own chunk
+    starts = [w['start'] for w in stitched]
+    assert starts == sorted(starts)
+    assert all(w['start'] <= w['end'] for w in stitched)
+    chunk_of = [i for i, c in enumerate(chunks) for _ in c]
+    for word, i in zip(stitched, chunk_of):
+        assert bounds[i][0] / SR <= word['start'] and word['end'] <= bounds[i][1] / SR
+    assert stitched[1]['end'] == 10.0
+    assert stitched[-1]['end'] == 25.0
+
+
+def test_stitch_skips_empty_chunks():
+    bounds = [(0, 10 * SR), (10 * SR, 20 * SR), (20 * SR, 30 * SR)]
+    stitched = stitch_words([words((1, 2)), [], words((0, 1))], bounds, SR)
+    assert [w['start'] for w in stitched] == [1, 20]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_stitch_starts_are_monotonic_for_random_chunks(seed):
+    rng = np.random.default_rng(seed)
+    bounds = [(i * 30 * SR, (i + 1) * 30 * SR) for i in range(4)]
+    chunks = []
+    for _ in bounds:
+        starts = np.sort(rng.uniform(-1, 31, 20))
+        chunks.append([{'text': 'x', 'start': float(s), 'end': float(s + rng.uniform(0, 2))} for s in starts])
+    stitched = stitch_words(chunks, bounds, SR)
+    assert len(stitched) == 80
+    starts = [w['start'] for w in stitched]
+    assert starts == sorted(starts)
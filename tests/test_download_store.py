@@ -0,0 +1,145 @@
+import os
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import pytest
+import yt_dlp
+import download_store
+from download_store import video_key, store_key, download_format, fetch, link_into
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def served(tmp_path):
+    """
+    A local HTTP server for tmp_path/'www'; yields (folder, base URL).
+    """
+    folder = tmp_path / 'www'
+    folder.mkdir()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(QuietHandler, directory=str(folder)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield folder, f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # A fresh store, and a downloader that writes a small file instead of going online
+    monkeypatch.setattr(download_store, 'DOWNLOAD_STORE', True)
+    monkeypatch.setattr(download_store, 'DOWNLOAD_STORE_PATH', str(tmp_path / 'store'))
+    downloads = []
+
+    def fake_download(url, progress, format_spec):
+        downloads.append((url, format_spec))
+        os.makedirs(download_store.DOWNLOAD_STORE_PATH, exist_ok=True)
+        path = os.path.join(download_store.DOWNLOAD_STORE_PATH, f"download_{len(downloads)}.mp4")
+        with open(path, 'wb') as f:
+            f.write(b'video bytes')
+        return path, {"id": "abc", "title": "A video", "height": 720, "webpage_url": url}
+    monkeypatch.setattr(download_store, '_download', fake_download)
+    return downloads
+
+
+def test_video_key_is_shared_by_youtube_url_forms():
+    key = video_key("https://www.youtube.com/watch?v=dQw4w9WgXcQ")
+    assert key == "Youtube_dQw4w9WgXcQ"
+    assert video_key("https://youtu.be/dQw4w9WgXcQ") == key
+    assert video_key("https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42s") == key
+    assert video_key("https://www.youtube.com/watch?v=aaaaaaaaaaa") != key
+
+
+def test_video_key_hashes_generic_urls():
+    key = video_key("http://127.0.0.1:8000/talk.mp4")
+    assert key.startswith("url_")
+    assert key == video_key("http://127.0.0.1:8000/talk.mp4")
+    assert key != video_key("http://127.0.0.1:8000/other.mp4")
+
+
+def test_store_key_depends_on_format():
+    assert store_key("Youtube_x", download_format(1080)) != store_key("Youtube_x", download_format(720))
+    assert store_key("Youtube_x", download_format(1080)) == store_key("Youtube_x", download_format(1080))
+
+
+def test_fetch_downloads_once_then_reuses_the_store(store):
+    url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+    first_path, meta, stored = fetch(url)
+    assert stored and meta["title"] == "A video"
+    assert len(store) == 1
+
+    progress = []
+    second_path, second_meta, stored = fetch("https://youtu.be/dQw4w9WgXcQ", progress=progress.append)
+    assert stored and second_path == first_path and second_meta == meta
+    assert len(store) == 1
+    assert progress == [100]
+
+
+def test_fetch_misses_for_another_video_or_format(store):
+    fetch("https://www.youtube.com/watch?v=dQw4w9WgXcQ")
+    fetch("https://www.youtube.com/watch?v=aaaaaaaaaaa")
+    fetch("https://www.youtube.com/watch?v=dQw4w9WgXcQ", format_spec=download_format(480))
+    assert len(store) == 3
+
+
+def test_fetch_misses_when_the_stored_file_is_gone(store):
+    path, _, _ = fetch("https://www.youtube.com/watch?v=dQw4w9WgXcQ")
+    os.remove(path)
+    fetch("https://www.youtube.com/watch?v=dQw4w9WgXcQ")
+    assert len(store) == 2
+
+
+def test_link_into_hard_links_stored_files(tmp_path):
+    source = tmp_path / 'stored.mp4'
+    source.write_bytes(b'video bytes')
+    target = tmp_path / 'project' / 'video.mp4'
+    target.parent.mkdir()
+
+    link_into(str(source), str(target))
+    assert os.path.samefile(source, target)
+    # Linking again onto the same file is a no-op
+    link_into(str(source), str(target))
+    assert source.exists() and os.path.samefile(source, target)
+
+
+def test_link_into_copies_when_links_fail(tmp_path, monkeypatch):
+    def no_links(*args):
+        raise OSError(18, "Invalid cross-device link")
+    monkeypatch.setattr(download_store.os, 'link', no_links)
+    monkeypatch.setattr(download_store.os, 'replace', no_links)
+
+    source = tmp_path / 'stored.mp4'
+    source.write_bytes(b'video bytes')
+    target = tmp_path / 'video.mp4'
+    link_into(str(source), str(target))
+    assert target.read_bytes() == b'video bytes'
+    assert source.exists() and not os.path.samefile(source, target)
+
+    moved = tmp_path / 'moved.mp4'
+    link_into(str(source), str(moved), keep_source=False)
+    assert moved.read_bytes() == b'video bytes'
+    assert not source.exists()
+
+
+def test_download_format_caps_the_height(served):
+    folder, base_url = served
+    # An HLS master playlist offering the same video from 360p to 4K
+    variants = [(640, 360, 800000), (1280, 720, 2500000), (1920, 1080, 5000000), (3840, 2160, 16000000)]
+    lines = ['#EXTM3U']
+    for width, height, bandwidth in variants:
+        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={width}x{height},CODECS="avc1.64001f,mp4a.40.2"')
+        lines.append(f'{height}p.m3u8')
+    (folder / 'master.m3u8').write_text('\n'.join(lines) + '\n')
+
+    def selected_height(format_spec):
+        with yt_dlp.YoutubeDL({'format': format_spec, 'quiet': True, 'no_warnings': True}) as ydl:
+            return ydl.extract_info(f"{base_url}/master.m3u8", download=False)['height']
+
+    assert selected_height(download_format(1080)) == 1080
+    assert selected_height(download_format(720)) == 720
+    assert selected_height(download_format(0)) == 2160
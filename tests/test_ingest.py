@@ -0,0 +1,135 @@
+import io
+import os
+import hashlib
+import pytest
+from flask import Flask, request
+from werkzeug.exceptions import RequestEntityTooLarge
+import ingest
+from ingest import (IngestFile, IngestRequest, UploadOffsetMismatch, ingest_upload, start_upload,
+                    get_upload, append_chunk, take_upload, VIDEO_FILENAME, INCOMING_FOLDER)
+
+VIDEO = os.urandom(100_000)
+
+
+@pytest.fixture
+def clips(tmp_path, monkeypatch):
+    # Small reads, so every upload below spans several chunks
+    monkeypatch.setattr(ingest, 'UPLOAD_CHUNK_SIZE', 4096)
+    monkeypatch.setattr(ingest, '_uploads', {})
+    return tmp_path
+
+
+@pytest.fixture
+def app(clips):
+    """
+    A bare Flask app with the ingest request class; POST /upload stores the file and
+    reports what IngestFile saw.
+    """
+    app = Flask(__name__)
+    app.request_class = IngestRequest
+    app.config['CLIPS_FOLDER'] = str(clips)
+
+    @app.route('/upload', methods=['POST'])
+    def upload():
+        stream = request.files['video_file'].stream
+        assert isinstance(stream, IngestFile)
+        video_path, title, project_folder, reused = ingest_upload(stream, str(clips), 'talk')
+        return {"path": video_path, "sha256": stream.sha256(), "size": stream.size, "reused": reused}
+    return app
+
+
+def post_video(app, data=VIDEO):
+    return app.test_client().post('/upload', data={'video_file': (io.BytesIO(data), 'talk.mp4')},
+                                  content_type='multipart/form-data')
+
+
+def test_multipart_upload_is_hashed_and_moved_into_its_project(app, clips):
+    result = post_video(app).get_json()
+    assert result["sha256"] == hashlib.sha256(VIDEO).hexdigest()
+    assert result["size"] == len(VIDEO)
+    assert not result["reused"]
+    assert result["path"] == os.path.join(str(clips), 'project_talk', VIDEO_FILENAME)
+    with open(result["path"], 'rb') as f:
+        assert f.read() == VIDEO
+    # Nothing left behind in the incoming folder
+    assert os.listdir(clips / INCOMING_FOLDER) == []
+
+
+def test_same_bytes_reuse_the_existing_project(app, clips):
+    first = post_video(app).get_json()
+    second = post_video(app).get_json()
+    assert second["reused"] and second["path"] == first["path"]
+    assert os.listdir(clips / INCOMING_FOLDER) == []
+
+
+def test_upload_over_the_limit_is_discarded(clips):
+    upload = IngestFile(str(clips / INCOMING_FOLDER), max_bytes=1000)
+    upload.write(b'x' * 1000)
+    with pytest.raises(RequestEntityTooLarge):
+        upload.write(b'x')
+    assert not os.path.exists(upload.path)
+
+
+def test_unclaimed_upload_is_removed_on_close(clips):
+    upload = IngestFile(str(clips / INCOMING_FOLDER))
+    upload.write(b'partial')
+    upload.close()
+    assert not os.path.exists(upload.path)
+
+
+def test_resumable_upload_in_chunks(clips):
+    entry = start_upload(str(clips / INCOMING_FOLDER), 'talk.mp4', len(VIDEO))
+    offset = 0
+    for piece in (VIDEO[:30_000], VIDEO[30_000:70_001], VIDEO[70_001:]):
+        # Not complete until the last byte arrives
+        assert take_upload(entry["id"]) is None
+        offset = append_chunk(entry, offset, io.BytesIO(piece))
+    assert offset == len(VIDEO)
+
+    taken = take_upload(entry["id"])
+    assert taken is entry and get_upload(entry["id"]) is None
+    video_path, _, _, reused = ingest_upload(taken["file"], str(clips), 'talk')
+    assert not reused
+    with open(video_path, 'rb') as f:
+        assert f.read() == VIDEO
+
+
+def test_resume_after_a_dropped_chunk(clips):
+    entry = start_upload(str(clips / INCOMING_FOLDER), 'talk.mp4', len(VIDEO))
+    append_chunk(entry, 0, io.BytesIO(VIDEO[:40_000]))
+
+    # The client lost track and retries a chunk it already sent: told where to resume
+    with pytest.raises(UploadOffsetMismatch) as error:
+        append_chunk(entry, 20_000, io.BytesIO(VIDEO[20_000:60_000]))
+    assert error.value.expected == 40_000
+    # ...and so does one that skipped ahead
+    with pytest.raises(UploadOffsetMismatch):
+        append_chunk(entry, 60_000, io.BytesIO(VIDEO[60_000:]))
+
+    resumed_at = get_upload(entry["id"])["file"].size
+    append_chunk(entry, resumed_at, io.BytesIO(VIDEO[resumed_at:]))
+    taken = take_upload(entry["id"])
+    assert taken["file"].sha256() == hashlib.sha256(VIDEO).hexdigest()
+
+
+def test_more_bytes_than_announced_drop_the_upload(clips):
+    entry = start_upload(str(clips / INCOMING_FOLDER), 'talk.mp4', 10_000)
+    with pytest.raises(RequestEntityTooLarge):
+        append_chunk(entry, 0, io.BytesIO(VIDEO[:20_000]))
+    assert get_upload(entry["id"]) is None
+    assert not os.path.exists(entry["file"].path)
+
+
+def test_announced_size_over_the_limit_is_refused(clips, monkeypatch):
+    monkeypatch.setattr(ingest, 'MAX_UPLOAD_BYTES', 1000)
+    with pytest.raises(RequestEntityTooLarge):
+        start_upload(str(clips / INCOMING_FOLDER), 'talk.mp4', 1001)
+
+
+def test_stale_uploads_are_forgotten(clips):
+    stale = start_upload(str(clips / INCOMING_FOLDER), 'old.mp4', 100)
+    stale["updated"] -= ingest.UPLOAD_TTL_SECONDS + 1
+    fresh = start_upload(str(clips / INCOMING_FOLDER), 'new.mp4', 100)
+    assert get_upload(stale["id"]) is None
+    assert not os.path.exists(stale["file"].path)
+    assert get_upload(fresh["id"]) is fresh
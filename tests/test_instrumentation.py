@@ -0,0 +1,36 @@
+import sys
+from instrumentation import span, run_subprocess, render_metrics
+
+TRUE = [sys.executable, '-c', 'pass']
+
+
+def test_subprocesses_count_towards_every_open_span():
+    with span('outer') as outer:
+        run_subprocess(TRUE)
+        with span('inner') as inner:
+            run_subprocess(TRUE, check=True)
+    assert outer['subprocesses'] == 2
+    assert inner['subprocesses'] == 1
+
+
+def test_subprocesses_outside_spans_are_not_counted():
+    run_subprocess(TRUE)
+    with span('after') as record:
+        pass
+    assert record['subprocesses'] == 0
+
+
+def test_spans_sample_resident_memory_at_start_and_end():
+    with span('allocate') as record:
+        block = bytearray(64 * 1024 * 1024)
+    assert record['rss_end_bytes'] - record['rss_start_bytes'] >= 32 * 1024 * 1024
+    del block
+
+
+def test_metrics_report_memory_per_process_not_per_stage():
+    with span('probe'):
+        pass
+    metrics = render_metrics()
+    assert 'kleep_process_resident_memory_bytes ' in metrics
+    assert 'kleep_process_peak_resident_memory_bytes ' in metrics
+    assert 'rss' not in metrics
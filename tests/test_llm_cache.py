@@ -0,0 +1,57 @@
+import asyncio
+import threading
+import pytest
+import llm_cache
+import llm_client
+from llm_cache import cache_key, get_response, put_response
+from openai_stub import StubHandler
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # A fresh cache file, with new per-thread connections and running size
+    monkeypatch.setattr(llm_cache, 'LLM_CACHE_PATH', str(tmp_path / 'llm.sqlite3'))
+    monkeypatch.setattr(llm_cache, '_local', threading.local())
+    monkeypatch.setattr(llm_cache, '_size', {"bytes": None, "puts": 0})
+    checks = []
+    evict = llm_cache.evict
+
+    def counted_evict(*args, **kwargs):
+        checks.append(1)
+        return evict(*args, **kwargs)
+    monkeypatch.setattr(llm_cache, 'evict', counted_evict)
+    return checks
+
+
+def test_size_is_only_checked_when_the_running_total_says_so(cache, monkeypatch):
+    monkeypatch.setattr(llm_cache, 'LLM_CACHE_MAX_MB', 1)
+    monkeypatch.setattr(llm_cache, 'EVICT_EVERY_PUTS', 50)
+    for i in range(120):
+        put_response(f'key{i}', 'x' * 100, 0.1)
+    # The first put learns the size; then one check per EVICT_EVERY_PUTS
+    assert len(cache) == 3
+    assert get_response('key0') is not None
+
+
+def test_least_recently_used_entries_go_first(cache, monkeypatch):
+    monkeypatch.setattr(llm_cache, 'LLM_CACHE_MAX_MB', 2500 / 1024 / 1024)
+    for i in range(2):
+        put_response(f'key{i}', 'x' * 1000, 0.1)
+    get_response('key0')  # key1 is now the least recently used
+    put_response('key2', 'x' * 1000, 0.1)
+    assert get_response('key1') is None
+    assert get_response('key0') is not None and get_response('key2') is not None
+
+
+def test_async_completion_reads_and_writes_the_cache(cache, stub):
+    stub([(200, '{"viral_score": 12}')])
+
+    async def ask():
+        client = llm_client.async_client()
+        semaphore = asyncio.Semaphore(2)
+        return [await llm_client.async_chat_completion(client, semaphore, "Rate this", use_cache=True) for _ in range(2)]
+
+    first, second = asyncio.run(ask())
+    assert first == second == '{"viral_score": 12}'
+    assert StubHandler.calls == 1
+    assert get_response(cache_key("gpt-4o", 0.7, "Rate this")) == first
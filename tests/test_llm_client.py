@@ -0,0 +1,70 @@
+import json
+import openai
+import pytest
+import llm_client
+from llm_client import chat_completion
+from ai_clip_extractor import score_texts
+from openai_stub import StubHandler
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    # Backoff waits, recorded instead of slept
+    waited = []
+    monkeypatch.setattr(llm_client.time, 'sleep', waited.append)
+
+    async def no_wait(delay):
+        waited.append(delay)
+    monkeypatch.setattr(llm_client.asyncio, 'sleep', no_wait)
+    return waited
+
+
+def test_retries_rate_limits_and_server_errors(stub, delays):
+    stub([(429, "Slow down"), (503, "Overloaded"), (200, '{"viral_score": 77}')])
+
+    assert json.loads(chat_completion("Rate this", use_cache=False)) == {"viral_score": 77}
+    # Every attempt is one request: the SDK's own retries are off
+    assert StubHandler.calls == 3
+    assert len(delays) == 2
+    assert all(0 <= d <= llm_client.LLM_BACKOFF_MAX for d in delays)
+
+
+def test_gives_up_after_max_retries(stub, delays, monkeypatch):
+    monkeypatch.setattr(llm_client, 'LLM_MAX_RETRIES', 2)
+    stub([(500, "Broken")] * 5)
+
+    with pytest.raises(openai.InternalServerError):
+        chat_completion("Rate this", use_cache=False)
+    assert StubHandler.calls == 3
+    assert len(delays) == 2
+
+
+def test_client_errors_are_not_retried(stub, delays):
+    stub([(400, "Bad request")])
+
+    with pytest.raises(openai.BadRequestError):
+        chat_completion("Rate this", use_cache=False)
+    assert StubHandler.calls == 1
+    assert delays == []
+
+
+def test_score_texts_sends_batches(stub, delays):
+    texts = [f"excerpt number {n}" for n in range(7)]
+
+    scores = score_texts(texts, batch_size=3, concurrency=2)
+
+    # Two batches of three, and the last excerpt alone with the single-excerpt prompt
+    assert sorted(p.count('Excerpt ') for p in StubHandler.prompts) == [0, 3, 3]
+    # The stub scores excerpt n of a batch 40 + 7n, and a single excerpt 50
+    assert scores == [(47, "Stub score"), (54, "Stub score"), (61, "Stub score")] * 2 + [(50, "Stub score")]
+
+
+def test_score_texts_retries_and_fills_gaps(stub, delays):
+    # A rate-limited batch is retried; excerpts its answer leaves out are scored one by one
+    stub([(429, "Slow down"), (200, '[{"id": 2, "viral_score": "70", "reason": "Good"}]')])
+
+    scores = score_texts(["one", "two", "three"], batch_size=3, concurrency=1)
+
+    assert scores == [(50, "Stub score"), (70, "Good"), (50, "Stub score")]
+    assert StubHandler.calls == 4
+    assert len(delays) == 1
@@ -0,0 +1,57 @@
+import sys
+import threading
+import types
+import tqdm
+import pytest
+import model_registry
+from model_registry import transcribe_with_model
+
+
+@pytest.fixture
+def whisper_transcribe(monkeypatch):
+    """
+    A whisper.transcribe module using tqdm the way Whisper does, and a model whose
+    transcribe drives its bar over 10 "frames".
+    """
+    module = types.ModuleType('whisper.transcribe')
+    module.tqdm = tqdm
+    monkeypatch.setitem(sys.modules, 'whisper.transcribe', module)
+
+    class Model:
+        def transcribe(self, audio, **options):
+            with module.tqdm.tqdm(total=10, disable=True) as bar:
+                for _ in range(5):
+                    bar.update(2)
+            return {"segments": []}
+    monkeypatch.setitem(model_registry._models, ('tiny', None), {"model": Model(), "lock": threading.Lock()})
+    return module
+
+
+def test_progress_is_reported_during_the_transcription_only(whisper_transcribe):
+    reported = []
+    transcribe_with_model([], name='tiny', progress=reported.append)
+    assert reported == [20, 40, 60, 80, 100]
+    # The module's own tqdm is back afterwards
+    assert whisper_transcribe.tqdm is tqdm
+
+
+def test_tqdm_is_untouched_without_a_callback(whisper_transcribe):
+    seen = []
+
+    class Model:
+        def transcribe(self, audio, **options):
+            seen.append(whisper_transcribe.tqdm)
+            return {"segments": []}
+    model_registry._models[('tiny', None)]["model"] = Model()
+    transcribe_with_model([], name='tiny')
+    assert seen == [tqdm]
+
+
+def test_tqdm_is_restored_when_transcription_fails(whisper_transcribe):
+    class Model:
+        def transcribe(self, audio, **options):
+            raise RuntimeError("out of memory")
+    model_registry._models[('tiny', None)]["model"] = Model()
+    with pytest.raises(RuntimeError):
+        transcribe_with_model([], name='tiny', progress=lambda pct: None)
+    assert whisper_transcribe.tqdm is tqdm
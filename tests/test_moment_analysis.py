@@ -0,0 +1,76 @@
+import ai_clip_extractor
+from ai_clip_extractor import build_transcript_windows, analyze_transcript_for_moments, merge_moments
+from openai_stub import StubHandler
+from transcript import Transcript
+
+VOCABULARY = ["so", "the", "secret", "is", "that", "nobody", "tells", "you", "how", "it", "works."]
+
+
+def make_transcript(seconds, word_seconds=0.5):
+    words = []
+    for i in range(int(seconds / word_seconds)):
+        start = i * word_seconds
+        words.append({"word": " " + VOCABULARY[i % len(VOCABULARY)], "start": start, "end": start + word_seconds * 0.8})
+    return Transcript.from_words(words)
+
+
+def overlaps(a, b, max_overlap=0.5):
+    overlap = min(a['end'], b['end']) - max(a['start'], b['start'])
+    return overlap / min(a['end'] - a['start'], b['end'] - b['start']) > max_overlap
+
+
+def test_windows_fit_budget_and_overlap():
+    transcript = make_transcript(900)
+    windows = build_transcript_windows(transcript, token_budget=600, overlap_seconds=90)
+
+    assert len(windows) > 2
+    assert windows[0][0] == 0
+    assert windows[-1][1] == transcript.lines()[-1][1]
+    for (_, end, _), (next_start, _, _) in zip(windows, windows[1:]):
+        assert end - 90 - 8 <= next_start < end
+
+
+def test_moments_from_several_windows_are_merged(stub, monkeypatch):
+    transcript = make_transcript(900)
+    windows = build_transcript_windows(transcript, token_budget=600)
+    monkeypatch.setattr(ai_clip_extractor, 'build_transcript_windows', lambda t: build_transcript_windows(t, token_budget=600))
+
+    moments = analyze_transcript_for_moments(transcript, max_moments=8)
+
+    # One request per window, each carrying that window's lines
+    assert StubHandler.calls == len(windows)
+    for _, _, text in windows:
+        assert sum(text in prompt for prompt in StubHandler.prompts) == 1
+    assert 0 < len(moments) <= 8
+    assert [m['viral_score'] for m in moments] == sorted((m['viral_score'] for m in moments), reverse=True)
+    assert max(m['end'] for m in moments) > windows[0][1]
+    for i, a in enumerate(moments):
+        for b in moments[i + 1:]:
+            assert not overlaps(a, b)
+
+
+def test_merge_drops_overlapping_moments():
+    candidates = [
+        {"start": 0, "end": 45, "viral_score": 60},
+        {"start": 10, "end": 55, "viral_score": 90},     # same moment seen by the next window
+        {"start": 40, "end": 85, "viral_score": 70},     # overlaps the 90 by a third only
+        {"start": 100, "end": 145, "viral_score": 50},
+    ]
+    merged = merge_moments(candidates, max_moments=10)
+    assert [m['viral_score'] for m in merged] == [90, 70, 50]
+    assert merge_moments(candidates, max_moments=2) == merged[:2]
+
+
+def test_malformed_responses_are_skipped(stub):
+    transcript = make_transcript(120)
+
+    stub([(200, "Sorry, I can't help with that.")])
+    assert analyze_transcript_for_moments(transcript) == []
+
+    stub([(200, '```json\n[{"start": "10", "end": "55", "viral_score": "80"},'
+                ' {"start": 60, "end": 100, "viral_score": 95},'
+                ' {"start": "soon", "end": 40},'
+                ' {"start": 0, "end": 5, "viral_score": 99},'
+                ' "not a moment"]\n```')])
+    moments = analyze_transcript_for_moments(transcript)
+    assert [(m['start'], m['end'], m['viral_score']) for m in moments] == [(60.0, 100.0, 95), (10.0, 55.0, 80)]
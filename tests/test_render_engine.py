@@ -0,0 +1,42 @@
+import pytest
+import render_engine
+from render_engine import fast_cut, smart_cut, snap_to_keyframe
+
+KEYFRAMES = [0.0, 2.0, 4.0, 6.0, 8.0, 10.0, 12.0]
+INDEX = {"keyframes": KEYFRAMES, "codecs": {"video": "h264", "audio": "aac"}, "streams": {}}
+
+
+@pytest.fixture
+def copies(monkeypatch):
+    # Record stream copies instead of running ffmpeg
+    calls = []
+    monkeypatch.setattr(render_engine, 'stream_copy', lambda video, output, start, end, extra_args=(): calls.append((start, end)))
+    return calls
+
+
+def test_snap_to_keyframe_within_tolerance():
+    assert snap_to_keyframe(4.3, KEYFRAMES, 1.0) == 4.0
+    assert snap_to_keyframe(5.9, KEYFRAMES, 0.5) == 6.0
+    assert snap_to_keyframe(5.0, KEYFRAMES, 0.5) is None
+
+
+def test_snap_mode_returns_the_range_actually_cut(copies):
+    assert fast_cut('in.mp4', 'out.mp4', 3.4, 9.7, INDEX, mode='snap', tolerance=1.0) == (4.0, 10.0)
+    assert copies == [(4.0, 10.0)]
+
+
+def test_unsnapped_end_is_kept(copies):
+    # The end does not have to land on a keyframe
+    assert fast_cut('in.mp4', 'out.mp4', 3.8, 9.0, INDEX, mode='snap', tolerance=0.5) == (4.0, 9.0)
+
+
+def test_no_fast_cut_returns_none(copies):
+    assert fast_cut('in.mp4', 'out.mp4', 3.4, 9.7, INDEX, mode='off') is None
+    assert fast_cut('in.mp4', 'out.mp4', 3.4, 9.7, None) is None
+    assert copies == []
+
+
+def test_smart_cut_refuses_sources_it_cannot_match():
+    assert smart_cut('in.mp4', 'out.mp4', 3.4, 9.7, {**INDEX, "codecs": {"video": "hevc"}}) is None
+    # No probe data for the edges to match
+    assert smart_cut('in.mp4', 'out.mp4', 3.4, 9.7, INDEX) is None
@@ -0,0 +1,175 @@
+import os
+import time
+from collections import namedtuple
+import pytest
+import storage
+from storage import sweep, in_use, disk_usage, LAST_ACCESS_FILE, SCRATCH_FOLDER
+
+MB = 1024 * 1024
+DiskUsage = namedtuple('DiskUsage', 'total used free')
+
+
+def age(path, seconds):
+    # Backdate a path and everything under it
+    when = time.time() - seconds
+    for root, dirs, files in os.walk(path, topdown=False):
+        for name in files:
+            os.utime(os.path.join(root, name), (when, when))
+        os.utime(root, (when, when))
+    os.utime(path, (when, when))
+
+
+@pytest.fixture
+def clips(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, 'STORAGE_QUOTA_MB', 0)
+    monkeypatch.setattr(storage, 'STORAGE_MIN_FREE_MB', 0)
+    monkeypatch.setattr(storage, '_pinned', {})
+    monkeypatch.setattr(storage, '_scratch', {})
+    # No heartbeat thread touching projects behind the tests' backs
+    monkeypatch.setattr(storage, '_heartbeat', object())
+    folder = tmp_path / 'clips'
+    folder.mkdir()
+    return folder
+
+
+def make_project(clips, name, size_mb, idle_seconds):
+    folder = clips / f'project_{name}'
+    folder.mkdir()
+    (folder / 'full_video.mp4').write_bytes(b'\0' * int(size_mb * MB))
+    (folder / LAST_ACCESS_FILE).touch()
+    age(folder, idle_seconds)
+    return folder
+
+
+def make_download(store, name, size_mb, idle_seconds, linked_into=None):
+    store.mkdir(exist_ok=True)
+    video = store / f'{name}.mp4'
+    video.write_bytes(b'\0' * int(size_mb * MB))
+    (store / f'{name}.json').write_text('{}')
+    if linked_into:
+        # Linked the way link_into does it, without counting as an access to the project
+        last_used = os.stat(linked_into).st_mtime
+        os.link(video, linked_into / 'full_video.mp4.link')
+        os.utime(linked_into, (last_used, last_used))
+    age(video, idle_seconds)
+    return video
+
+
+def test_disk_usage_counts_hard_links_once(tmp_path):
+    (tmp_path / 'a').write_bytes(b'x' * 1000)
+    os.link(tmp_path / 'a', tmp_path / 'b')
+    (tmp_path / 'c').write_bytes(b'x' * 500)
+    assert disk_usage([str(tmp_path)]) == 1500
+
+
+def test_nothing_is_evicted_under_the_quota(clips, monkeypatch):
+    monkeypatch.setattr(storage, 'STORAGE_QUOTA_MB', 10)
+    make_project(clips, 'old', 2, 7200)
+    assert sweep(str(clips))["evicted"] == []
+
+
+def test_evicts_least_recently_used_projects_to_the_low_water_mark(clips, monkeypatch):
+    monkeypatch.setattr(storage, 'STORAGE_QUOTA_MB', 5)
+    oldest = make_project(clips, 'oldest', 2, 4 * 3600)
+    older = make_project(clips, 'older', 2, 3 * 3600)
+    newer = make_project(clips, 'newer', 2, 2 * 3600)
+
+    result = sweep(str(clips))
+    assert result["evicted"] == [('project', str(oldest))]
+    assert not oldest.exists() and older.exists() and newer.exists()
+    assert result["usage_bytes"] <= 5 * MB * storage.LOW_WATER
+
+
+def test_projects_in_use_or_used_recently_are_kept(clips, monkeypatch):
+    monkeypatch.setattr(storage, 'STORAGE_QUOTA_MB', 1)
+    busy = make_project(clips, 'busy', 2, 4 * 3600)
+    recent = make_project(clips, 'recent', 2, 60)
+    idle = make_project(clips, 'idle', 2, 3 * 3600)
+
+    with in_use(str(busy)):
+        result = sweep(str(clips))
+    assert result["evicted"] == [('project', str(idle))]
+    assert busy.exists() and recent.exists()
+    # Using it counted as an access, so it is not idle any more either
+    assert sweep(str(clips))["evicted"] == []
+
+
+def test_unlinked_downloads_go_before_projects(clips, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, 'STORAGE_QUOTA_MB', 6)
+    store = tmp_path / 'downloads'
+    project = make_project(clips, 'talk', 2, 3 * 3600)
+    linked = make_download(store, 'linked', 2, 5 * 3600, linked_into=project)
+    unlinked = make_download(store, 'unlinked', 2, 60)
+    other = make_project(clips, 'other', 3, 4 * 3600)
+
+    result = sweep(str(clips), str(store))
+    # The unused download first, even though it is the newest file; then the oldest project
+    assert result["evicted"][0] == ('download', str(unlinked))
+    assert not (store / 'unlinked.json').exists()
+    assert ('project', str(other)) in result["evicted"]
+    assert linked.exists() and project.exists()
+
+
+def test_evicting_a_project_frees_its_download(clips, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, 'STORAGE_QUOTA_MB', 1)
+    store = tmp_path / 'downloads'
+    project = make_project(clips, 'talk', 0.1, 3 * 3600)
+    download = make_download(store, 'talk', 3, 3 * 3600, linked_into=project)
+
+    result = sweep(str(clips), str(store))
+    assert result["evicted"] == [('project', str(project)), ('download', str(download))]
+
+
+def fake_disk(monkeypatch, clips, total_mb):
+    # Free space = a fixed disk minus whatever the clips folder holds
+    def disk_usage_of(path):
+        used = storage.disk_usage([str(clips)])
+        return DiskUsage(total_mb * MB, used, total_mb * MB - used)
+    monkeypatch.setattr(storage.shutil, 'disk_usage', disk_usage_of)
+
+
+def test_evicts_until_free_space_is_back_over_the_floor(clips, monkeypatch):
+    fake_disk(monkeypatch, clips, 10)
+    monkeypatch.setattr(storage, 'STORAGE_MIN_FREE_MB', 5)
+    projects = [make_project(clips, f'p{i}', 2, (5 - i) * 3600) for i in range(4)]
+
+    result = sweep(str(clips))
+    # 8 MB used leaves 2 MB free; two evictions get back over 5 MB / LOW_WATER
+    assert [path for _, path in result["evicted"]] == [str(p) for p in projects[:2]]
+    assert projects[2].exists() and projects[3].exists()
+
+
+def test_floor_eviction_stops_when_it_frees_nothing(clips, monkeypatch):
+    # Someone else fills the disk: evicting our projects does not raise free space
+    monkeypatch.setattr(storage.shutil, 'disk_usage', lambda path: DiskUsage(100 * MB, 99 * MB, MB))
+    monkeypatch.setattr(storage, 'STORAGE_MIN_FREE_MB', 5)
+    projects = [make_project(clips, f'p{i}', 1, (5 - i) * 3600) for i in range(4)]
+
+    result = sweep(str(clips))
+    assert len(result["evicted"]) == 1
+    assert sum(p.exists() for p in projects) == 3
+
+
+def test_floor_is_off_by_default(clips, monkeypatch):
+    monkeypatch.setattr(storage.shutil, 'disk_usage', lambda path: DiskUsage(100 * MB, 100 * MB, 0))
+    make_project(clips, 'old', 1, 4 * 3600)
+    assert sweep(str(clips))["evicted"] == []
+
+
+def test_leftovers_are_removed_by_age(clips):
+    project = make_project(clips, 'talk', 0.1, 4 * 3600)
+    stale = clips / SCRATCH_FOLDER / 'gone-job'
+    stale.mkdir(parents=True)
+    (stale / 'part.mp4').write_bytes(b'x')
+    age(stale, 2 * 3600)
+    fresh = clips / SCRATCH_FOLDER / 'running-job'
+    fresh.mkdir()
+    (fresh / 'part.mp4').write_bytes(b'x')
+    old_srt = project / 'clip_1.srt'
+    old_srt.write_text('1')
+    age(old_srt, 2 * 3600)
+
+    result = sweep(str(clips))
+    assert result["removed_leftovers"] == 2
+    assert not stale.exists() and not old_srt.exists()
+    assert fresh.exists() and (project / 'full_video.mp4').exists()
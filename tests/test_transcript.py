@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from transcript import Transcript, as_transcript
+
+
+def scan(words, t0, t1):
+    # The linear selection window() replaces: overlapping [t0, t1), with text
+    return [w for w in sorted(words, key=lambda w: w['start'])
+            if w['end'] > t0 and w['start'] < t1 and w['word'].strip()]
+
+
+def random_words(seed, count=300):
+    rng = np.random.default_rng(seed)
+    starts = np.cumsum(rng.uniform(0.05, 0.6, count))
+    words = []
+    for i, start in enumerate(starts):
+        # Some long words (so ends go out of order), some empty ones
+        end = start + (rng.uniform(1.5, 3.0) if i % 17 == 0 else rng.uniform(0.05, 0.5))
+        text = '' if i % 23 == 0 else f' w{i}'
+        words.append({'word': text, 'start': round(float(start), 3), 'end': round(float(end), 3)})
+    return words
+
+
+def test_from_words_round_trips():
+    words = [{'word': ' Hello', 'start': 0.0, 'end': 0.4, 'probability': 0.9},
+             {'word': ' world.', 'start': 0.5, 'end': 0.9, 'probability': 0.8}]
+    transcript = Transcript.from_words(words)
+    assert len(transcript) == 2
+    assert transcript[1] == {'word': ' world.', 'text': 'world.', 'start': 0.5, 'end': 0.9, 'probability': pytest.approx(0.8)}
+    assert transcript[-1]['text'] == 'world.'
+    assert [w['text'] for w in transcript] == ['Hello', 'world.']
+    assert as_transcript(transcript) is transcript
+    assert transcript.duration == 0.9
+
+
+def test_from_words_sorts_by_start():
+    transcript = Transcript.from_words([{'word': ' b', 'start': 2, 'end': 3}, {'word': ' a', 'start': 0, 'end': 1}])
+    assert [w['text'] for w in transcript] == ['a', 'b']
+    assert transcript.text_between(0, 10) == 'a b'
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_window_matches_a_linear_scan(seed):
+    words = random_words(seed)
+    transcript = Transcript.from_words(words)
+    rng = np.random.default_rng(seed + 100)
+    edges = [(0, 0.01), (-5, 0), (transcript.duration, transcript.duration + 5), (-1, transcript.duration + 1)]
+    spans = edges + [tuple(sorted(rng.uniform(-1, transcript.duration + 1, 2))) for _ in range(200)]
+    for t0, t1 in spans:
+        window = transcript.window(t0, t1)
+        expected = scan(words, t0, t1)
+        assert [(w['start'], w['end'], w['word']) for w in window] == [(w['start'], w['end'], w['word']) for w in expected]
+        assert len(window) == len(expected)
+        assert window.text() == ' '.join(w['word'].strip() for w in expected)
+
+
+def test_window_catches_a_long_word_with_an_out_of_order_end():
+    # The first word ends after the second, so a search on raw end times would miss it
+    transcript = Transcript.from_words([
+        {'word': ' long', 'start': 0.0, 'end': 5.0},
+        {'word': ' short', 'start': 1.0, 'end': 1.5},
+        {'word': ' after', 'start': 6.0, 'end': 6.5},
+    ])
+    assert [w['text'] for w in transcript.window(3.0, 4.0)] == ['long']
+    assert [w['text'] for w in transcript.window(1.2, 6.1)] == ['long', 'short', 'after']
+
+
+def test_window_boundaries_are_half_open():
+    transcript = Transcript.from_words([{'word': ' a', 'start': 0, 'end': 1}, {'word': ' b', 'start': 1, 'end': 2}])
+    assert transcript.text_between(1, 2) == 'b'
+    assert transcript.text_between(0, 1) == 'a'
+    assert transcript.text_between(2, 3) == ''
+
+
+def test_window_indexing_and_arrays():
+    transcript = Transcript.from_words(random_words(7))
+    window = transcript.window(10, 20)
+    assert window[0] == next(iter(window))
+    assert window[-1] == list(window)[-1]
+    assert len(window.starts) == window.hi - window.lo
+    assert np.all(window.starts < 20)
+    assert all(w['end'] > 10 for w in window)
+
+
+def test_empty_transcript():
+    transcript = Transcript.from_words([])
+    assert len(transcript) == 0 and transcript.duration == 0.0
+    assert list(transcript.window(0, 10)) == []
+    assert transcript.lines() == []
@@ -0,0 +1,176 @@
+import numpy as np
+
+
+class Transcript:
+    """
+    Word-level transcript stored as parallel arrays: start/end times, one shared text
+    buffer with per-word offsets, and optional probabilities. Iterating yields the same
+    word dicts Whisper returns (plus a stripped 'text'), so list-of-dict callers keep working.
+    """
+
+    def __init__(self, starts, ends, text_buffer, offsets, probabilities=None):
+        self.starts = np.asarray(starts, dtype=np.float64)
+        self.ends = np.asarray(ends, dtype=np.float64)
+        self.text_buffer = text_buffer
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.probabilities = None if probabilities is None else np.asarray(probabilities, dtype=np.float32)
+        # Running max of end times: lets us binary-search "ends after t" even if Whisper
+        # emits a slightly out-of-order end
+        self._max_ends = np.maximum.accumulate(self.ends) if len(self.ends) else self.ends
+
+    @classmethod
+    def from_words(cls, words):
+        if isinstance(words, Transcript):
+            return words
+
+        words = list(words or [])
+        starts = np.array([w.get('start', 0) for w in words], dtype=np.float64)
+        ends = np.array([w.get('end', 0) for w in words], dtype=np.float64)
+        texts = [w.get('word', w.get('text', '')) for w in words]
+
+        probabilities = None
+        if any('probability' in w for w in words):
+            probabilities = np.array([w.get('probability', np.nan) for w in words], dtype=np.float32)
+
+        # Keep words in start order so range queries can binary-search
+        if len(starts) and np.any(np.diff(starts) < 0):
+            order = np.argsort(starts, kind='stable')
+            starts, ends = starts[order], ends[order]
+            texts = [texts[i] for i in order]
+            if probabilities is not None:
+                probabilities = probabilities[order]
+
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        if texts:
+            offsets[1:] = np.cumsum([len(t) for t in texts])
+        return cls(starts, ends, ''.join(texts), offsets, probabilities)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __repr__(self):
+        return f"Transcript({len(self)} words, {self.duration:.1f}s)"
+
+    @property
+    def duration(self):
+        return float(self._max_ends[-1]) if len(self) else 0.0
+
+    def raw_text(self, i):
+        return self.text_buffer[self.offsets[i]:self.offsets[i + 1]]
+
+    def word(self, i):
+        raw = self.raw_text(i)
+        word = {
+            'word': raw,
+            'text': raw.strip(),
+            'start': float(self.starts[i]),
+            'end': float(self.ends[i]),
+        }
+        if self.probabilities is not None and not np.isnan(self.probabilities[i]):
+            word['probability'] = float(self.probabilities[i])
+        return word
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.word(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("transcript index out of range")
+        return self.word(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.word(i)
+
+    def to_words(self):
+        return list(self)
+
+    def lines(self, max_gap=0.7, max_seconds=8.0):
+        """
+        Group words into short phrases, breaking on pauses, sentence ends and a length cap.
+        Returns a list of (start, end, text).
+        """
+        lines = []
+        current = []
+        line_start = line_end = None
+        for i in range(len(self)):
+            text = self.raw_text(i).strip()
+            if not text:
+                continue
+            start, end = float(self.starts[i]), float(self.ends[i])
+            if current and (start - line_end > max_gap or end - line_start > max_seconds):
+                lines.append((line_start, line_end, ' '.join(current)))
+                current = []
+            if not current:
+                line_start = start
+            current.append(text)
+            line_end = end if len(current) == 1 else max(line_end, end)
+            if text[-1] in '.?!':
+                lines.append((line_start, line_end, ' '.join(current)))
+                current = []
+        if current:
+            lines.append((line_start, line_end, ' '.join(current)))
+        return lines
+
+    def index_range(self, t0, t1):
+        """
+        (lo, hi) bounding every word that overlaps [t0, t1), found by binary search.
+        """
+        lo = int(np.searchsorted(self._max_ends, t0, side='right'))
+        hi = int(np.searchsorted(self.starts, t1, side='left'))
+        return lo, max(lo, hi)
+
+    def window(self, t0, t1):
+        return TranscriptWindow(self, t0, t1)
+
+    def text_between(self, t0, t1):
+        return self.window(t0, t1).text()
+
+
+class TranscriptWindow:
+    """
+    Zero-copy view of the words overlapping [t0, t1) with non-empty text
+    (same selection slice_transcript_by_time always made).
+    """
+
+    def __init__(self, transcript, t0, t1):
+        self.transcript = transcript
+        self.t0 = t0
+        self.t1 = t1
+        self.lo, self.hi = transcript.index_range(t0, t1)
+        self._indices = None
+
+    @property
+    def starts(self):
+        return self.transcript.starts[self.lo:self.hi]
+
+    @property
+    def ends(self):
+        return self.transcript.ends[self.lo:self.hi]
+
+    def indices(self):
+        if self._indices is None:
+            t = self.transcript
+            self._indices = [
+                i for i in range(self.lo, self.hi)
+                if t.ends[i] > self.t0 and t.raw_text(i).strip()
+            ]
+        return self._indices
+
+    def __len__(self):
+        return len(self.indices())
+
+    def __iter__(self):
+        for i in self.indices():
+            yield self.transcript.word(i)
+
+    def __getitem__(self, i):
+        return self.transcript.word(self.indices()[i])
+
+    def text(self):
+        return ' '.join(self.transcript.raw_text(i).strip() for i in self.indices())
+
+
+def as_transcript(words):
+    return words if isinstance(words, Transcript) else Transcript.from_words(words)
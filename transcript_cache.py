@@ -0,0 +1,123 @@
+import os, json, gzip, glob, hashlib, threading
+
+CACHE_FORMAT_VERSION = 1
+TRANSCRIPT_PREFIX = 'transcript_'
+TRANSCRIPT_SUFFIX = '.json.gz'
+HASH_SIDECAR_SUFFIX = '.sha256'
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0}
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def media_hash(path):
+    """
+    SHA-256 of the file's bytes. The digest is remembered in a sidecar file next to the
+    media and reused while the file's size and mtime are unchanged.
+    """
+    stat = os.stat(path)
+    sidecar = path + HASH_SIDECAR_SUFFIX
+
+    try:
+        with open(sidecar, encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get('size') == stat.st_size and cached.get('mtime') == stat.st_mtime:
+            return cached['sha256']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    sha256 = digest.hexdigest()
+
+    write_hash_sidecar(path, sha256, stat)
+    return sha256
+
+
+def write_hash_sidecar(path, sha256, stat=None):
+    stat = stat or os.stat(path)
+    try:
+        with open(path + HASH_SIDECAR_SUFFIX, 'w', encoding='utf-8') as f:
+            json.dump({"size": stat.st_size, "mtime": stat.st_mtime, "sha256": sha256}, f)
+    except OSError as e:
+        print(f" Could not save media hash: {e}")
+
+
+def transcript_cache_key(media_path, model_name, options):
+    payload = json.dumps({
+        "version": CACHE_FORMAT_VERSION,
+        "media": media_hash(media_path),
+        "model": model_name,
+        "options": options,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def transcript_cache_path(media_path, key):
+    return os.path.join(os.path.dirname(media_path), f"{TRANSCRIPT_PREFIX}{key[:32]}{TRANSCRIPT_SUFFIX}")
+
+
+def load_transcript(media_path, key):
+    path = transcript_cache_path(media_path, key)
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('key') != key:
+            raise ValueError("cache key mismatch")
+    except (OSError, ValueError) as e:
+        if not isinstance(e, FileNotFoundError):
+            print(f" Ignoring unreadable transcript cache {path}: {e}")
+        _count("misses")
+        return None
+
+    _count("hits")
+    fields = data['fields']
+    return [
+        {field: value for field, value in zip(fields, row) if value is not None}
+        for row in data['rows']
+    ]
+
+
+def store_transcript(media_path, key, words):
+    # Column header + rows: far smaller than repeating every dict key per word
+    fields = []
+    for word in words:
+        for field in word:
+            if field not in fields:
+                fields.append(field)
+    rows = [[word.get(field) for field in fields] for word in words]
+
+    path = transcript_cache_path(media_path, key)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump({"key": key, "fields": fields, "rows": rows}, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    _count("stores")
+    return path
+
+
+def clear_transcripts(folder):
+    """
+    Remove cached transcripts under `folder` (a project folder or the whole clips folder).
+    """
+    pattern = os.path.join(folder, '**', f"{TRANSCRIPT_PREFIX}*{TRANSCRIPT_SUFFIX}")
+    removed = 0
+    for path in glob.glob(pattern, recursive=True):
+        os.remove(path)
+        removed += 1
+    return removed
+
+
+def get_transcript_cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+    return stats
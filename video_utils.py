@@ -1,49 +1,36 @@
-from moviepy.editor import VideoFileClip
 import os, uuid, re, glob, subprocess, json, shutil
-import shlex
 import tempfile
+from concurrent.futures import as_completed
+from concurrent.futures.process import BrokenProcessPool
 from ai_clip_extractor import extract_top_segments, score_segments_with_ai, transcribe_audio
-from helpers import sanitize_filename, crop_to_vertical, is_vertical
-import yt_dlp
+from helpers import sanitize_filename, is_vertical
+from transcript import as_transcript
+from render_engine import load_keyframe_index, FAST_CUT_MODE
+from captions import STYLE_MAP
+from media_info import get_media_info
+from encoding_profiles import get_encoding_profile
+from download_store import fetch, link_into
+from instrumentation import run_traced, record_spans
+from cut_cache import KEEP_CUTS
+from transcript_cache import media_hash
+from storage import scratch_space
+from clip_renderer import render_plan, render_pool_size, render_pool, discard_render_pool, render_segment
 from werkzeug.utils import secure_filename
-from pysrt import SubRipFile, SubRipItem, SubRipTime
 
 CLIPS_FOLDER = 'static/clips'
-STYLE_MAP = {
-    'professional': "FontName=Arial,FontSize=11,PrimaryColour=&H00FFFFFF,OutlineColour=&H80000000,BorderStyle=1,Outline=3,Shadow=1",
-    'fun': "FontName=Comic Sans MS,FontSize=11,PrimaryColour=&H0000FFFF,OutlineColour=&H80000000,BorderStyle=1,Outline=3,Shadow=1",
-    'minimal': "FontName=Helvetica,FontSize=12,PrimaryColour=&H00FFFFFF,OutlineColour=&H00000000,BorderStyle=1,Outline=0,Shadow=0",
-    'red_alert': "FontName=Impact,FontSize=11,PrimaryColour=&H000000FF,OutlineColour=&H80000000,BorderStyle=1,Outline=4,Shadow=1",
-}
-
-def download_video(url):
-    output_template = os.path.join(CLIPS_FOLDER, '%(title)s.%(ext)s')
-    ydl_opts = {
-        'outtmpl': output_template,
-        'format': 'bestvideo+bestaudio/best',
-        'merge_output_format': 'mp4',
-        'quiet': True,
-    }
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=True)
-
-    real_title = info['title']
-    sanitized_title = sanitize_filename(real_title)
-
-    # Search for the downloaded .mp4 file
-    matches = glob.glob(os.path.join(CLIPS_FOLDER, '*.mp4'))
-    if not matches:
-        raise Exception("Downloaded video not found!")
+def download_video(url, progress=None):
+    video_file, meta, stored = fetch(url, progress)
 
-    original_video_path = matches[0]  # first mp4 found
-    print(f"Downloaded video path: {original_video_path}")
+    real_title = meta['title']
+    sanitized_title = sanitize_filename(real_title)
+    print(f"Downloaded video path: {video_file}")
 
     # Create project folder
     project_folder = os.path.join(CLIPS_FOLDER, f"project_{sanitized_title}")
     os.makedirs(project_folder, exist_ok=True)
 
     target_video_path = os.path.join(project_folder, 'full_video.mp4')
-    os.rename(original_video_path, target_video_path)
+    link_into(video_file, target_video_path, keep_source=stored)
 
     return target_video_path, real_title, sanitized_title, project_folder
 
@@ -93,33 +80,6 @@ def create_srt_from_text(text, output_path, clip_start=0, clip_end=30):
     print(f" SRT file created at {output_path}")
 
 
-def burn_subtitles(video_path, srt_path, output_path, style='professional'):
-    style_options = STYLE_MAP.get(style, STYLE_MAP['professional'])  # ← Get style safely
-    
-    subtitles_filter = f"subtitles={shlex.quote(srt_path)}:force_style='{style_options}'"
-
-    command = [
-        "ffmpeg",
-        "-y",
-        "-i", video_path,
-        "-vf", subtitles_filter,
-        "-c:a", "copy",
-        "-movflags", "+faststart", 
-        output_path
-    ]
-
-    try:
-        print(f"🛠️ Running command: {' '.join(command)}")  # Helpful log
-        subprocess.run(command, check=True)
-        print(f" Subtitles burned successfully to {output_path}")
-    except subprocess.CalledProcessError as e:
-        print(f" Failed to burn subtitles: {e}")
-
-
-def burn_captions(input_video, srt_path, output_video, style='professional'):
-    burn_subtitles(input_video, srt_path, output_video, style=style)
-
-
 def create_srt_from_segments(segments, output_path, clip_start=0, clip_end=None):
     idx = 1
     with open(output_path, "w", encoding="utf-8") as f:
@@ -151,74 +111,22 @@ def create_srt_from_segments(segments, output_path, clip_start=0, clip_end=None)
 
 
 def get_rotation(filepath):
-    try:
-        command = [
-            "ffprobe", "-v", "error", "-select_streams", "v:0",
-            "-show_entries", "stream_tags=rotate", "-of", "json", filepath
-        ]
-        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        if not result.stdout:
-            return 0
-        info = json.loads(result.stdout)
-        rotation = int(info['streams'][0]['tags'].get('rotate', 0))
-        return rotation
-    except Exception as e:
-        print(f" Could not detect rotation: {e}")
-        return 0
+    return get_media_info(filepath).rotation
 
 
 def detect_video_orientation(video_path):
-    clip = VideoFileClip(video_path)
-    w, h = clip.size
-    rotation = get_rotation(video_path)
-
-    is_vertical = (h > w) or (rotation in [90, 270])
+    info = get_media_info(video_path)
+    w, h = info.coded_size
 
-    print(f" Video loaded: {w}x{h} | Rotation: {rotation}° | Detected as: {'Vertical' if is_vertical else 'Horizontal'}")
-    
-    clip.close()
-    return 'vertical' if is_vertical else 'horizontal'
+    print(f" Video loaded: {w}x{h} | Rotation: {info.rotation}° | Detected as: {'Vertical' if info.is_vertical else 'Horizontal'}")
+    return 'vertical' if info.is_vertical else 'horizontal'
 
 
 def detect_orientation(video_path):
-    clip = VideoFileClip(video_path)
-    w, h = clip.size
-    clip.close()
-
-    # ffprobe to check rotation
-    try:
-        result = subprocess.run(
-            [
-                "ffprobe",
-                "-v", "error",
-                "-select_streams", "v:0",
-                "-show_entries", "stream_tags=rotate",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                video_path
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        rotation_str = result.stdout.strip()
-        rotation = int(rotation_str) if rotation_str else 0
-    except Exception as e:
-        print(f"ffprobe error: {e}")
-        rotation = 0
-
-    print(f"🖥️ Original loaded video: {w}x{h} (Rotation: {rotation}°)")
-
-    if rotation in [90, 270]:
-        print(f" Rotation says vertical (rotation {rotation}°)")
-        is_vertical = True
-    elif h > w:
-        print(f" Height > Width: definitely vertical.")
-        is_vertical = True
-    else:
-        print(f" Width > Height and rotation 0: assume horizontal.")
-        is_vertical = False
-
-    return is_vertical
+    info = get_media_info(video_path)
+    w, h = info.coded_size
+    print(f"🖥️ Original loaded video: {w}x{h} (Rotation: {info.rotation}°)")
+    return info.is_vertical
 
 def process_upload_or_url(url=None, uploaded_file=None):
     if uploaded_file and uploaded_file.filename != '':
@@ -251,30 +159,9 @@ def slice_transcript_by_time(full_transcript, clip_start, clip_end, video_durati
     if not full_transcript:
         return []
 
-    selected_words = []
-
-    for word in full_transcript:
-        word_start = word.get('start', 0)
-        word_end = word.get('end', 0)
-        text = word.get('text', '').strip()
+    # Binary-searched, zero-copy window over the transcript arrays
+    return as_transcript(full_transcript).window(clip_start, clip_end)
 
-        if word_start < clip_end and word_end > clip_start and text:
-            selected_words.append(word)
-
-    return selected_words
-
-
-def extract_subclip(video_path, start, end, output_path):
-    clip = VideoFileClip(video_path).subclip(start, end)
-    clip.write_videofile(
-        output_path,
-        codec='libx264',
-        audio_codec='aac',
-        temp_audiofile='temp-audio.m4a',
-        remove_temp=True,
-        logger=None
-    )
-    clip.close()
 
 from datetime import timedelta
 
@@ -286,113 +173,82 @@ def format_timestamp(seconds):
 
 
 
-def seconds_to_subrip_time(seconds):
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    milliseconds = int((seconds - int(seconds)) * 1000)
-    return SubRipTime(hours=hours, minutes=minutes, seconds=secs, milliseconds=milliseconds)
-
-
-def generate_caption_srt(selected_words, srt_path, clip_start, clip_end):
-    subs = SubRipFile()
-
-    for i, word in enumerate(selected_words):
-        start_sec = word.get('start', clip_start)
-        end_sec = word.get('end', clip_end)
-
-        subs.append(
-            SubRipItem(
-                index=i+1,
-                start=seconds_to_subrip_time(start_sec - clip_start),
-                end=seconds_to_subrip_time(end_sec - clip_start),
-                text=word.get('text', '')
-            )
-        )
-
-    subs.save(srt_path, encoding='utf-8')
-    print(f" SRT file saved: {srt_path}")
-
-
-def create_vertical_version(input_video, output_video):
-    crop_to_vertical(input_video, output_video)
-
-def build_clip_metadata(project_folder, clip_filename, segment, caption_text):
-    return {
-        "project_folder": os.path.basename(project_folder),
-        "clip_file": os.path.basename(clip_filename),
-        "start": segment['start'],
-        "end": segment['end'],
-        "reason": segment.get('reason', 'No reason provided'),
-        "viral_score": segment.get('viral_score', 0),
-        "caption_text": caption_text
-    }
-
-
-MIN_CLIP_LENGTH = 15  # minimum duration in seconds for any clip
-
-def clip_segments(video_path, segments, title_prefix, project_folder, should_burn_captions='yes', caption_style='professional', full_transcript=None):
+def clip_segments(video_path, segments, title_prefix, project_folder, should_burn_captions='yes', caption_style='professional', full_transcript=None, progress=None, max_workers=None, encoding_profile=None, keep_cuts=KEEP_CUTS, stored_cuts=None):
+    """
+    Render a clip per segment. stored_cuts maps segment index to the clip's stored cut
+    (from its metadata); a clip whose cut still matches is only re-captioned. keep_cuts
+    also keeps cuts of captioned clips (cut_cache.KEEP_CUTS).
+    """
     try:
-        clip = VideoFileClip(video_path)
-        w, h = clip.size
-        duration = clip.duration
-        is_vertical = h > w
+        info = get_media_info(video_path, project_folder)
+        w, h = info.size
+        duration = info.duration
     except Exception as e:
         print(f" Error loading video: {e}")
         return []
 
+    if not segments:
+        return []
+
     safe_prefix = sanitize_filename(title_prefix)
-    clipped_files = []
+    workers, encoder_threads = render_plan(len(segments), max_workers)
+    profile = get_encoding_profile(encoding_profile)
 
-    for i, seg in enumerate(segments):
+    # Uncaptioned clips of a vertical source can be stream-copied; index keyframes once per project
+    keyframe_index = None
+    if should_burn_captions != 'yes' and h > w and FAST_CUT_MODE != 'off':
         try:
-            start = max(0, seg['start'] - 0.5)  # small pad before start
-            end = min(seg['end'], duration)
-            if start >= duration or (end - start) < 5:
-                print(f" Skipping clip {i+1}: invalid or too short.")
-                continue
-
-            print(f" Processing clip {i+1}: start={start:.2f}, end={end:.2f}, duration={end-start:.2f}s")
-
-            #  Step 1: Extract raw clip
-            raw_clip_path = os.path.join(project_folder, f"{safe_prefix}_clip_{i+1}_raw.mp4")
-            extract_subclip(video_path, start, end, raw_clip_path)
-            print(f" Extracted raw clip to: {raw_clip_path}")
-
-            #  Step 2: Slice words from transcript
-            selected_words = slice_transcript_by_time(full_transcript, start, end, duration)
-
-            if should_burn_captions == 'yes' and selected_words:
-                #  Step 3: Generate SRT
-                srt_path = os.path.join(project_folder, f"{safe_prefix}_clip_{i+1}.srt")
-                generate_caption_srt(selected_words, srt_path, start, end)
-                print(f" SRT file created at {srt_path}")
-
-                #  Step 4: Burn subtitles
-                captioned_path = os.path.join(project_folder, f"{safe_prefix}_clip_{i+1}_captioned.mp4")
-                burn_captions(raw_clip_path, srt_path, captioned_path, caption_style)
-                print(f" Burned captioned clip created at: {captioned_path}")
-                final_clip_path = captioned_path
-            else:
-                print(f" No captions for clip {i+1}, using raw clip.")
-                final_clip_path = raw_clip_path
-
-            #  Step 5: Handle vertical version
-            vertical_clip_path = os.path.join(project_folder, f"{safe_prefix}_clip_{i+1}_vertical.mp4")
-            if is_vertical:
-                shutil.copy2(final_clip_path, vertical_clip_path)
-                print(f" Copied vertical clip: {vertical_clip_path}")
-            else:
-                create_vertical_version(final_clip_path, vertical_clip_path)
-                print(f" Created vertical version: {vertical_clip_path}")
-
-            #  Step 6: Clip metadata
-            clip_info = build_clip_metadata(project_folder, vertical_clip_path, seg, " ".join([w['text'] for w in selected_words]))
-            clipped_files.append(clip_info)
-
+            keyframe_index = load_keyframe_index(video_path, project_folder)
         except Exception as e:
-            print(f" Error processing clip {i+1}: {e}")
-            continue
+            print(f" Could not index keyframes, re-encoding clips: {e}")
 
-    clip.close()
-    return clipped_files
+    # Cuts are tied to the source's contents (hash remembered next to the video)
+    try:
+        source_sha256 = media_hash(video_path)
+    except OSError as e:
+        print(f" Could not hash the video, not keeping cuts: {e}")
+        source_sha256 = None
+    stored_cuts = stored_cuts or {}
+    render_kwargs = dict(threads=encoder_threads, profile=profile, source_fps=info.fps, source_sha256=source_sha256, keep_cut=keep_cuts)
+    # Caption files and moviepy intermediates live in scratch space, gone once the job ends
+    with scratch_space(project_folder) as scratch_dir:
+        render_kwargs["scratch_dir"] = scratch_dir
+
+        # Slice captions up front so workers only receive the words they need
+        jobs = []
+        for i, seg in enumerate(segments):
+            start = max(0, seg['start'] - 0.5)
+            end = min(seg['end'], duration)
+            selected_words = list(slice_transcript_by_time(full_transcript, start, end, duration))
+            jobs.append((i, seg, video_path, duration, (w, h), safe_prefix, project_folder, should_burn_captions, caption_style, selected_words, keyframe_index))
+
+        results = [None] * len(jobs)
+        done = 0
+
+        if workers == 1:
+            for job in jobs:
+                results[job[0]] = render_segment(*job, stored_cut=stored_cuts.get(job[0]), **render_kwargs)
+                done += 1
+                if progress:
+                    progress(done, len(jobs))
+        else:
+            print(f" Rendering {len(jobs)} clips with {workers} workers x {encoder_threads} encoder threads")
+            pool = render_pool(render_pool_size(max_workers))
+            # Workers hand their stage spans back with the result
+            futures = {pool.submit(run_traced, render_segment, *job, stored_cut=stored_cuts.get(job[0]), **render_kwargs): job[0] for job in jobs}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i], spans = future.result()
+                    record_spans(spans)
+                except BrokenProcessPool as e:
+                    discard_render_pool(pool)
+                    print(f" Error processing clip {i+1}: {e}")
+                except Exception as e:
+                    print(f" Error processing clip {i+1}: {e}")
+                done += 1
+                if progress:
+                    progress(done, len(jobs))
+
+    # Keep the original segment order and drop clips that failed
+    return [clip_info for clip_info in results if clip_info]